@@ -0,0 +1,81 @@
+"""
+Check and time the cookie bundle formats in `jwxt_crawler`.
+
+Generates a cookie key, saves a bundle of `--cookies` cookies and loads it back, for the v2
+format (AES-GCM payload with an RSA-OAEP wrapped key, needs `cryptography`) and the v1 format
+(RSA PKCS#1 chunks). A v1 bundle written earlier must still load with whichever backend is
+installed. Warm start is the `load_cookie_bundle` call every cookie-reusing run makes.
+
+    python bench_cookie_bundle.py [--repeat 20] [--cookies 12]
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from requests.cookies import RequestsCookieJar
+
+import jwxt_crawler
+from jwxt_crawler import _cookie_crypto, load_cookie_bundle, save_cookie_bundle
+
+
+def cookie_jar(count: int) -> RequestsCookieJar:
+    jar = RequestsCookieJar()
+    for i in range(count):
+        jar.set(f"cookie_{i}", f"{i:04d}" + "x" * 120, domain="jwxt.shu.edu.cn", path="/")
+    return jar
+
+
+def timed(fn, repeat: int) -> float:
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def run(label: str, tmp: Path, jar: RequestsCookieJar, repeat: int) -> None:
+    key_path = tmp / f"{label}.pem"
+    store_path = tmp / f"{label}.enc.json"
+    started = time.perf_counter()
+    save_cookie_bundle(store_path, key_path, "user", jar)
+    first_save = time.perf_counter() - started
+    bundle = load_cookie_bundle(store_path, key_path)
+    if bundle is None or len(bundle.get("cookies") or []) != len(jar):
+        sys.exit(f"MISMATCH {label}: bundle does not load back")
+    save = timed(lambda: save_cookie_bundle(store_path, key_path, "user", jar), repeat)
+    load = timed(lambda: load_cookie_bundle(store_path, key_path), repeat)
+    print(
+        f"  {label:<3} v{bundle['version']}  first save (with key generation) {first_save * 1000:8.1f} ms"
+        f"  save {save * 1000:7.2f} ms  warm start {load * 1000:7.2f} ms"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--cookies", type=int, default=12)
+    args = parser.parse_args()
+
+    jar = cookie_jar(args.cookies)
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_path = Path(tmp)
+        print(f"{args.cookies} cookies, {args.repeat} runs")
+        with mock.patch.object(jwxt_crawler, "_cookie_crypto", lambda: None):
+            run("v1", tmp_path, jar, args.repeat)
+        if _cookie_crypto() is None:
+            print("skipped (not installed): cryptography")
+            return
+        run("v2", tmp_path, jar, args.repeat)
+        # A v1 bundle from before the upgrade keeps working, now through cryptography's RSA.
+        bundle = load_cookie_bundle(tmp_path / "v1.enc.json", tmp_path / "v1.pem")
+        if bundle is None or bundle.get("version") != 1:
+            sys.exit("MISMATCH: v1 bundle no longer loads")
+        load = timed(lambda: load_cookie_bundle(tmp_path / "v1.enc.json", tmp_path / "v1.pem"), args.repeat)
+        print(f"  v1 bundle read with cryptography: warm start {load * 1000:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
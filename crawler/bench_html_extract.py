@@ -0,0 +1,99 @@
+"""
+Check and time the selection/display page extraction backends in `jwxt_crawler`.
+
+Every installed backend, `bs4` included, must return exactly what `extract_page_fields_reference()`
+(the parsing the crawler did before backends existed) returns for each fixture under
+`ref/fixtures/`; the script exits non-zero on any mismatch. The timing pass also
+runs on a padded selection page roughly the size of the real one (~400 KB), since the saved
+fixtures are trimmed to the elements we read.
+
+    python bench_html_extract.py [--repeat 50]
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+from jwxt_crawler import HTML_EXTRACTORS, extract_page_fields, extract_page_fields_reference, html_backend_available
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "ref" / "fixtures"
+FIXTURES = (
+    "jwxt_selection_page_sample.html",
+    "jwxt_selection_page_badge_tabs_sample.html",
+    "jwxt_display_page_sample.html",
+    "jwxt_display_page_campus_by_name_sample.html",
+)
+TIMING_BASELINE = "bs4"
+
+
+def padded_selection_page(target_bytes: int = 400_000) -> str:
+    html = (FIXTURE_DIR / FIXTURES[0]).read_text(encoding="utf-8")
+    row = (
+        '<tr class="body_tr"><td class="jsxmzc"><a href="javascript:void(0);" '
+        "onclick=\"showTeacherInfo('61000331','23305502')\">张三</a></td>"
+        '<td class="sksj">星期一第1-2节<br/>星期三第3-4节</td><td class="jxdd">A101</td>'
+        '<td class="rsxx"><span class="jxbrs">30</span>/<span class="yxzrs">12</span></td></tr>\n'
+    )
+    filler = "<table class=\"table\"><tbody>\n" + row * (target_bytes // len(row.encode("utf-8"))) + "</tbody></table>\n"
+    return html.replace("</body>", filler + "</body>", 1)
+
+
+def check_fixtures(backends: list[str]) -> bool:
+    ok = True
+    for name in FIXTURES:
+        html = (FIXTURE_DIR / name).read_text(encoding="utf-8")
+        expected = extract_page_fields_reference(html)
+        for backend in backends:
+            got = extract_page_fields(html, backend)
+            if got != expected:
+                ok = False
+                print(f"MISMATCH {name} [{backend}]", file=sys.stderr)
+                print(f"  expected: {json.dumps(expected, ensure_ascii=False)}", file=sys.stderr)
+                print(f"  got:      {json.dumps(got, ensure_ascii=False)}", file=sys.stderr)
+    return ok
+
+
+def bench(backend: str, html: str, repeat: int) -> tuple[float, int]:
+    extract_page_fields(html, backend)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        extract_page_fields(html, backend)
+    elapsed = (time.perf_counter() - started) / repeat
+    tracemalloc.start()
+    extract_page_fields(html, backend)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    backends = [name for name in HTML_EXTRACTORS if html_backend_available(name)]
+    missing = [name for name in HTML_EXTRACTORS if name not in backends]
+    if missing:
+        print(f"skipped (not installed): {', '.join(missing)}")
+    if not check_fixtures(backends):
+        sys.exit(1)
+    print(f"fixtures: {len(FIXTURES)} pages identical across {', '.join(backends)}")
+
+    pages = {name: (FIXTURE_DIR / name).read_text(encoding="utf-8") for name in (FIXTURES[0], FIXTURES[2])}
+    pages["padded selection page"] = padded_selection_page()
+    for label, html in pages.items():
+        print(f"\n{label} ({len(html.encode('utf-8')) / 1024:.0f} KB, {args.repeat} runs)")
+        results = {backend: bench(backend, html, args.repeat) for backend in backends}
+        reference = results[TIMING_BASELINE][0]
+        for backend, (elapsed, peak) in results.items():
+            print(
+                f"  {backend:<10} {elapsed * 1000:8.2f} ms/page  {reference / elapsed:5.1f}x vs {TIMING_BASELINE}"
+                f"  peak {peak / 1024:8.0f} KB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+"""
+Check and time the JSON codec backends in `jwxt_crawler`.
+
+Runs on the snapshots under `app/static/crawler/data/terms/` (or `--snapshot` files). For
+each snapshot it checks that every backend produces identical bytes for the two encodings
+the crawler writes: the sorted compact form behind `hash`, and the indented snapshot file.
+It then times one crawl's worth of JSON work: decoding the detail responses (one small body
+per course) and encoding the snapshot twice.
+
+    python bench_json_codec.py [--repeat 5] [--snapshot PATH ...]
+"""
+
+import argparse
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from jwxt_crawler import JSON_BACKENDS, JsonCodec
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent.parent / "app" / "static" / "crawler" / "data" / "terms"
+
+
+def available_backends() -> list[str]:
+    backends = []
+    for name in JSON_BACKENDS:
+        if name == "auto":
+            continue
+        try:
+            JsonCodec(name)
+        except RuntimeError:
+            print(f"skipped (not installed): {name}")
+            continue
+        backends.append(name)
+    return backends
+
+
+def detail_bodies(courses: list[dict]) -> list[bytes]:
+    """Stand-in for the per-course detail responses: one JSON array of teaching classes each."""
+    grouped: dict[str, list[dict]] = defaultdict(list)
+    for row in courses:
+        grouped[str(row.get("courseId") or "")].append(row)
+    codec = JsonCodec("stdlib")
+    return [codec.dumps(rows) for rows in grouped.values()]
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--snapshot", action="append", type=Path, default=[])
+    args = parser.parse_args()
+
+    paths = args.snapshot or sorted(SNAPSHOT_DIR.glob("*.json"))
+    if not paths:
+        sys.exit(f"no snapshots found under {SNAPSHOT_DIR}; pass --snapshot")
+    backends = available_backends()
+    codecs = {name: JsonCodec(name) for name in backends}
+
+    for path in paths:
+        raw = path.read_bytes()
+        snapshot = codecs["stdlib"].loads(raw)
+        courses = snapshot.get("courses") or []
+        bodies = detail_bodies(courses)
+        for label, encode in (
+            ("hash form", lambda codec: codec.dumps(courses, sort_keys=True)),
+            ("snapshot file", lambda codec: codec.dumps(snapshot, indent=True)),
+        ):
+            outputs = {name: encode(codec) for name, codec in codecs.items()}
+            if len(set(outputs.values())) != 1:
+                sys.exit(f"MISMATCH {path.name}: {label} differs across {', '.join(backends)}")
+
+        print(f"\n{path.name} ({len(raw) / 1024 / 1024:.1f} MB, {len(courses)} rows, {len(bodies)} detail bodies)")
+        print(f"  byte-identical across {', '.join(backends)}")
+        results = {}
+        for name, codec in codecs.items():
+            results[name] = (
+                timed(lambda: [codec.loads(body) for body in bodies], args.repeat),
+                timed(lambda: codec.loads(raw), args.repeat),
+                timed(lambda: (codec.dumps(courses, sort_keys=True), codec.dumps(snapshot, indent=True)), args.repeat),
+            )
+        reference = sum(results["stdlib"])
+        for name, (details, load, dump) in results.items():
+            total = details + load + dump
+            print(
+                f"  {name:<7} decode details {details * 1000:7.1f} ms  decode snapshot {load * 1000:7.1f} ms"
+                f"  encode hash+file {dump * 1000:7.1f} ms  total {total * 1000:7.1f} ms ({reference / total:4.1f}x)"
+            )
+
+
+if __name__ == "__main__":
+    main()
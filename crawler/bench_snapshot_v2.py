@@ -0,0 +1,138 @@
+"""
+Compare the row-of-objects snapshot (v1) with the columnar v2 form in `jwxt_crawler`.
+
+For each snapshot under `app/static/crawler/data/terms/` (or `--snapshot` files) this checks
+that v2 decodes back to exactly the same snapshot, then reports file size (plain / gzip /
+brotli when installed) and parse time: Python (`json_loads`, plus column decoding for v2) and,
+when `node` is on PATH, a client-side `JSON.parse` (plus row rebuild for v2).
+
+    python bench_snapshot_v2.py [--repeat 5] [--snapshot PATH ...]
+"""
+
+import argparse
+import gzip
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from jwxt_crawler import (
+    SNAPSHOT_BROTLI_QUALITY,
+    SNAPSHOT_GZIP_LEVEL,
+    _brotli_module,
+    canonical_courses,
+    decode_columnar_snapshot,
+    encode_columnar_snapshot,
+    json_dumps,
+    json_loads,
+)
+
+SNAPSHOT_DIR = Path(__file__).resolve().parent.parent / "app" / "static" / "crawler" / "data" / "terms"
+
+# Mirrors decode_columnar_snapshot; prints mean ms for v1 parse, v2 parse alone and v2 parse + rebuild.
+NODE_BENCH = r"""
+const fs = require('fs');
+const [v1Path, v2Path, repeat] = [process.argv[1], process.argv[2], Number(process.argv[3])];
+function column(col, n) {
+  if (col.type === 'const') return Array.from({ length: n }, () => col.value);
+  if (col.type === 'intString') return col.values.map((v) => (v === null ? '' : String(v)));
+  if (col.type === 'dict') return col.index.map((i) => col.values[i]);
+  return col.values;
+}
+function rebuild(doc) {
+  const rows = Array.from({ length: doc.rowCount }, () => ({}));
+  for (const key of doc.keys) {
+    const col = doc.columns[key];
+    const absent = new Set(col.absent || []);
+    const values = column(col, doc.rowCount - absent.size);
+    let i = 0;
+    rows.forEach((row, n) => { if (!absent.has(n)) row[key] = values[i++]; });
+  }
+  return rows;
+}
+function time(fn) {
+  fn();
+  const start = process.hrtime.bigint();
+  for (let i = 0; i < repeat; i++) fn();
+  return Number(process.hrtime.bigint() - start) / 1e6 / repeat;
+}
+const v1 = fs.readFileSync(v1Path, 'utf8');
+const v2 = fs.readFileSync(v2Path, 'utf8');
+console.log(JSON.stringify({
+  v1: time(() => JSON.parse(v1).courses.length),
+  v2Parse: time(() => JSON.parse(v2).rowCount),
+  v2: time(() => rebuild(JSON.parse(v2)).length),
+}));
+"""
+
+
+def v1_bytes(snapshot: dict) -> bytes:
+    envelope = {key: value for key, value in snapshot.items() if key != "courses"}
+    return json_dumps(envelope)[:-1] + b',"courses":' + canonical_courses(snapshot.get("courses") or []) + b"}"
+
+
+def sizes(data: bytes) -> str:
+    parts = [f"{len(data) / 1024:7.0f} KB", f"gz {len(gzip.compress(data, SNAPSHOT_GZIP_LEVEL)) / 1024:5.0f} KB"]
+    brotli = _brotli_module()
+    if brotli is not None:
+        parts.append(f"br {len(brotli.compress(data, quality=SNAPSHOT_BROTLI_QUALITY)) / 1024:5.0f} KB")
+    return "  ".join(parts)
+
+
+def timed(fn, repeat: int) -> float:
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - started) / repeat
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--snapshot", action="append", type=Path, default=[])
+    args = parser.parse_args()
+
+    paths = args.snapshot or sorted(p for p in SNAPSHOT_DIR.glob("*.json") if not p.name.endswith(".v2.json"))
+    if not paths:
+        sys.exit(f"no snapshots found under {SNAPSHOT_DIR}; pass --snapshot")
+    node = shutil.which("node")
+    for path in paths:
+        snapshot = json_loads(path.read_bytes())
+        v1 = v1_bytes(snapshot)
+        v2 = json_dumps(encode_columnar_snapshot(snapshot))
+        if decode_columnar_snapshot(json_loads(v2)) != snapshot:
+            sys.exit(f"MISMATCH {path.name}: v2 does not decode to the original snapshot")
+
+        print(f"\n{path.name} ({len(snapshot.get('courses') or [])} rows, v2 round-trips exactly)")
+        print(f"  size   v1 {sizes(v1)}")
+        print(f"         v2 {sizes(v2)}")
+        py_v1 = timed(lambda: json_loads(v1), args.repeat)
+        py_v2_parse = timed(lambda: json_loads(v2), args.repeat)
+        py_v2 = timed(lambda: decode_columnar_snapshot(json_loads(v2)), args.repeat)
+        print(
+            f"  python v1 {py_v1 * 1000:7.1f} ms   v2 parse {py_v2_parse * 1000:7.1f} ms"
+            f"   v2 parse + rows {py_v2 * 1000:7.1f} ms"
+        )
+        if node:
+            with tempfile.TemporaryDirectory() as tmp:
+                (Path(tmp) / "v1.json").write_bytes(v1)
+                (Path(tmp) / "v2.json").write_bytes(v2)
+                out = subprocess.run(
+                    [node, "-e", NODE_BENCH, str(Path(tmp) / "v1.json"), str(Path(tmp) / "v2.json"), str(args.repeat)],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+            result = json.loads(out)
+            print(
+                f"  node   v1 {result['v1']:7.1f} ms   v2 parse {result['v2Parse']:7.1f} ms"
+                f"   v2 parse + rows {result['v2']:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Track startup cost of the `jwxt_crawler` CLI per entry point.
+
+Each entry point runs in a fresh interpreter under `python -X importtime`, the way the installed
+`jwxt-crawler` script runs in CI (importing the module, so bytecode is cached).
+The script reports median wall time, time spent importing (interpreter startup excluded) and
+which heavy modules were loaded. With `--check` it exits non-zero when a lightweight entry
+point (clearing the cookie store, object GC, cloud download, `--help`) loads an HTML parser
+or crypto module. Everything runs against temp files inside `crawler/` and a local HTTP server,
+so no real cookie store, snapshot or network is touched.
+
+    python bench_startup.py [--repeat 5] [--check]
+"""
+
+import argparse
+import functools
+import http.server
+import json
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+CRAWLER = Path(__file__).resolve().parent / "jwxt_crawler.py"
+HEAVY_MODULES = (
+    "requests",
+    "bs4",
+    "lxml",
+    "selectolax",
+    "rsa",
+    "cryptography",
+    "asyncio",
+    "concurrent.futures",
+    "httpx",
+    "orjson",
+)
+# Modules a lightweight entry point must not load.
+FORBIDDEN = ("bs4", "lxml", "selectolax", "rsa", "cryptography")
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def parse_importtime(stderr: str) -> tuple[dict[str, int], set[str]]:
+    """Cumulative microseconds of each top-level import, and every module name imported."""
+    top: dict[str, int] = {}
+    names: set[str] = set()
+    for line in stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        names.add(match.group(4))
+        if len(match.group(3)) == 1:
+            top[match.group(4)] = int(match.group(2))
+    return top, names
+
+
+def startup_modules() -> set[str]:
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "pass"], capture_output=True, text=True)
+    return parse_importtime(out.stderr)[1]
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+def serve_cloud(root: Path) -> http.server.ThreadingHTTPServer:
+    (root / "terms").mkdir(parents=True)
+    (root / "current.json").write_text(json.dumps([{"termId": "bench"}]), encoding="utf-8")
+    (root / "terms" / "bench.json").write_text(json.dumps({"hash": "", "courses": []}), encoding="utf-8")
+    handler = functools.partial(QuietHandler, directory=str(root))
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def entry_points(work: Path, cloud_url: str) -> dict[str, tuple[list[str], bool]]:
+    """name -> (argv after the script, whether it must stay free of HTML / crypto imports)."""
+    local = [
+        "--cookie-store", str(work / "cookie.enc.json"),
+        "--cookie-key", str(work / "cookie.pem"),
+        "--query-context-cache", str(work / "query-context.json"),
+    ]
+    output = ["--output-dir", str(work / "data")]
+    return {
+        "import only": ([], False),
+        "--help": (["--help"], True),
+        "--clear-cookie-store": (["--clear-cookie-store", *local], True),
+        "--gc-objects": (["--gc-objects", *output], True),
+        "cloud download": (
+            [
+                "--cloud-download", "always", "--cloud-base-url", cloud_url,
+                "--request-interval", "0", *local, *output,
+            ],
+            True,
+        ),
+    }
+
+
+def run_entry(argv: list[str], base: set[str]) -> tuple[float, int, set[str]]:
+    # Same as the installed `jwxt-crawler` script: import the module (cached bytecode), call main().
+    code = "import jwxt_crawler; jwxt_crawler.main()" if argv else "import jwxt_crawler"
+    command = [sys.executable, "-X", "importtime", "-c", code, *argv]
+    started = time.perf_counter()
+    out = subprocess.run(command, capture_output=True, text=True, cwd=CRAWLER.parent)
+    elapsed = time.perf_counter() - started
+    if out.returncode != 0:
+        sys.exit(f"{' '.join(argv) or 'import'} failed:\n{out.stderr[-2000:]}")
+    top, names = parse_importtime(out.stderr)
+    import_us = sum(us for name, us in top.items() if name not in base)
+    return elapsed, import_us, names
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--check", action="store_true", help="fail if a lightweight entry point loads HTML/crypto modules")
+    args = parser.parse_args()
+
+    base = startup_modules()
+    failures = []
+    with tempfile.TemporaryDirectory(dir=CRAWLER.parent, prefix=".bench-startup-") as tmp:
+        work = Path(tmp)
+        server = serve_cloud(work / "cloud")
+        try:
+            cases = entry_points(work, f"http://127.0.0.1:{server.server_port}")
+            print(f"{sys.executable} ({sys.version.split()[0]}), median of {args.repeat} runs")
+            for name, (argv, light) in cases.items():
+                runs = [run_entry(argv, base) for _ in range(args.repeat)]
+                wall = statistics.median(run[0] for run in runs)
+                imports = statistics.median(run[1] for run in runs)
+                loaded = [module for module in HEAVY_MODULES if module in runs[-1][2]]
+                print(
+                    f"  {name:<20} wall {wall * 1000:6.0f} ms  imports {imports / 1000:6.1f} ms"
+                    f"  heavy: {', '.join(loaded) or '-'}"
+                )
+                bad = [module for module in FORBIDDEN if module in runs[-1][2]]
+                if light and bad:
+                    failures.append(f"{name} imports {', '.join(bad)}")
+        finally:
+            server.shutdown()
+    if args.check and failures:
+        sys.exit("\n".join(failures))
+
+
+if __name__ == "__main__":
+    main()
@@ -13,25 +13,45 @@ Do NOT treat this crawler as the main runtime backend. Prefer the frontend-first
 credentials out of logs/sync bundles per `spec://cluster/jwxt#chunk-01`.
 """
 
+from __future__ import annotations
+
 import argparse
 import base64
+import contextlib
+import copy
+import functools
 import getpass
-import concurrent.futures
+import gzip
 import hashlib
+import heapq
+import importlib
 import json
 import os
+import queue
+import random
 import re
+import shutil
 import sys
 import time
 import threading
+from collections import deque
+from datetime import timedelta
+from html import unescape as html_unescape
+from html.parser import HTMLParser
 from pathlib import Path
-from typing import Callable, Dict, List, Tuple, TypedDict, cast
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, Any, AsyncIterator, BinaryIO, Callable, Dict, Iterable, Iterator, List, Protocol, Set, Tuple, TypedDict, cast
 from urllib.parse import urljoin
 
-import requests
-import rsa
-from bs4 import BeautifulSoup
-from requests.cookies import RequestsCookieJar, create_cookie
+# requests, bs4, rsa, asyncio and concurrent.futures are imported where they are used, so that
+# `--clear-cookie-store`, `--gc-objects` and cloud downloads start without them (see bench_startup.py).
+if TYPE_CHECKING:
+    import asyncio
+    import concurrent.futures
+
+    import requests
+    import rsa
+    from requests.cookies import RequestsCookieJar
 
 JWXT_HOST = "https://jwxt.shu.edu.cn"
 SSO_HOST = "https://newsso.shu.edu.cn"
@@ -47,6 +67,56 @@ COURSE_LIST_ENDPOINT = (
 COURSE_DETAIL_ENDPOINT = (
     f"{JWXT_HOST}/jwglxt/xsxk/zzxkyzbjk_cxJxbWithKchZzxkYzb.html?gnmkdm=N253512"
 )
+XHR_HEADERS = {
+    "X-Requested-With": "XMLHttpRequest",
+    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+    "Referer": SELECTION_ENDPOINT,
+}
+
+# `thread`: blocking requests over a ThreadPoolExecutor (default).
+# `async`: httpx.AsyncClient on one event loop, sharing the session cookie jar.
+CRAWL_ENGINES = ("thread", "async")
+# Snapshots are written compact with precompressed siblings (`.json.gz`, and `.json.br` when
+# brotli is installed) so static hosting can serve them as-is; levels favour size over speed.
+SNAPSHOT_GZIP_LEVEL = 9
+SNAPSHOT_BROTLI_QUALITY = 11
+# Optional columnar snapshot (`terms/<termId>.v2.json`), see `encode_columnar_snapshot`.
+SNAPSHOT_V2_FORMAT = "jwxt-columnar"
+SNAPSHOT_V2_VERSION = 2
+CANONICAL_INT = re.compile(r"(?:0|-?[1-9][0-9]*)")
+# `--object-store`: snapshot bodies live once under `<output>/objects/<sha256[:2]>/<sha256>.json`.
+SNAPSHOT_OBJECTS_DIR = "objects"
+SNAPSHOT_VARIANT_SUFFIXES = (".gz", ".br")
+# `--shard-by`: split each round into `terms/<termId>/<shard>.json` listed in `terms/<termId>.manifest.json`.
+SHARD_MODES = ("academy", "course-prefix")
+DEFAULT_SHARD_PREFIX_LENGTH = 2
+SAFE_SHARD_KEY = re.compile(r"[A-Za-z0-9_-]+")
+# `--snapshot-deltas`: `terms/<termId>.deltas/<previous hash>.json`, newest first in current.json `deltas`.
+SNAPSHOT_DELTA_FORMAT = "jwxt-delta"
+SNAPSHOT_DELTA_HISTORY = 8
+# A delta larger than this share of the full snapshot is not worth applying; clients refetch instead.
+SNAPSHOT_DELTA_MAX_RATIO = 0.5
+# current.json keys naming files published next to a round snapshot (besides its `sizes`).
+PUBLISHED_FILE_KEYS = ("v2Sizes", "object", "contentId", "v2Object", "shards", "deltas")
+# `auto` uses orjson when installed; both backends emit identical bytes for the crawler's JSON.
+JSON_BACKENDS = ("auto", "orjson", "stdlib")
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_IN_FLIGHT = 64
+DEFAULT_CLOUD_WORKERS = 4
+CLOUD_STREAM_CHUNK = 64 * 1024
+
+DETAIL_MAX_ATTEMPTS = 4
+DETAIL_RETRY_BACKOFF_SECONDS = 0.6
+DETAIL_SWEEP_ATTEMPTS = 2
+REAUTH_MAX_ROUNDS = 2
+# Campuses whose detail passes may overlap, and campus course lists fetched ahead of them.
+PIPELINE_CAMPUS_LANES = 2
+PIPELINE_LIST_PREFETCH = 1
+# Text / URL fragments of the SSO and JWXT login pages served in place of data once the session expires.
+SESSION_EXPIRED_MARKERS = ("newsso.shu.edu.cn", "统一身份认证", "login_slogin", "/sso/shulogin")
+# JWXT occasionally returns non-standard status codes (e.g. 901) when throttled or the
+# session is unstable.
+RETRYABLE_DETAIL_STATUSES = (429, 500, 502, 503, 504, 901)
 
 SCRIPT_ROOT = Path(__file__).resolve().parent
 PROJECT_ROOT = SCRIPT_ROOT.parent
@@ -55,6 +125,18 @@ DEFAULT_OUTPUT_DIR = STATIC_OUTPUT_ROOT / "data"
 DEFAULT_SECRETS_FILE = SCRIPT_ROOT / ".secrets.json"
 DEFAULT_COOKIE_STORE_FILE = SCRIPT_ROOT / ".jwxt_cookie.enc.json"
 DEFAULT_COOKIE_KEY_FILE = SCRIPT_ROOT / ".jwxt_cookie_rsa.pem"
+DEFAULT_TUNING_FILE = SCRIPT_ROOT / ".jwxt_crawl_tuning.json"
+# Per-course detail timings kept in the tuning file: courses not crawled within the age limit
+# are dropped, then the least recently crawled ones beyond the entry cap.
+DETAIL_STATS_MAX_ENTRIES = 5000
+DETAIL_STATS_MAX_AGE_SECONDS = 365 * 24 * 3600
+DEFAULT_CACHE_TTL_SECONDS = 600.0
+DEFAULT_CACHE_MAX_MB = 256
+DEFAULT_JOURNAL_FILE = SCRIPT_ROOT / ".jwxt_crawl_journal.jsonl"
+DEFAULT_FAILURES_FILE = SCRIPT_ROOT / ".jwxt_crawl_failures.json"
+DEFAULT_QUERY_CONTEXT_FILE = SCRIPT_ROOT / ".jwxt_query_context.json"
+QUERY_CONTEXT_VERSION = 1
+QUERY_CONTEXT_MAX_AGE_SECONDS = 24 * 3600
 
 RSA_PUBKEY = """-----BEGIN PUBLIC KEY-----
 MIGfMA0GCSqGSIb3DQEBAQUAA4GNADCBiQKBgQDl/aCgRl9f/4ON9MewoVnV58OL
@@ -152,28 +234,33 @@ class ProgressTracker:
         self.last_message = "准备开始"
         self._last_line_len = 0
         self._started = False
+        # Pipeline stages log from several threads.
+        self._lock = threading.RLock()
 
     def start(self, initial_message: str | None = None) -> None:
-        if initial_message:
-            self.last_message = initial_message
-        if not self._started:
-            self._started = True
-            self._render()
+        with self._lock:
+            if initial_message:
+                self.last_message = initial_message
+            if not self._started:
+                self._started = True
+                self._render()
 
     def log_step(self, message: str) -> None:
-        self.start()
-        self.completed = min(self.total_steps, self.completed + 1)
-        self.last_message = message
-        self._clear_line()
-        print(f"[{self.completed}/{self.total_steps}] {message}")
-        self._render()
+        with self._lock:
+            self.start()
+            self.completed = min(self.total_steps, self.completed + 1)
+            self.last_message = message
+            self._clear_line()
+            print(f"[{self.completed}/{self.total_steps}] {message}")
+            self._render()
 
     def log(self, message: str) -> None:
-        self.start()
-        self.last_message = message
-        self._clear_line()
-        print(message)
-        self._render()
+        with self._lock:
+            self.start()
+            self.last_message = message
+            self._clear_line()
+            print(message)
+            self._render()
 
     def _render(self) -> None:
         ratio = self.completed / self.total_steps
@@ -194,6 +281,8 @@ class ProgressTracker:
 
 
 def encrypt_password(password: str) -> str:
+    import rsa
+
     key = rsa.PublicKey.load_pkcs1_openssl_pem(RSA_PUBKEY.encode())
     encrypted = rsa.encrypt(password.encode(), key)
     return base64.b64encode(encrypted).decode()
@@ -226,6 +315,14 @@ def resolve_local_file(path_value: str | None, default: Path) -> Path:
     return target
 
 
+def resolve_local_dir(path_value: str, default: Path | None = None) -> Path:
+    target = (Path(path_value) if path_value else cast(Path, default)).expanduser().resolve()
+    if not _is_subpath(target, SCRIPT_ROOT):
+        raise ValueError(f"Local directory {target} is outside allowed root {SCRIPT_ROOT}")
+    target.mkdir(parents=True, exist_ok=True)
+    return target
+
+
 def safe_unlink(path: Path) -> None:
     try:
         path.unlink()
@@ -233,6 +330,29 @@ def safe_unlink(path: Path) -> None:
         return
 
 
+@contextlib.contextmanager
+def atomic_write(path: Path) -> Iterator[BinaryIO]:
+    """Write to a temp file beside `path`, fsync it and rename it into place."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+    try:
+        with open(tmp, "wb") as fh:
+            yield fh
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        safe_unlink(tmp)
+        raise
+    # Persist the rename itself; not every platform can open a directory for fsync.
+    with contextlib.suppress(OSError):
+        dir_fd = os.open(path.parent, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
 def _best_effort_chmod(path: Path, mode: int) -> None:
     try:
         os.chmod(path, mode)
@@ -240,6 +360,67 @@ def _best_effort_chmod(path: Path, mode: int) -> None:
         return
 
 
+class JsonCodec:
+    """orjson when installed, else the stdlib, with identical bytes; inputs orjson refuses fall back."""
+
+    def __init__(self, backend: str = "auto"):
+        if backend not in JSON_BACKENDS:
+            raise ValueError(f"Unknown JSON backend {backend!r} (expected one of {', '.join(JSON_BACKENDS)})")
+        self._orjson: Any = None
+        if backend in ("auto", "orjson"):
+            try:
+                import orjson
+            except ImportError as exc:
+                if backend == "orjson":
+                    raise RuntimeError("--json-backend orjson 需要安装 orjson（pip install orjson）") from exc
+            else:
+                self._orjson = orjson
+        self.name = "orjson" if self._orjson is not None else "stdlib"
+
+    def loads(self, data: str | bytes) -> Any:
+        if self._orjson is not None:
+            try:
+                return self._orjson.loads(data)
+            except self._orjson.JSONDecodeError:
+                pass
+        return json.loads(data)
+
+    def dumps(self, obj: Any, *, indent: bool = False, sort_keys: bool = False) -> bytes:
+        if self._orjson is not None:
+            # Same bytes as the stdlib, except floats outside [1e-4, 1e16) (tuning file only).
+            option = (self._orjson.OPT_INDENT_2 if indent else 0) | (self._orjson.OPT_SORT_KEYS if sort_keys else 0)
+            try:
+                return self._orjson.dumps(obj, option=option)
+            except (self._orjson.JSONEncodeError, TypeError):
+                pass
+        if indent:
+            text = json.dumps(obj, ensure_ascii=False, indent=2, sort_keys=sort_keys)
+        else:
+            text = json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, separators=(",", ":"))
+        return text.encode("utf-8")
+
+
+_JSON_CODEC: JsonCodec | None = None
+
+
+def configure_json_backend(backend: str = "auto") -> JsonCodec:
+    global _JSON_CODEC
+    _JSON_CODEC = JsonCodec(backend)
+    return _JSON_CODEC
+
+
+def json_codec() -> JsonCodec:
+    return _JSON_CODEC or configure_json_backend()
+
+
+def json_loads(data: str | bytes) -> Any:
+    return json_codec().loads(data)
+
+
+def json_dumps(obj: Any, *, indent: bool = False, sort_keys: bool = False) -> bytes:
+    return json_codec().dumps(obj, indent=indent, sort_keys=sort_keys)
+
+
 class CookieRecord(TypedDict, total=False):
     name: str
     value: str
@@ -258,10 +439,62 @@ class EncryptedCookieBundle(TypedDict, total=False):
     username: str
     cookies: List[CookieRecord]
     ciphertextChunks: List[str]
+    wrappedKey: str
+    nonce: str
+    ciphertext: str
 
 
+# v1: the payload in 245-byte RSA PKCS#1 v1.5 chunks. Still read, and written when `cryptography` is missing.
 COOKIE_BUNDLE_VERSION = 1
 COOKIE_BUNDLE_ALGO = "rsa-chunked-pkcs1v15"
+# v2: the payload sealed once with AES-256-GCM; only the random data key is RSA-OAEP wrapped.
+COOKIE_BUNDLE_V2_VERSION = 2
+COOKIE_BUNDLE_V2_ALGO = "rsa-oaep-sha256+aes-256-gcm"
+COOKIE_KEY_BITS = 2048
+
+
+class SessionExpiredError(RuntimeError):
+    """JWXT answered with the SSO / login page instead of data."""
+
+
+class StaleQueryContextError(RuntimeError):
+    """The cached query context no longer matches the live selection page."""
+
+
+def is_session_expired(resp: "HttpResponse", expect_json: bool = True) -> bool:
+    """Redirected to the SSO, or (on JSON endpoints only) served an HTML page mentioning it."""
+    final_url = str(getattr(resp, "url", "") or "")
+    if any(marker in final_url for marker in SESSION_EXPIRED_MARKERS):
+        return True
+    if not expect_json:
+        return False
+    text = resp.text or ""
+    return text.lstrip()[:1] == "<" and any(marker in text for marker in SESSION_EXPIRED_MARKERS)
+
+
+@functools.lru_cache(maxsize=None)
+def _thread_safe_cookie_jar_class() -> type:
+    from requests.cookies import RequestsCookieJar
+
+    class ThreadSafeCookieJar(RequestsCookieJar):
+        """Iterates over a copy taken under the jar lock, so worker threads can share one jar."""
+
+        def __iter__(self):
+            with self._cookies_lock:  # type: ignore[attr-defined]
+                return iter(list(super().__iter__()))
+
+        def copy(self) -> RequestsCookieJar:
+            new_cj = type(self)()
+            new_cj.set_policy(self.get_policy())
+            new_cj.update(self)
+            return new_cj
+
+    return ThreadSafeCookieJar
+
+
+def new_thread_safe_cookie_jar() -> RequestsCookieJar:
+    """A cookie jar worker threads can share; the class is built (and requests imported) on first use."""
+    return _thread_safe_cookie_jar_class()()
 
 
 def serialize_cookie_jar(jar: RequestsCookieJar) -> List[CookieRecord]:
@@ -281,6 +514,8 @@ def serialize_cookie_jar(jar: RequestsCookieJar) -> List[CookieRecord]:
 
 
 def apply_cookie_records(jar: RequestsCookieJar, cookies: List[CookieRecord]) -> None:
+    from requests.cookies import create_cookie
+
     jar.clear()
     for record in cookies:
         name = record.get("name") or ""
@@ -303,6 +538,8 @@ def apply_cookie_records(jar: RequestsCookieJar, cookies: List[CookieRecord]) ->
 
 
 def apply_cookie_header(jar: RequestsCookieJar, cookie_header: str, domain: str) -> None:
+    from requests.cookies import create_cookie
+
     jar.clear()
     raw = (cookie_header or "").strip()
     if not raw:
@@ -327,17 +564,45 @@ def apply_cookie_header(jar: RequestsCookieJar, cookie_header: str, domain: str)
         )
 
 
-def load_or_create_cookie_key(private_key_path: Path) -> rsa.PrivateKey:
+@functools.lru_cache(maxsize=None)
+def _cookie_crypto() -> Any:
+    """The `cryptography` primitives behind v2 cookie bundles, or None when it is not installed."""
+    try:
+        from cryptography.hazmat.primitives import hashes, serialization
+        from cryptography.hazmat.primitives.asymmetric import padding
+        from cryptography.hazmat.primitives.asymmetric import rsa as rsa_keys
+        from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    except ImportError:
+        return None
+    return SimpleNamespace(
+        hashes=hashes, serialization=serialization, padding=padding, rsa_keys=rsa_keys, AESGCM=AESGCM
+    )
+
+
+def read_cookie_key_pem(private_key_path: Path) -> bytes:
+    """PKCS#1 PEM of the local cookie key, generated on first use (fast with `cryptography`)."""
     if private_key_path.exists():
-        raw = private_key_path.read_bytes()
-        return rsa.PrivateKey.load_pkcs1(raw)
-    pub, priv = rsa.newkeys(2048)
-    private_key_path.write_bytes(priv.save_pkcs1())
+        return private_key_path.read_bytes()
+    crypto = _cookie_crypto()
+    if crypto is None:
+        import rsa
+
+        _, priv = rsa.newkeys(COOKIE_KEY_BITS)
+        pem = priv.save_pkcs1()
+    else:
+        pem = crypto.rsa_keys.generate_private_key(public_exponent=65537, key_size=COOKIE_KEY_BITS).private_bytes(
+            crypto.serialization.Encoding.PEM,
+            crypto.serialization.PrivateFormat.TraditionalOpenSSL,
+            crypto.serialization.NoEncryption(),
+        )
+    private_key_path.write_bytes(pem)
     _best_effort_chmod(private_key_path, 0o600)
-    return priv
+    return pem
 
 
 def encrypt_chunks_with_rsa(pubkey: rsa.PublicKey, plaintext: bytes) -> List[str]:
+    import rsa
+
     max_len = rsa.common.byte_size(pubkey.n) - 11
     chunks: List[str] = []
     for i in range(0, len(plaintext), max_len):
@@ -348,6 +613,8 @@ def encrypt_chunks_with_rsa(pubkey: rsa.PublicKey, plaintext: bytes) -> List[str
 
 
 def decrypt_chunks_with_rsa(privkey: rsa.PrivateKey, chunks: List[str]) -> bytes:
+    import rsa
+
     out = bytearray()
     for entry in chunks:
         encrypted = base64.b64decode(entry.encode("utf-8"))
@@ -355,24 +622,84 @@ def decrypt_chunks_with_rsa(privkey: rsa.PrivateKey, chunks: List[str]) -> bytes
     return bytes(out)
 
 
+def _cookie_bundle_aad(bundle: EncryptedCookieBundle) -> bytes:
+    # Binds the ciphertext to the header fields a reader trusts without decrypting.
+    return json_dumps(
+        {"version": bundle.get("version"), "algo": bundle.get("algo"), "username": bundle.get("username", "")},
+        sort_keys=True,
+    )
+
+
+def _load_cookie_private_key(crypto: Any, key_pem: bytes) -> Any:
+    # The key is generated locally, so skip OpenSSL's RSA consistency check (most of a warm start).
+    return crypto.serialization.load_pem_private_key(key_pem, password=None, unsafe_skip_rsa_key_validation=True)
+
+
+def _cookie_oaep(crypto: Any) -> Any:
+    return crypto.padding.OAEP(
+        mgf=crypto.padding.MGF1(algorithm=crypto.hashes.SHA256()), algorithm=crypto.hashes.SHA256(), label=None
+    )
+
+
+def seal_cookie_payload(key_pem: bytes, bundle: EncryptedCookieBundle, plaintext: bytes) -> None:
+    """Fill in the v2 `wrappedKey` / `nonce` / `ciphertext` of `bundle` (header fields already set)."""
+    crypto = _cookie_crypto()
+    private_key = _load_cookie_private_key(crypto, key_pem)
+    data_key = crypto.AESGCM.generate_key(bit_length=256)
+    nonce = os.urandom(12)
+    ciphertext = crypto.AESGCM(data_key).encrypt(nonce, plaintext, _cookie_bundle_aad(bundle))
+    wrapped = private_key.public_key().encrypt(data_key, _cookie_oaep(crypto))
+    bundle["wrappedKey"] = base64.b64encode(wrapped).decode("ascii")
+    bundle["nonce"] = base64.b64encode(nonce).decode("ascii")
+    bundle["ciphertext"] = base64.b64encode(ciphertext).decode("ascii")
+
+
+def open_cookie_payload(key_pem: bytes, bundle: EncryptedCookieBundle) -> bytes:
+    """Decrypt a v2 bundle: one RSA-OAEP unwrap plus one AES-GCM open (which authenticates the header)."""
+    crypto = _cookie_crypto()
+    private_key = _load_cookie_private_key(crypto, key_pem)
+    data_key = private_key.decrypt(base64.b64decode(str(bundle.get("wrappedKey") or "")), _cookie_oaep(crypto))
+    return crypto.AESGCM(data_key).decrypt(
+        base64.b64decode(str(bundle.get("nonce") or "")),
+        base64.b64decode(str(bundle.get("ciphertext") or "")),
+        _cookie_bundle_aad(bundle),
+    )
+
+
+def _decrypt_cookie_chunks(key_pem: bytes, chunks: List[str]) -> bytes:
+    """Decrypt a v1 bundle, with `cryptography`'s RSA when installed."""
+    crypto = _cookie_crypto()
+    if crypto is None:
+        import rsa
+
+        return decrypt_chunks_with_rsa(rsa.PrivateKey.load_pkcs1(key_pem), chunks)
+    private_key = _load_cookie_private_key(crypto, key_pem)
+    return b"".join(
+        private_key.decrypt(base64.b64decode(entry.encode("utf-8")), crypto.padding.PKCS1v15()) for entry in chunks
+    )
+
+
 def load_cookie_bundle(cookie_store_path: Path, cookie_key_path: Path) -> EncryptedCookieBundle | None:
     if not cookie_store_path.exists():
         return None
     if not cookie_key_path.exists():
         return None
     try:
-        raw = cookie_store_path.read_text(encoding="utf-8")
-        bundle = cast(EncryptedCookieBundle, json.loads(raw))
-        if bundle.get("version") != COOKIE_BUNDLE_VERSION:
-            return None
-        if bundle.get("algo") != COOKIE_BUNDLE_ALGO:
-            return None
-        chunks = bundle.get("ciphertextChunks") or []
-        if not isinstance(chunks, list) or not chunks:
+        bundle = cast(EncryptedCookieBundle, json_loads(cookie_store_path.read_bytes()))
+        key_pem = read_cookie_key_pem(cookie_key_path)
+        header = (bundle.get("version"), bundle.get("algo"))
+        if header == (COOKIE_BUNDLE_V2_VERSION, COOKIE_BUNDLE_V2_ALGO):
+            if _cookie_crypto() is None:
+                return None
+            decrypted = open_cookie_payload(key_pem, bundle)
+        elif header == (COOKIE_BUNDLE_VERSION, COOKIE_BUNDLE_ALGO):
+            chunks = bundle.get("ciphertextChunks") or []
+            if not isinstance(chunks, list) or not chunks:
+                return None
+            decrypted = _decrypt_cookie_chunks(key_pem, [str(x) for x in chunks])
+        else:
             return None
-        priv = load_or_create_cookie_key(cookie_key_path)
-        decrypted = decrypt_chunks_with_rsa(priv, [str(x) for x in chunks])
-        payload = json.loads(decrypted.decode("utf-8"))
+        payload = json_loads(decrypted)
         cookies = payload.get("cookies")
         if not isinstance(cookies, list):
             return None
@@ -385,33 +712,91 @@ def load_cookie_bundle(cookie_store_path: Path, cookie_key_path: Path) -> Encryp
 def save_cookie_bundle(
     cookie_store_path: Path, cookie_key_path: Path, username: str | None, jar: RequestsCookieJar
 ) -> None:
-    priv = load_or_create_cookie_key(cookie_key_path)
-    pub = rsa.PublicKey(priv.n, priv.e)
+    """Encrypt the jar as a v2 bundle, or as v1 when `cryptography` is not installed."""
+    key_pem = read_cookie_key_pem(cookie_key_path)
     now_ms = int(time.time() * 1000)
     payload = {
         "cookies": serialize_cookie_jar(jar),
         "savedAtMs": now_ms,
     }
-    ciphertext_chunks = encrypt_chunks_with_rsa(pub, json.dumps(payload, ensure_ascii=False).encode("utf-8"))
+    v2 = _cookie_crypto() is not None
     bundle: EncryptedCookieBundle = {
-        "version": COOKIE_BUNDLE_VERSION,
-        "algo": COOKIE_BUNDLE_ALGO,
+        "version": COOKIE_BUNDLE_V2_VERSION if v2 else COOKIE_BUNDLE_VERSION,
+        "algo": COOKIE_BUNDLE_V2_ALGO if v2 else COOKIE_BUNDLE_ALGO,
         "createdAtMs": now_ms,
         "updatedAtMs": now_ms,
         "username": (username or "").strip(),
-        "ciphertextChunks": ciphertext_chunks,
     }
-    cookie_store_path.write_text(json.dumps(bundle, ensure_ascii=False, indent=2), encoding="utf-8")
+    if v2:
+        seal_cookie_payload(key_pem, bundle, json_dumps(payload))
+    else:
+        import rsa
+
+        priv = rsa.PrivateKey.load_pkcs1(key_pem)
+        bundle["ciphertextChunks"] = encrypt_chunks_with_rsa(rsa.PublicKey(priv.n, priv.e), json_dumps(payload))
+    cookie_store_path.write_bytes(json_dumps(bundle, indent=True))
     _best_effort_chmod(cookie_store_path, 0o600)
 
 
+def query_context_fingerprint(fields: Dict[str, str], tabs: List[Dict[str, str]]) -> str:
+    """Identity of the open selection rounds; changes when a round opens or closes."""
+    material = {
+        "fields": {key: fields.get(key, "") for key in ("firstXkkzId", "xkxnm", "xkxqm", "xszxzt")},
+        "tabs": sorted(
+            (tab.get("xkkz_id", ""), tab.get("kklxdm", ""), tab.get("njdm_id", ""), tab.get("zyh_id", ""))
+            for tab in tabs
+        ),
+    }
+    return hashlib.sha256(json_dumps(material, sort_keys=True)).hexdigest()[:16]
+
+
+def load_query_context(path: Path) -> Dict[str, Any] | None:
+    if not path.exists():
+        return None
+    try:
+        data = json_loads(path.read_bytes())
+    except Exception:
+        return None
+    if not isinstance(data, dict) or data.get("version") != QUERY_CONTEXT_VERSION:
+        return None
+    if data.get("backendOrigin") != JWXT_HOST:
+        return None
+    age_ms = time.time() * 1000 - int(data.get("savedAtMs") or 0)
+    if age_ms > QUERY_CONTEXT_MAX_AGE_SECONDS * 1000:
+        return None
+    if not isinstance(data.get("fields"), dict) or not isinstance(data.get("tabs"), list):
+        return None
+    return data
+
+
+def save_query_context(
+    path: Path,
+    fields: Dict[str, str],
+    tabs: List[Dict[str, str]],
+    display_contexts: Dict[Tuple[str, str, str, str, str], Tuple[Dict[str, str], str, List[Dict[str, str]]]],
+) -> None:
+    data = {
+        "version": QUERY_CONTEXT_VERSION,
+        "backendOrigin": JWXT_HOST,
+        "savedAtMs": int(time.time() * 1000),
+        "fingerprint": query_context_fingerprint(fields, tabs),
+        "fields": fields,
+        "tabs": tabs,
+        "display": [
+            {"key": list(key), "inputs": inputs, "xqhId": selected, "campusOptions": options}
+            for key, (inputs, selected, options) in display_contexts.items()
+        ],
+    }
+    path.write_bytes(json_dumps(data, indent=True))
+    _best_effort_chmod(path, 0o600)
+
+
 def load_local_secrets(path: Path) -> Tuple[str | None, str | None]:
     if not path.exists():
         return None, None
     try:
-        with path.open("r", encoding="utf-8") as fh:
-            data = json.load(fh)
-            return data.get("username"), data.get("password")
+        data = json_loads(path.read_bytes())
+        return data.get("username"), data.get("password")
     except Exception:
         return None, None
 
@@ -490,12 +875,111 @@ def prompt_request_interval(default: float = 0.0) -> float:
     return value
 
 
+def cloud_validators_path(path: Path) -> Path:
+    return path.with_name(f".{path.name}.http.json")
+
+
+def read_cloud_validators(path: Path) -> Dict[str, str]:
+    """Conditional-request headers for `path`, unless a local crawl has rewritten it since."""
+    try:
+        saved = json_loads(cloud_validators_path(path).read_bytes())
+        stat = path.stat()
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(saved, dict) or saved.get("size") != stat.st_size or saved.get("mtimeNs") != stat.st_mtime_ns:
+        return {}
+    headers = {}
+    if saved.get("etag"):
+        headers["If-None-Match"] = str(saved["etag"])
+    if saved.get("lastModified"):
+        headers["If-Modified-Since"] = str(saved["lastModified"])
+    return headers
+
+
+class _SnapshotStreamDigest:
+    """Size, sha256 and canonical `courses` md5 of a snapshot body as it streams by."""
+
+    MARKER = b'"courses":'
+    HEAD_LIMIT = 1024 * 1024
+    TAIL = 64
+
+    def __init__(self) -> None:
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+        self.envelope: bytes | None = None
+        self._head = b""
+        self._tail = b""
+        self._courses_head = b""
+        self._md5: Any = None
+
+    def feed(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            if chunk:
+                self.update(chunk)
+                yield chunk
+
+    def update(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        self.sha256.update(chunk)
+        if self._md5 is None:
+            if len(self._head) > self.HEAD_LIMIT:
+                return
+            self._head += chunk
+            at = self._head.find(self.MARKER)
+            if at < 0:
+                return
+            self.envelope = self._head[:at]
+            self._md5 = hashlib.md5()
+            chunk = self._head[at + len(self.MARKER) :]
+            self._head = b""
+        if not self._courses_head:
+            # Whitespace after the marker (`--pretty-json`) may span several chunks.
+            chunk = chunk.lstrip()
+            if not chunk:
+                return
+        if len(self._courses_head) < 3:
+            self._courses_head = (self._courses_head + chunk)[:3]
+        data = self._tail + chunk
+        cut = max(len(data) - self.TAIL, 0)
+        self._md5.update(data[:cut])
+        self._tail = data[cut:]
+
+    def courses_md5(self) -> str | None:
+        """md5 of the `courses` bytes, or None unless they are in the canonical one-row-per-line layout."""
+        if self._md5 is None or not (self._courses_head == b"[\n{" or self._courses_head.startswith(b"[]")):
+            return None
+        tail = self._tail.rstrip()
+        md5 = self._md5.copy()
+        md5.update(tail[:-1].rstrip() if tail.endswith(b"}") else tail)
+        return md5.hexdigest()
+
+    def verify(self, name: str, entry: Dict[str, Any]) -> None:
+        """Raise RuntimeError unless the body matches what `entry` and its own `hash` advertise."""
+        sizes = entry.get("sizes") if isinstance(entry.get("sizes"), dict) else {}
+        if sizes.get("json") is not None and sizes["json"] != self.size:
+            raise RuntimeError(f"云端快照 {name} 大小不符：{self.size} != {sizes['json']}")
+        if entry.get("object") and entry["object"] != self.sha256.hexdigest():
+            raise RuntimeError(f"云端快照 {name} sha256 校验失败")
+        match = re.search(rb'"hash"\s*:\s*"([0-9a-f]*)"', self.envelope or b"")
+        expected = match.group(1).decode("ascii") if match else ""
+        actual = self.courses_md5()
+        if expected and actual is not None and actual != expected:
+            raise RuntimeError(f"云端快照 {name} hash 校验失败")
+
+
 def download_cloud_snapshot(
     output_dir: Path,
     cloud_base_url: str,
     download_all_terms: bool = True,
     request_interval: float = 0.0,
+    workers: int = DEFAULT_CLOUD_WORKERS,
 ) -> None:
+    """Mirror the cloud current.json and term snapshots into `output_dir` with conditional requests."""
+    import concurrent.futures
+
+    import requests
+    from requests.adapters import HTTPAdapter
+
     base = cloud_base_url.rstrip("/")
     progress = ProgressTracker(total_steps=3)
     progress.start("未登录：使用云端课程快照作为兜底数据源")
@@ -511,17 +995,20 @@ def download_cloud_snapshot(
             )
         }
     )
+    workers = max(1, workers)
+    session.mount("http://", HTTPAdapter(pool_maxsize=workers))
+    session.mount("https://", HTTPAdapter(pool_maxsize=workers))
 
-    def sleep_if_needed() -> None:
-        if request_interval > 0:
-            time.sleep(request_interval)
+    # One bucket for all workers, so `request_interval` spaces requests across the whole pool
+    # (as JWXTCrawler maps it), not per worker.
+    limiter = TokenBucket(1.0 / request_interval if request_interval > 0 else None)
 
-    sleep_if_needed()
+    limiter.acquire()
     current_url = f"{base}/current.json"
     res = session.get(current_url, timeout=30)
     if res.status_code != 200:
         raise RuntimeError(f"Failed to download cloud current.json ({res.status_code})")
-    raw_current = res.json()
+    raw_current = json_loads(res.content)
     term_ids: List[str] = []
     current_rows: List[Dict[str, object]] = []
     if isinstance(raw_current, list):
@@ -542,229 +1029,1322 @@ def download_cloud_snapshot(
         raise RuntimeError("Cloud current.json is empty or has unsupported schema")
     progress.log_step(f"云端 current.json 获取成功：{len(term_ids)} 个学期")
 
-    target_terms = term_ids if download_all_terms else [term_ids[-1]]
+    # Later rows win, matching how the loop below used to assign sizes.
+    advertised = {str(row.get("termId")): dict(row) for row in current_rows}
+
+    def fetch_term(term_id: str) -> Tuple[Dict[str, int], bool]:
+        limiter.acquire()
+        term_path = output_dir / "terms" / f"{term_id}.json"
+        conditional = read_cloud_validators(term_path)
+        with session.get(f"{base}/terms/{term_id}.json", headers=conditional, timeout=60, stream=True) as term_res:
+            if term_res.status_code == 304 and conditional:
+                return snapshot_variant_sizes(term_path), False
+            if term_res.status_code != 200:
+                raise RuntimeError(f"Failed to download cloud term {term_id} ({term_res.status_code})")
+            digest = _SnapshotStreamDigest()
+            sizes = write_with_variants(
+                term_path,
+                digest.feed(term_res.iter_content(CLOUD_STREAM_CHUNK)),
+                verify=lambda: digest.verify(term_id, advertised.get(term_id, {})),
+            )
+            validators = {"etag": term_res.headers.get("ETag"), "lastModified": term_res.headers.get("Last-Modified")}
+        if any(validators.values()):
+            stat = term_path.stat()
+            write_json_atomic(
+                cloud_validators_path(term_path),
+                {**validators, "size": stat.st_size, "mtimeNs": stat.st_mtime_ns, "sha256": digest.sha256.hexdigest()},
+            )
+        else:
+            safe_unlink(cloud_validators_path(term_path))
+        remove_snapshot_v2(snapshot_v2_path(term_path))
+        remove_round_shards(term_path)
+        remove_snapshot_deltas(term_path)
+        return sizes, True
+
+    target_terms = list(dict.fromkeys(term_ids if download_all_terms else [term_ids[-1]]))
     os.makedirs(output_dir / "terms", exist_ok=True)
-    for term_id in target_terms:
-        sleep_if_needed()
-        term_url = f"{base}/terms/{term_id}.json"
-        term_res = session.get(term_url, timeout=60)
-        if term_res.status_code != 200:
-            raise RuntimeError(f"Failed to download cloud term {term_id} ({term_res.status_code})")
-        (output_dir / "terms" / f"{term_id}.json").write_bytes(term_res.content)
-    with open(output_dir / "current.json", "w", encoding="utf-8") as fh:
-        json.dump(current_rows, fh, ensure_ascii=False, indent=2)
-    progress.log_step(f"云端课程快照下载完成：{len(target_terms)} 个学期")
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(workers, len(target_terms))) as executor:
+        results = dict(zip(target_terms, executor.map(fetch_term, target_terms)))
+    session.close()
+    for row in current_rows:
+        if row.get("termId") in results:
+            # Only the plain snapshot is mirrored; its v2 / shard / delta / object files are not.
+            for key in PUBLISHED_FILE_KEYS:
+                row.pop(key, None)
+            row["sizes"] = results[row["termId"]][0]
+    current_path = output_dir / "current.json"
+    current_bytes = json_dumps(current_rows, indent=True)
+    if not current_path.exists() or current_path.read_bytes() != current_bytes:
+        with atomic_write(current_path) as fh:
+            fh.write(current_bytes)
+    updated = sum(1 for _, changed in results.values() if changed)
+    progress.log_step(
+        f"云端课程快照下载完成：{len(target_terms)} 个学期（更新 {updated} 个，未变化 {len(target_terms) - updated} 个）"
+    )
 
     progress.log_step("提示：登录抓取一次可自动保存加密 cookie，后续免密刷新")
 
 
-class JWXTCrawler:
-    def __init__(
-        self,
-        username: str,
-        password: str,
-        workers: int = 8,
-        request_interval: float = 0.0,
-    ):
-        self.username = username
-        self.password = password
-        self.workers = workers
-        self.request_interval = max(0.0, request_interval)
-        self.session = requests.Session()
-        self.session.verify = False
-        self.session.headers.update(
-            {
-                "User-Agent": (
-                    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
-                    "AppleWebKit/537.36 (KHTML, like Gecko) "
-                    "Chrome/120.0.0.0 Safari/537.36"
-                )
-            }
-        )
-        self._thread_local = threading.local()
-        self._rate_lock = threading.Lock()
-        self._last_request_at = 0.0
+def load_concurrency_hint(tuning_path: Path, engine: str) -> int | None:
+    if not tuning_path.exists():
+        return None
+    try:
+        data = json_loads(tuning_path.read_bytes())
+        entry = (data.get("concurrency") or {}).get(engine) or {}
+        limit = int(entry.get("limit") or 0)
+        return limit if limit > 0 else None
+    except Exception:
+        return None
 
-    def _sleep_if_needed(self) -> None:
-        if self.request_interval <= 0:
-            return
-        with self._rate_lock:
-            now = time.time()
-            wait = self._last_request_at + self.request_interval - now
-            if wait > 0:
-                time.sleep(wait)
-            self._last_request_at = time.time()
 
-    def login(self) -> None:
-        self._sleep_if_needed()
-        resp = self.session.get(f"{JWXT_HOST}/sso/shulogin", allow_redirects=False)
-        if resp.status_code not in (301, 302):
-            raise RuntimeError(f"Unexpected SSO entry status {resp.status_code}")
-        url = urljoin(resp.url, resp.headers.get("Location", ""))
+def _read_tuning_file(tuning_path: Path) -> Dict[str, Any]:
+    if not tuning_path.exists():
+        return {}
+    try:
+        raw = json_loads(tuning_path.read_bytes())
+    except Exception:
+        return {}
+    return raw if isinstance(raw, dict) else {}
 
-        self._sleep_if_needed()
-        resp = self.session.get(url, allow_redirects=False)
-        if resp.status_code not in (301, 302):
-            raise RuntimeError("Failed to reach SHU SSO login page")
-        login_url = urljoin(url, resp.headers.get("Location", ""))
 
-        # Load login page to obtain required cookies
-        self._sleep_if_needed()
-        login_page = self.session.get(login_url, timeout=15)
-        post_url = login_url
+def save_concurrency_hint(tuning_path: Path, engine: str, limit: int) -> None:
+    data = _read_tuning_file(tuning_path)
+    concurrency = data.get("concurrency")
+    if not isinstance(concurrency, dict):
+        concurrency = {}
+    concurrency[engine] = {"limit": int(limit), "updatedAtMs": int(time.time() * 1000)}
+    data["concurrency"] = concurrency
+    tuning_path.write_bytes(json_dumps(data, indent=True))
+
+
+def load_detail_stats(tuning_path: Path) -> Dict[str, Dict[str, float]]:
+    stats = _read_tuning_file(tuning_path).get("detailStats")
+    if not isinstance(stats, dict):
+        return {}
+    # Entries written before `seenAtMs` existed start their age from this load.
+    now_ms = int(time.time() * 1000)
+    return {
+        str(kch_id): {**entry, "seenAtMs": entry.get("seenAtMs") or now_ms}
+        for kch_id, entry in stats.items()
+        if isinstance(entry, dict)
+    }
+
+
+def trim_detail_stats(
+    stats: Dict[str, Dict[str, float]], now_ms: int | None = None
+) -> Dict[str, Dict[str, float]]:
+    """Rolling window over `detailStats`: drop stale entries, then keep the most recently seen."""
+    if now_ms is None:
+        now_ms = int(time.time() * 1000)
+    cutoff = now_ms - DETAIL_STATS_MAX_AGE_SECONDS * 1000
+
+    def seen(kch_id: str) -> float:
         try:
-            soup = BeautifulSoup(login_page.text, "html.parser")
-            form = soup.find("form")
-            if form is not None and form.get("action"):
-                post_url = urljoin(login_url, str(form.get("action")))
-        except Exception:
-            post_url = login_url
+            return float(stats[kch_id].get("seenAtMs") or 0)
+        except (TypeError, ValueError):
+            return 0.0
 
-        payload = {
-            "username": self.username,
-            "password": encrypt_password(self.password),
-        }
-        self._sleep_if_needed()
-        resp = self.session.post(
-            post_url,
-            data=payload,
-            headers={
-                "Content-Type": "application/x-www-form-urlencoded",
-                "Origin": "https://newsso.shu.edu.cn",
-                "Referer": login_url,
-            },
-            allow_redirects=True,
-            timeout=15,
-        )
+    recent = sorted((kch_id for kch_id in stats if seen(kch_id) >= cutoff), key=seen, reverse=True)
+    return {kch_id: stats[kch_id] for kch_id in sorted(recent[:DETAIL_STATS_MAX_ENTRIES])}
 
-        # Some SSO flows may end on a POST-only endpoint (GET => 405) while the session
-        # is already established. Avoid failing early and let the downstream JWXT page
-        # load be the source of truth.
-        if resp.status_code >= 500:
-            raise RuntimeError(f"Login failed, last status {resp.status_code}")
 
-        self.warmup()
+def save_detail_stats(tuning_path: Path, stats: Dict[str, Dict[str, float]]) -> None:
+    data = _read_tuning_file(tuning_path)
+    data["detailStats"] = trim_detail_stats(stats)
+    tuning_path.write_bytes(json_dumps(data, indent=True))
 
-    def warmup(self) -> None:
-        self._sleep_if_needed()
-        self.session.get(
-            f"{JWXT_HOST}/jwglxt/xtgl/index_initMenu.html?"
-            f"jsdm=xs&_t={int(time.time()*1000)}",
-            timeout=15,
-        )
 
-    def fetch_selection_page(self) -> Tuple[str, Dict[str, str]]:
-        self._sleep_if_needed()
-        resp = self.session.get(SELECTION_ENDPOINT, timeout=15)
-        if resp.status_code != 200:
-            raise RuntimeError(
-                f"Failed to load selection page ({resp.status_code})"
-            )
-        soup = BeautifulSoup(resp.text, "html.parser")
-        fields: Dict[str, str] = {}
-        for tag in soup.find_all("input"):
-            tag_id = tag.get("id")
-            if tag_id:
-                fields[tag_id] = tag.get("value") or ""
-        if not fields.get("firstXkkzId"):
-            raise RuntimeError("Cannot find xkkz information on selection page")
-        return resp.text, fields
+class SlotGate:
+    """Counting gate with a mutable limit for worker threads and the async loop."""
 
-    def parse_round_tabs(self, html: str) -> List[Dict[str, str]]:
-        tabs: List[Dict[str, str]] = []
-        re_tab = re.compile(
-            r"<li\b([^>]*)>\s*<a\b[^>]*onclick=\"queryCourse\(this,'([^']+)','([^']+)','([^']+)','([^']+)'\)\"[^>]*>([^<]*)</a>",
-            flags=re.IGNORECASE,
-        )
-        for match in re_tab.finditer(html):
-            li_attrs = match.group(1) or ""
-            kklxdm = match.group(2) or ""
-            xkkz_id = match.group(3) or ""
-            njdm_id = match.group(4) or ""
-            zyh_id = match.group(5) or ""
-            label = (match.group(6) or "").strip()
-            if not kklxdm or not xkkz_id:
-                continue
-            tabs.append(
-                {
-                    "kklxdm": kklxdm,
-                    "xkkz_id": xkkz_id,
-                    "njdm_id": njdm_id,
-                    "zyh_id": zyh_id,
-                    "label": label,
-                    "active": "1" if re.search(r"\bactive\b", li_attrs, flags=re.IGNORECASE) else "0",
-                }
-            )
-        if tabs:
-            return tabs
-
-        soup = BeautifulSoup(html, "html.parser")
-        for anchor in soup.select("#nav_tab a[onclick]"):
-            onclick = (anchor.get("onclick") or "").strip()
-            match = re.search(
-                r"queryCourse\(this,'([^']+)','([^']+)','([^']+)','([^']+)'\)",
-                onclick,
-            )
-            if not match:
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.in_flight = 0
+        self.cond = threading.Condition()
+        self._async_waiters: deque[asyncio.Future] = deque()
+
+    def acquire(self) -> None:
+        with self.cond:
+            while self.in_flight >= self.limit:
+                self.cond.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self) -> None:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.cond:
+                if self.in_flight < self.limit:
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append(waiter)
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self.cond:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+                    else:
+                        self._wake()
+                raise
+
+    def release(self) -> None:
+        with self.cond:
+            self.in_flight -= 1
+            self._wake()
+
+    def _wake(self) -> None:
+        # Caller holds `cond`. One wake-up per free slot; woken waiters re-check the count.
+        free = self.limit - self.in_flight
+        if free <= 0:
+            return
+        self.cond.notify(free)
+        while free > 0 and self._async_waiters:
+            waiter = self._async_waiters.popleft()
+            if waiter.done():
                 continue
-            parent = anchor.parent
-            is_active = False
-            if parent is not None:
-                classes = parent.get("class") or []
-                is_active = any(str(c).lower() == "active" for c in classes)
-            tabs.append(
-                {
-                    "kklxdm": match.group(1),
-                    "xkkz_id": match.group(2),
-                    "njdm_id": match.group(3),
-                    "zyh_id": match.group(4),
-                    "label": (anchor.get_text() or "").strip(),
-                    "active": "1" if is_active else "0",
-                }
-            )
-        return tabs
+            waiter.get_loop().call_soon_threadsafe(_resolve_waiter, waiter)
+            free -= 1
 
-    def fetch_display_fields(
+
+def _resolve_waiter(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class TokenBucket:
+    """Token-bucket limiter shared by every request; `rate=None` disables it."""
+
+    def __init__(self, rate: float | None, burst: int = 1, max_concurrent: int | None = None):
+        self.rate = rate if rate and rate > 0 else None
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        self._gate = SlotGate(max_concurrent) if max_concurrent else None
+
+    def _reserve(self) -> float:
+        if self.rate is None:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve under the lock (the balance may go negative), sleep outside it.
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def acquire(self) -> None:
+        if self._gate:
+            self._gate.acquire()
+        wait = self._reserve()
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        import asyncio
+
+        if self._gate:
+            await self._gate.acquire_async()
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def release(self) -> None:
+        if self._gate:
+            self._gate.release()
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on in-flight detail requests, fed by JWXT throttle signals and p95 latency."""
+
+    LATENCY_WINDOW = 32
+    MIN_LATENCY_SAMPLES = 16
+
+    def __init__(
         self,
+        initial: int,
         *,
-        xkkz_id: str,
-        kklxdm: str,
-        njdm_id: str,
-        zyh_id: str,
-        xszxzt: str,
-    ) -> Dict[str, str]:
-        payload = {
-            "xkkz_id": xkkz_id,
-            "xszxzt": xszxzt or "1",
-            "kklxdm": kklxdm,
-            "njdm_id": njdm_id,
-            "zyh_id": zyh_id,
-            "kspage": "0",
-            "jspage": "0",
-        }
-        self._sleep_if_needed()
-        resp = self.session.post(
-            DISPLAY_ENDPOINT,
-            data=payload,
-            headers={
-                "X-Requested-With": "XMLHttpRequest",
-                "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-                "Referer": SELECTION_ENDPOINT,
-            },
-            timeout=30,
-        )
-        if resp.status_code != 200:
-            raise RuntimeError(
-                f"Display page request failed ({resp.status_code}): "
-                f"{resp.text[:200]}"
+        maximum: int,
+        minimum: int = 1,
+        decrease_factor: float = 0.5,
+        latency_tolerance: float = 1.5,
+    ):
+        self.minimum = max(1, minimum)
+        self.maximum = max(self.minimum, maximum)
+        self.decrease_factor = decrease_factor
+        self.latency_tolerance = latency_tolerance
+        self._gate = SlotGate(min(max(initial, self.minimum), self.maximum))
+        self.peak = self._gate.limit
+        self.decreases = 0
+        self._epoch = 0
+        self._round_successes = 0
+        self._latencies: deque[float] = deque(maxlen=self.LATENCY_WINDOW)
+        self._baseline_p95: float | None = None
+
+    @property
+    def limit(self) -> int:
+        return self._gate.limit
+
+    def acquire(self) -> Tuple[float, int]:
+        self._gate.acquire()
+        return time.monotonic(), self._epoch
+
+    async def acquire_async(self) -> Tuple[float, int]:
+        await self._gate.acquire_async()
+        return time.monotonic(), self._epoch
+
+    def release(self, token: Tuple[float, int], status: int | None) -> None:
+        """`status` is the HTTP status, or None when the request raised before responding."""
+        started, epoch = token
+        latency = time.monotonic() - started
+        with self._gate.cond:
+            if status is None or status in RETRYABLE_DETAIL_STATUSES:
+                # Failures already in flight when the limit was cut only count once.
+                if epoch == self._epoch:
+                    self._decrease()
+            elif status == 200:
+                self._latencies.append(latency)
+                self._round_successes += 1
+                if self._round_successes >= self._gate.limit:
+                    self._end_round()
+            self._gate.release()
+
+    def _end_round(self) -> None:
+        self._round_successes = 0
+        if len(self._latencies) >= self.MIN_LATENCY_SAMPLES:
+            latencies = sorted(self._latencies)
+            p95 = latencies[int(0.95 * (len(latencies) - 1))]
+            if self._baseline_p95 is not None and p95 > self._baseline_p95 * self.latency_tolerance:
+                self._decrease()
+                return
+            self._baseline_p95 = (
+                p95 if self._baseline_p95 is None else 0.8 * self._baseline_p95 + 0.2 * p95
             )
-        soup = BeautifulSoup(resp.text, "html.parser")
-        fields: Dict[str, str] = {}
-        for tag in soup.find_all("input"):
-            tag_id = tag.get("id")
-            if tag_id:
-                fields[tag_id] = tag.get("value") or ""
-        return fields
+        self._gate.limit = min(self.maximum, self._gate.limit + 1)
+        self.peak = max(self.peak, self._gate.limit)
+
+    def _decrease(self) -> None:
+        self._epoch += 1
+        self._round_successes = 0
+        self._latencies.clear()
+        if self._gate.limit > self.minimum:
+            self._gate.limit = max(self.minimum, int(self._gate.limit * self.decrease_factor))
+            self.decreases += 1
+
+
+class RetryQueue:
+    """Failed detail requests waiting out a jittered backoff outside the worker slots."""
+
+    def __init__(self, backoff_seconds: float):
+        self.backoff_seconds = backoff_seconds
+        self._heap: List[Tuple[float, int, Any]] = []
+        self._seq = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, item: Any, attempt: int) -> None:
+        delay = self.backoff_seconds * attempt * random.uniform(0.5, 1.5)
+        self._seq += 1
+        heapq.heappush(self._heap, (time.monotonic() + delay, self._seq, item))
+
+    def pop_ready(self) -> List[Any]:
+        now = time.monotonic()
+        ready: List[Any] = []
+        while self._heap and self._heap[0][0] <= now:
+            ready.append(heapq.heappop(self._heap)[2])
+        return ready
+
+    def delay(self) -> float | None:
+        """Seconds until the next item is due, or None when nothing is waiting."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - time.monotonic())
+
+
+class DetailResponseCache:
+    """On-disk cache of JWXT response bodies keyed by endpoint and payload, with TTL and LRU cap."""
+
+    def __init__(self, root: Path, ttl_seconds: float, max_bytes: int):
+        self.root = root
+        self.ttl_seconds = max(0.0, ttl_seconds)
+        self.max_bytes = max(0, max_bytes)
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._total_bytes = sum(entry.stat().st_size for entry in self._entries())
+
+    @staticmethod
+    def key(endpoint: str, payload: Dict[str, str]) -> str:
+        canonical = json_dumps({"endpoint": endpoint, "payload": payload}, sort_keys=True)
+        return hashlib.sha256(canonical).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def _entries(self) -> List[Path]:
+        return list(self.root.glob("*/*.json"))
+
+    def get(self, endpoint: str, payload: Dict[str, str]) -> str | None:
+        path = self._path(self.key(endpoint, payload))
+        try:
+            entry = json_loads(path.read_bytes())
+            fresh = time.time() * 1000 - int(entry.get("storedAtMs") or 0) <= self.ttl_seconds * 1000
+            body = entry.get("body") if fresh else None
+        except Exception:
+            body = None
+        with self._lock:
+            if isinstance(body, str):
+                self.hits += 1
+            else:
+                self.misses += 1
+        if not isinstance(body, str):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return body
+
+    def put(self, endpoint: str, payload: Dict[str, str], body: str) -> None:
+        path = self._path(self.key(endpoint, payload))
+        data = json_dumps({"endpoint": endpoint, "storedAtMs": int(time.time() * 1000), "body": body})
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            previous = path.stat().st_size if path.exists() else 0
+            tmp = path.with_suffix(f".{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError:
+            return
+        with self._lock:
+            self.stores += 1
+            self._total_bytes += len(data) - previous
+            if self.max_bytes and self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Drop least recently used entries until the cache is back under 90% of the cap.
+        target = int(self.max_bytes * 0.9)
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry))
+        entries.sort()
+        self._total_bytes = sum(size for _, size, _ in entries)
+        for _, size, entry in entries:
+            if self._total_bytes <= target:
+                break
+            safe_unlink(entry)
+            self._total_bytes -= size
+            self.evictions += 1
+
+    def summary(self) -> str:
+        lookups = self.hits + self.misses
+        rate = self.hits / lookups if lookups else 0.0
+        return (
+            f"命中 {self.hits}/{lookups}（{rate:.0%}），写入 {self.stores}，"
+            f"淘汰 {self.evictions}，占用 {self._total_bytes / 1024 / 1024:.1f} MB"
+        )
+
+
+class CrawlJournal:
+    """Append-only JSON-lines record of finished detail fetches, for `--resume`."""
+
+    def __init__(self, path: Path, resume: bool = False):
+        self.path = path
+        self.resumed = 0
+        self._done: Dict[Tuple[str, str], Dict[str, List[Dict]]] = {}
+        self._lock = threading.Lock()
+        if resume:
+            self._load()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._fh = open(path, "a" if resume else "w", encoding="utf-8")
+
+    @staticmethod
+    def scope(params: Dict[str, str]) -> Tuple[str, str]:
+        return (params.get("xkkz_id", ""), params.get("xqh_id", ""))
+
+    def _load(self) -> None:
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                record = json_loads(line)
+                scope = (str(record["x"]), str(record["q"]))
+                self._done.setdefault(scope, {})[str(record["k"])] = list(record["rows"])
+            except Exception:
+                continue
+
+    def completed(self, params: Dict[str, str]) -> Dict[str, List[Dict]]:
+        return self._done.get(self.scope(params), {})
+
+    def record(self, params: Dict[str, str], kch_id: str, rows: List[Dict]) -> None:
+        xkkz_id, xqh_id = self.scope(params)
+        line = json_dumps({"x": xkkz_id, "q": xqh_id, "k": kch_id, "rows": rows}).decode("utf-8")
+        with self._lock:
+            if self._fh.closed:
+                return
+            self._fh.write(line + "\n")
+            self._fh.flush()
+            # A round retried within the same run (reloaded query context) reuses it too.
+            self._done.setdefault((xkkz_id, xqh_id), {})[kch_id] = rows
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+
+    def discard(self) -> None:
+        self.close()
+        safe_unlink(self.path)
+
+
+class HttpResponse(Protocol):
+    """The subset of `requests.Response` / `httpx.Response` the crawler relies on."""
+
+    status_code: int
+    text: str
+    content: bytes
+    elapsed: timedelta
+
+
+class AsyncHttpEngine:
+    """One `httpx.AsyncClient` on a private event-loop thread, sharing the session's cookie jar."""
+
+    def __init__(self, session: requests.Session, max_in_flight: int):
+        import asyncio
+
+        try:
+            import httpx
+        except ImportError as exc:
+            raise RuntimeError("--engine async 需要安装 httpx（pip install httpx）") from exc
+        self.max_in_flight = max(1, max_in_flight)
+        self._client = httpx.AsyncClient(
+            cookies=session.cookies,
+            headers=dict(session.headers),
+            verify=False,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_in_flight,
+                max_keepalive_connections=self.max_in_flight,
+            ),
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="jwxt-async-engine", daemon=True
+        )
+        self._thread.start()
+
+    def run(self, coro: Any) -> Any:
+        import asyncio
+
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def post(self, url: str, data: Dict[str, str], timeout: float) -> HttpResponse:
+        return await self._client.post(url, data=data, headers=XHR_HEADERS, timeout=timeout)
+
+    async def head(self, url: str, timeout: float) -> HttpResponse:
+        return await self._client.head(url, timeout=timeout)
+
+    def close(self) -> None:
+        if self._loop.is_closed():
+            return
+        try:
+            self.run(self._client.aclose())
+        finally:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop.close()
+
+
+# Selection / display pages are only read for their `<input id value>` pairs, a campus
+# `<select>` and the round tabs, so extraction never needs a full document tree.
+# `stdlib`: streaming html.parser that keeps only those elements; `lxml` / `selectolax`:
+# optional C parsers; `bs4`: a BeautifulSoup walk. All of them must agree with
+# extract_page_fields_reference(), the parsing the crawler did before backends existed.
+HTML_BACKENDS = ("auto", "stdlib", "lxml", "selectolax", "bs4")
+HTML_SELECT_IDS = ("xqh_id",)
+HTML_VOID_ELEMENTS = frozenset(
+    ("area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "param", "source", "track", "wbr")
+)
+ROUND_TAB_ONCLICK = re.compile(r"queryCourse\(this,'([^']+)','([^']+)','([^']+)','([^']+)'\)")
+ROUND_TAB_ITEM = re.compile(
+    r"<li\b([^>]*)>\s*<a\b[^>]*onclick=\"queryCourse\(this,'([^']+)','([^']+)','([^']+)','([^']+)'\)\"[^>]*>([^<]*)</a>",
+    flags=re.IGNORECASE,
+)
+ROUND_TAB_CONTAINER_ID = "nav_tab"
+
+
+class PageFields(TypedDict):
+    inputs: Dict[str, str]
+    selects: Dict[str, List[Dict[str, str]]]
+    tabs: List[Dict[str, str]]
+
+
+class _PageFieldCollector:
+    """Backend-neutral accumulator: every backend reports elements in document order."""
+
+    def __init__(self, select_ids: Tuple[str, ...]):
+        self.select_ids = select_ids
+        self.inputs: Dict[str, str] = {}
+        self.by_id: Dict[str, List[Dict[str, str]]] = {}
+        self.by_name: Dict[str, List[Dict[str, str]]] = {}
+        # Round tabs, as the reference parser sees them: plain `<li><a onclick>text</a>` items
+        # win; any other `queryCourse` anchor in #nav_tab only counts when there are none.
+        self.plain_tabs: List[Dict[str, str]] = []
+        self.nav_tabs: List[Dict[str, str]] = []
+
+    def wants_select(self, select_id: str | None, name: str | None) -> bool:
+        return (bool(select_id) and select_id in self.select_ids and select_id not in self.by_id) or (
+            bool(name) and name in self.select_ids and name not in self.by_name
+        )
+
+    def add_input(self, input_id: str | None, value: str | None) -> None:
+        if input_id:
+            self.inputs[input_id] = value or ""
+
+    def add_select(
+        self, select_id: str | None, name: str | None, options: List[Tuple[str | None, str, bool]]
+    ) -> None:
+        parsed: List[Dict[str, str]] = []
+        for raw_value, text, selected in options:
+            value = (raw_value or "").strip()
+            label = text.strip()
+            if not value and not label:
+                continue
+            parsed.append({"value": value, "label": label, "selected": "1" if selected else "0"})
+        if select_id and select_id in self.select_ids:
+            self.by_id.setdefault(select_id, parsed)
+        if name and name in self.select_ids:
+            self.by_name.setdefault(name, parsed)
+
+    def add_anchor(self, onclick: str | None, text: str, parent_class: str | None, plain: bool) -> None:
+        """A `queryCourse` anchor inside #nav_tab; `plain` when ROUND_TAB_ITEM would match it."""
+        raw = onclick or ""
+        match = ROUND_TAB_ONCLICK.search(raw.strip())
+        if not match:
+            return
+        classes = (parent_class or "").lower().split()
+        tab = {
+            "kklxdm": match.group(1),
+            "xkkz_id": match.group(2),
+            "njdm_id": match.group(3),
+            "zyh_id": match.group(4),
+            "label": text.strip(),
+            "active": "1" if "active" in classes else "0",
+        }
+        self.nav_tabs.append(tab)
+        if plain and ROUND_TAB_ONCLICK.fullmatch(raw):
+            self.plain_tabs.append(tab)
+
+    def result(self) -> PageFields:
+        selects = {
+            select_id: self.by_id.get(select_id, self.by_name.get(select_id, []))
+            for select_id in self.select_ids
+        }
+        return {"inputs": self.inputs, "selects": selects, "tabs": self.plain_tabs or self.nav_tabs}
+
+
+class _StreamingPageParser(HTMLParser):
+    """Single-pass stdlib parser keeping only inputs, the wanted selects and #nav_tab anchors."""
+
+    def __init__(self, collector: _PageFieldCollector):
+        super().__init__(convert_charrefs=True)
+        self.collector = collector
+        # [tag, class, seen child element / comment / non-blank text]
+        self._stack: List[List[Any]] = []
+        self._nav_depth: int | None = None
+        self._select: Tuple[str | None, str | None, List[Tuple[str | None, str, bool]]] | None = None
+        self._option: Tuple[str | None, bool] | None = None
+        self._option_text: List[str] = []
+        # (onclick, parent class, still plain)
+        self._anchor: List[Any] | None = None
+        self._anchor_depth = 0
+        self._anchor_text: List[str] = []
+
+    def _mark_content(self) -> None:
+        if self._stack:
+            self._stack[-1][2] = True
+        if self._anchor is not None:
+            self._anchor[2] = False
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, str | None]]) -> None:
+        parent = self._stack[-1] if self._stack else None
+        first_child = parent is not None and not parent[2]
+        self._mark_content()
+        if tag == "input":
+            values = dict(attrs)
+            self.collector.add_input(values.get("id"), values.get("value"))
+            return
+        if tag in HTML_VOID_ELEMENTS:
+            return
+        values = dict(attrs)
+        if tag == "select":
+            self._close_select()
+            if self.collector.wants_select(values.get("id"), values.get("name")):
+                self._select = (values.get("id"), values.get("name"), [])
+        elif tag in ("option", "optgroup") and self._select is not None:
+            self._close_option()
+            if tag == "option":
+                self._option = (values.get("value"), "selected" in values)
+        elif tag == "a" and self._anchor is None and self._nav_depth is not None:
+            onclick = values.get("onclick")
+            if onclick and "queryCourse" in onclick:
+                plain = first_child and parent is not None and parent[0] == "li"
+                self._anchor = [onclick, parent[1] if parent else None, plain]
+                self._anchor_depth = len(self._stack) + 1
+                self._anchor_text = []
+        if values.get("id") == ROUND_TAB_CONTAINER_ID and self._nav_depth is None:
+            self._nav_depth = len(self._stack) + 1
+        self._stack.append([tag, values.get("class"), False])
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in HTML_VOID_ELEMENTS:
+            return
+        if tag == "option":
+            self._close_option()
+        elif tag == "select":
+            self._close_select()
+        # Tolerate sloppy markup: pop back to the nearest matching open element, ignore strays.
+        for depth in range(len(self._stack) - 1, -1, -1):
+            if self._stack[depth][0] == tag:
+                del self._stack[depth:]
+                break
+        if self._anchor is not None and len(self._stack) < self._anchor_depth:
+            self._close_anchor()
+        if self._nav_depth is not None and len(self._stack) < self._nav_depth:
+            self._nav_depth = None
+
+    def handle_data(self, data: str) -> None:
+        if data.strip() and self._stack:
+            self._stack[-1][2] = True
+        if self._option is not None:
+            self._option_text.append(data)
+        if self._anchor is not None:
+            self._anchor_text.append(data)
+
+    def handle_comment(self, data: str) -> None:
+        self._mark_content()
+
+    def _close_anchor(self) -> None:
+        if self._anchor is None:
+            return
+        onclick, parent_class, plain = self._anchor
+        self.collector.add_anchor(onclick, "".join(self._anchor_text), parent_class, plain)
+        self._anchor = None
+
+    def _close_option(self) -> None:
+        if self._option is not None and self._select is not None:
+            value, selected = self._option
+            self._select[2].append((value, "".join(self._option_text), selected))
+        self._option = None
+        self._option_text = []
+
+    def _close_select(self) -> None:
+        if self._select is None:
+            return
+        self._close_option()
+        select_id, name, options = self._select
+        self.collector.add_select(select_id, name, options)
+        self._select = None
+
+    def close(self) -> None:
+        super().close()
+        self._close_select()
+        self._close_anchor()
+
+
+def _extract_page_stdlib(html: str, collector: _PageFieldCollector) -> None:
+    parser = _StreamingPageParser(collector)
+    parser.feed(html)
+    parser.close()
+
+
+def _extract_page_lxml(html: str, collector: _PageFieldCollector) -> None:
+    from lxml import html as lxml_html
+
+    if not html.strip():
+        return
+    # Decode once ourselves: a stale `<meta charset>` must not make libxml2 re-decode the text.
+    parser = lxml_html.HTMLParser(encoding="utf-8")
+    root = lxml_html.document_fromstring(html.encode("utf-8"), parser=parser)
+    for el in root.iter("input", "select", "a"):
+        if el.tag == "input":
+            collector.add_input(el.get("id"), el.get("value"))
+        elif el.tag == "select":
+            if collector.wants_select(el.get("id"), el.get("name")):
+                collector.add_select(
+                    el.get("id"),
+                    el.get("name"),
+                    [(opt.get("value"), opt.text_content(), "selected" in opt.attrib) for opt in el.iter("option")],
+                )
+        elif "queryCourse" in (el.get("onclick") or "") and any(
+            ancestor.get("id") == ROUND_TAB_CONTAINER_ID for ancestor in el.iterancestors()
+        ):
+            parent = el.getparent()
+            # Comments are children in lxml too, so len() / getprevious() see them.
+            plain = (
+                parent is not None
+                and parent.tag == "li"
+                and el.getprevious() is None
+                and not (parent.text or "").strip()
+                and len(el) == 0
+            )
+            collector.add_anchor(
+                el.get("onclick"), el.text_content(), parent.get("class") if parent is not None else None, plain
+            )
+
+
+def _extract_page_selectolax(html: str, collector: _PageFieldCollector) -> None:
+    from selectolax.lexbor import LexborHTMLParser
+
+    tree = LexborHTMLParser(html)
+    for node in tree.css("input"):
+        attrs = node.attributes
+        collector.add_input(attrs.get("id"), attrs.get("value"))
+    for node in tree.css("select"):
+        attrs = node.attributes
+        if collector.wants_select(attrs.get("id"), attrs.get("name")):
+            collector.add_select(
+                attrs.get("id"),
+                attrs.get("name"),
+                [
+                    (opt.attributes.get("value"), opt.text(deep=True), "selected" in opt.attributes)
+                    for opt in node.css("option")
+                ],
+            )
+    for node in tree.css(f"#{ROUND_TAB_CONTAINER_ID} a[onclick]"):
+        onclick = node.attributes.get("onclick") or ""
+        if "queryCourse" not in onclick:
+            continue
+        parent = node.parent
+        sibling = node.prev
+        while sibling is not None and sibling.tag == "-text" and not (sibling.text_content or "").strip():
+            sibling = sibling.prev
+        plain = (
+            parent is not None
+            and parent.tag == "li"
+            and sibling is None
+            and all(child.tag == "-text" for child in node.iter(include_text=True))
+        )
+        collector.add_anchor(
+            onclick, node.text(deep=True), parent.attributes.get("class") if parent is not None else None, plain
+        )
+
+
+def _extract_page_bs4(html: str, collector: _PageFieldCollector) -> None:
+    from bs4 import BeautifulSoup, Comment, NavigableString
+
+    def is_text(node: Any) -> bool:
+        return isinstance(node, NavigableString) and not isinstance(node, Comment)
+
+    soup = BeautifulSoup(html, "html.parser")
+    for tag in soup.find_all("input"):
+        collector.add_input(tag.get("id"), tag.get("value"))
+    for select in soup.find_all("select"):
+        if collector.wants_select(select.get("id"), select.get("name")):
+            collector.add_select(
+                select.get("id"),
+                select.get("name"),
+                [(opt.get("value"), opt.get_text() or "", opt.has_attr("selected")) for opt in select.find_all("option")],
+            )
+    for anchor in soup.select(f"#{ROUND_TAB_CONTAINER_ID} a[onclick]"):
+        if "queryCourse" not in (anchor.get("onclick") or ""):
+            continue
+        parent = anchor.parent
+        classes = parent.get("class") if parent is not None else None
+        plain = (
+            parent is not None
+            and parent.name == "li"
+            and all(is_text(node) and not node.strip() for node in anchor.previous_siblings)
+            and all(is_text(node) for node in anchor.children)
+        )
+        collector.add_anchor(anchor.get("onclick"), anchor.get_text() or "", " ".join(classes or []), plain)
+
+
+def extract_page_fields_reference(html: str, select_ids: Tuple[str, ...] = HTML_SELECT_IDS) -> PageFields:
+    """The BeautifulSoup parsing used before HTML backends; every backend must match it."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    inputs: Dict[str, str] = {}
+    for tag in soup.find_all("input"):
+        tag_id = tag.get("id")
+        if tag_id:
+            inputs[tag_id] = tag.get("value") or ""
+    selects: Dict[str, List[Dict[str, str]]] = {}
+    for select_id in select_ids:
+        select = soup.find("select", attrs={"id": select_id}) or soup.find("select", attrs={"name": select_id})
+        options: List[Dict[str, str]] = []
+        for opt in select.find_all("option") if select is not None else []:
+            value = (opt.get("value") or "").strip()
+            label = (opt.get_text() or "").strip()
+            if not value and not label:
+                continue
+            options.append({"value": value, "label": label, "selected": "1" if opt.has_attr("selected") else "0"})
+        selects[select_id] = options
+    return {"inputs": inputs, "selects": selects, "tabs": parse_round_tabs_reference(html)}
+
+
+def parse_round_tabs_reference(html: str) -> List[Dict[str, str]]:
+    """The original round-tab parser, with regex labels entity-decoded."""
+    from bs4 import BeautifulSoup
+
+    tabs: List[Dict[str, str]] = []
+    for match in ROUND_TAB_ITEM.finditer(html):
+        li_attrs = match.group(1) or ""
+        kklxdm = match.group(2) or ""
+        xkkz_id = match.group(3) or ""
+        if not kklxdm or not xkkz_id:
+            continue
+        tabs.append(
+            {
+                "kklxdm": kklxdm,
+                "xkkz_id": xkkz_id,
+                "njdm_id": match.group(4) or "",
+                "zyh_id": match.group(5) or "",
+                "label": html_unescape(match.group(6) or "").strip(),
+                "active": "1" if re.search(r"\bactive\b", li_attrs, flags=re.IGNORECASE) else "0",
+            }
+        )
+    if tabs:
+        return tabs
+
+    soup = BeautifulSoup(html, "html.parser")
+    for anchor in soup.select(f"#{ROUND_TAB_CONTAINER_ID} a[onclick]"):
+        match = ROUND_TAB_ONCLICK.search((anchor.get("onclick") or "").strip())
+        if not match:
+            continue
+        parent = anchor.parent
+        classes = (parent.get("class") or []) if parent is not None else []
+        tabs.append(
+            {
+                "kklxdm": match.group(1),
+                "xkkz_id": match.group(2),
+                "njdm_id": match.group(3),
+                "zyh_id": match.group(4),
+                "label": (anchor.get_text() or "").strip(),
+                "active": "1" if any(str(c).lower() == "active" for c in classes) else "0",
+            }
+        )
+    return tabs
+
+
+HTML_EXTRACTORS: Dict[str, Callable[[str, _PageFieldCollector], None]] = {
+    "stdlib": _extract_page_stdlib,
+    "lxml": _extract_page_lxml,
+    "selectolax": _extract_page_selectolax,
+    "bs4": _extract_page_bs4,
+}
+HTML_BACKEND_MODULES = {"lxml": "lxml.html", "selectolax": "selectolax.lexbor"}
+
+
+@functools.lru_cache(maxsize=None)
+def html_backend_available(backend: str) -> bool:
+    module = HTML_BACKEND_MODULES.get(backend)
+    if module is None:
+        return backend in HTML_EXTRACTORS
+    try:
+        importlib.import_module(module)
+    except ImportError:
+        return False
+    return True
+
+
+def resolve_html_backend(backend: str = "auto") -> str:
+    """`auto` prefers an installed C parser and otherwise falls back to the stdlib streamer."""
+    if backend == "auto":
+        return next(
+            (name for name in ("selectolax", "lxml") if html_backend_available(name)),
+            "stdlib",
+        )
+    if backend not in HTML_EXTRACTORS:
+        raise ValueError(f"Unknown HTML backend {backend!r} (expected one of {', '.join(HTML_BACKENDS)})")
+    if not html_backend_available(backend):
+        raise RuntimeError(f"--html-backend {backend} 需要安装 {backend}（pip install {backend}）")
+    return backend
+
+
+def extract_page_fields(
+    html: str, backend: str = "auto", select_ids: Tuple[str, ...] = HTML_SELECT_IDS
+) -> PageFields:
+    """Read input values, the given selects (by id, else by name) and round tabs from a JWXT page."""
+    collector = _PageFieldCollector(select_ids)
+    HTML_EXTRACTORS[resolve_html_backend(backend)](html, collector)
+    return collector.result()
+
+
+class JWXTCrawler:
+    def __init__(
+        self,
+        username: str,
+        password: str,
+        workers: int = DEFAULT_WORKERS,
+        request_interval: float = 0.0,
+        rate_limit: float | None = None,
+        rate_burst: int = 1,
+        max_concurrent_requests: int | None = None,
+        engine: str = "thread",
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        adaptive_concurrency: bool = False,
+        initial_concurrency: int | None = None,
+        cache: DetailResponseCache | None = None,
+        journal: CrawlJournal | None = None,
+        detail_stats: Dict[str, Dict[str, float]] | None = None,
+        html_backend: str = "auto",
+    ):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        if engine not in CRAWL_ENGINES:
+            raise ValueError(f"Unknown crawl engine {engine!r} (expected one of {', '.join(CRAWL_ENGINES)})")
+        self.username = username
+        self.password = password
+        self.workers = max(1, workers)
+        self.request_interval = max(0.0, request_interval)
+        # `--request-interval` is the legacy spelling of a 1-token bucket at 1/interval req/s.
+        if rate_limit is None and self.request_interval > 0:
+            rate_limit = 1.0 / self.request_interval
+        self.rate_limiter = TokenBucket(rate_limit, rate_burst, max_concurrent_requests)
+        self.engine = engine
+        self.html_backend = resolve_html_backend(html_backend)
+        self._last_page: Tuple[str, PageFields] | None = None
+        self.max_in_flight = max(1, max_in_flight)
+        self._async_engine: AsyncHttpEngine | None = None
+        self.cache = cache
+        self.journal = journal
+        self.failed_details: List[Dict[str, str]] = []
+        # Per-kch_id latency / teaching-class count from earlier runs, used to start the most
+        # expensive detail requests first and refreshed as this run's responses come in.
+        self.detail_stats: Dict[str, Dict[str, float]] = detail_stats if detail_stats is not None else {}
+        # The thread pool size / in-flight cap is the ceiling the controller may grow to.
+        self.concurrency: AdaptiveConcurrency | None = None
+        if adaptive_concurrency:
+            ceiling = self.max_in_flight if engine == "async" else self.workers
+            self.concurrency = AdaptiveConcurrency(
+                initial_concurrency or min(ceiling, DEFAULT_WORKERS),
+                maximum=ceiling,
+            )
+        self.session = requests.Session()
+        self.session.verify = False
+        self.session.headers.update(
+            {
+                "User-Agent": (
+                    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) "
+                    "AppleWebKit/537.36 (KHTML, like Gecko) "
+                    "Chrome/120.0.0.0 Safari/537.36"
+                )
+            }
+        )
+        # One cookie jar and one urllib3 pool shared by every worker thread (and by the async
+        # engine's client), sized so each in-flight request can keep its connection alive.
+        self.session.cookies = new_thread_safe_cookie_jar()
+        self.pool_size = max(self.workers, DEFAULT_WORKERS) + 1
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._pool_warmed = False
+        self._prewarm_lock = threading.Lock()
+        self._engine_lock = threading.Lock()
+        self.display_contexts: Dict[
+            Tuple[str, str, str, str, str], Tuple[Dict[str, str], str, List[Dict[str, str]]]
+        ] = {}
+        # Without the adaptive controller this caps detail requests in flight across every
+        # concurrent detail pass (e.g. overlapping campuses), so the budget is never multiplied.
+        self.detail_slots = SlotGate(self.max_in_flight if engine == "async" else self.workers)
+        # Mid-crawl re-authentication: one thread re-logs in while request senders wait on
+        # `_auth_ready`; the generation counter lets late reporters of the same expiry skip it.
+        self.cookie_bundle: Tuple[Path, Path] | None = None
+        self.reauth_count = 0
+        self._auth_lock = threading.Lock()
+        self._auth_generation = 0
+        self._auth_error: Tuple[int, Exception] | None = None
+        self._auth_ready = threading.Event()
+        self._auth_ready.set()
+
+    @contextlib.contextmanager
+    def _request_slot(self) -> Iterator[None]:
+        self.rate_limiter.acquire()
+        try:
+            yield
+        finally:
+            self.rate_limiter.release()
+
+    @contextlib.asynccontextmanager
+    async def _request_slot_async(self) -> AsyncIterator[None]:
+        await self.rate_limiter.acquire_async()
+        try:
+            yield
+        finally:
+            self.rate_limiter.release()
+
+    def _async(self) -> AsyncHttpEngine:
+        with self._engine_lock:
+            if self._async_engine is None:
+                self._async_engine = AsyncHttpEngine(self.session, self.max_in_flight)
+            return self._async_engine
+
+    def close(self) -> None:
+        with self._engine_lock:
+            engine, self._async_engine = self._async_engine, None
+        if engine is not None:
+            engine.close()
+
+    def _post_xhr(
+        self, url: str, payload: Dict[str, str], timeout: float = 30, expect_json: bool = True
+    ) -> HttpResponse:
+        if self.engine == "async":
+            engine = self._async()
+            return cast(HttpResponse, engine.run(self._post_xhr_async(url, payload, timeout, expect_json)))
+        for round_no in range(REAUTH_MAX_ROUNDS + 1):
+            self._auth_ready.wait()
+            generation = self._auth_generation
+            with self._request_slot():
+                resp = self.session.post(url, data=payload, headers=XHR_HEADERS, timeout=timeout)
+            if not is_session_expired(resp, expect_json):
+                return resp
+            if round_no < REAUTH_MAX_ROUNDS:
+                self.reauthenticate(generation)
+        raise SessionExpiredError("JWXT 会话已过期，重新登录后仍返回登录页")
+
+    async def _post_xhr_async(
+        self, url: str, payload: Dict[str, str], timeout: float = 30, expect_json: bool = True
+    ) -> HttpResponse:
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        for round_no in range(REAUTH_MAX_ROUNDS + 1):
+            if not self._auth_ready.is_set():
+                await loop.run_in_executor(None, self._auth_ready.wait)
+            generation = self._auth_generation
+            async with self._request_slot_async():
+                resp = await self._async().post(url, payload, timeout)
+            if not is_session_expired(resp, expect_json):
+                return resp
+            if round_no < REAUTH_MAX_ROUNDS:
+                # Re-login uses the blocking requests session; keep it off the event loop.
+                await loop.run_in_executor(None, self.reauthenticate, generation)
+        raise SessionExpiredError("JWXT 会话已过期，重新登录后仍返回登录页")
+
+    def reauthenticate(self, generation: int) -> None:
+        """Single-flight re-login after a request saw the session expire at `generation`."""
+        with self._auth_lock:
+            if generation != self._auth_generation:
+                return
+            # Do not hammer the SSO once re-login has failed for this session generation.
+            if self._auth_error and self._auth_error[0] == generation:
+                raise self._auth_error[1]
+            self._auth_ready.clear()
+            try:
+                self._relogin()
+                self._auth_generation += 1
+                self.reauth_count += 1
+            except SessionExpiredError as exc:
+                self._auth_error = (generation, exc)
+                raise
+            except Exception as exc:
+                # Any failed re-login means the session is gone; callers only need to handle one type.
+                error = SessionExpiredError(f"JWXT 会话已过期，重新登录失败：{exc}")
+                self._auth_error = (generation, error)
+                raise error from exc
+            finally:
+                self._auth_ready.set()
+
+    def _relogin(self) -> None:
+        if self.username and self.password:
+            self.login()
+            self.fetch_selection_page()
+            return
+        if self.cookie_bundle:
+            bundle = load_cookie_bundle(*self.cookie_bundle)
+            if bundle and bundle.get("cookies"):
+                apply_cookie_records(self.session.cookies, cast(List[CookieRecord], bundle["cookies"]))
+                self.warmup()
+                self.fetch_selection_page()
+                return
+        raise SessionExpiredError("JWXT 会话已过期，且没有账号密码或可用的本地 cookie 用于重新登录")
+
+    def login(self) -> None:
+        from bs4 import BeautifulSoup
+
+        with self._request_slot():
+            resp = self.session.get(f"{JWXT_HOST}/sso/shulogin", allow_redirects=False)
+        if resp.status_code not in (301, 302):
+            raise RuntimeError(f"Unexpected SSO entry status {resp.status_code}")
+        url = urljoin(resp.url, resp.headers.get("Location", ""))
+
+        with self._request_slot():
+            resp = self.session.get(url, allow_redirects=False)
+        if resp.status_code not in (301, 302):
+            raise RuntimeError("Failed to reach SHU SSO login page")
+        login_url = urljoin(url, resp.headers.get("Location", ""))
+
+        # Load login page to obtain required cookies
+        with self._request_slot():
+            login_page = self.session.get(login_url, timeout=15)
+        post_url = login_url
+        try:
+            soup = BeautifulSoup(login_page.text, "html.parser")
+            form = soup.find("form")
+            if form is not None and form.get("action"):
+                post_url = urljoin(login_url, str(form.get("action")))
+        except Exception:
+            post_url = login_url
+
+        payload = {
+            "username": self.username,
+            "password": encrypt_password(self.password),
+        }
+        with self._request_slot():
+            resp = self.session.post(
+                post_url,
+                data=payload,
+                headers={
+                    "Content-Type": "application/x-www-form-urlencoded",
+                    "Origin": "https://newsso.shu.edu.cn",
+                    "Referer": login_url,
+                },
+                allow_redirects=True,
+                timeout=15,
+            )
+
+        # Some SSO flows may end on a POST-only endpoint (GET => 405) while the session
+        # is already established. Avoid failing early and let the downstream JWXT page
+        # load be the source of truth.
+        if resp.status_code >= 500:
+            raise RuntimeError(f"Login failed, last status {resp.status_code}")
+
+        self.warmup()
+
+    def warmup(self) -> None:
+        with self._request_slot():
+            self.session.get(
+                f"{JWXT_HOST}/jwglxt/xtgl/index_initMenu.html?"
+                f"jsdm=xs&_t={int(time.time()*1000)}",
+                timeout=15,
+            )
+
+    def fetch_selection_page(self) -> Tuple[str, Dict[str, str]]:
+        with self._request_slot():
+            resp = self.session.get(SELECTION_ENDPOINT, timeout=15)
+        if resp.status_code != 200:
+            raise RuntimeError(
+                f"Failed to load selection page ({resp.status_code})"
+            )
+        fields = dict(self.page_fields(resp.text)["inputs"])
+        if not fields.get("firstXkkzId"):
+            raise RuntimeError("Cannot find xkkz information on selection page")
+        return resp.text, fields
+
+    def page_fields(self, html: str) -> PageFields:
+        """Extract with the configured backend; the selection page is read twice per session, so keep the last one."""
+        last = self._last_page
+        if last is not None and last[0] is html:
+            return last[1]
+        fields = extract_page_fields(html, self.html_backend)
+        self._last_page = (html, fields)
+        return fields
+
+    def parse_round_tabs(self, html: str) -> List[Dict[str, str]]:
+        return [dict(tab) for tab in self.page_fields(html)["tabs"]]
+
+    def fetch_display_page(
+        self,
+        *,
+        xkkz_id: str,
+        kklxdm: str,
+        njdm_id: str,
+        zyh_id: str,
+        xszxzt: str,
+    ) -> str:
+        payload = {
+            "xkkz_id": xkkz_id,
+            "xszxzt": xszxzt or "1",
+            "kklxdm": kklxdm,
+            "njdm_id": njdm_id,
+            "zyh_id": zyh_id,
+            "kspage": "0",
+            "jspage": "0",
+        }
+        resp = self._post_xhr(DISPLAY_ENDPOINT, payload, expect_json=False)
+        if resp.status_code != 200:
+            raise RuntimeError(
+                f"Display page request failed ({resp.status_code}): "
+                f"{resp.text[:200]}"
+            )
+        return resp.text
+
+    def fetch_display_fields(
+        self,
+        *,
+        xkkz_id: str,
+        kklxdm: str,
+        njdm_id: str,
+        zyh_id: str,
+        xszxzt: str,
+    ) -> Dict[str, str]:
+        inputs, _, _ = self._display_context(
+            xkkz_id=xkkz_id,
+            kklxdm=kklxdm,
+            njdm_id=njdm_id,
+            zyh_id=zyh_id,
+            xszxzt=xszxzt,
+        )
+        return dict(inputs)
+
+    def fetch_display_context(
+        self, tab: Dict[str, str], xszxzt: str
+    ) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+        inputs, selected_campus_id, campus_options = self._display_context(
+            xkkz_id=tab.get("xkkz_id", ""),
+            kklxdm=tab.get("kklxdm", ""),
+            njdm_id=tab.get("njdm_id", ""),
+            zyh_id=tab.get("zyh_id", ""),
+            xszxzt=xszxzt,
+        )
+        display_fields = dict(inputs)
+        # Campus selection is usually a <select id="xqh_id">. Store the selected value
+        # so build_query_context picks it up, and also expose all options for multi-campus crawl.
+        if selected_campus_id:
+            display_fields["xqh_id"] = selected_campus_id
+        return display_fields, [dict(opt) for opt in campus_options]
+
+    def _display_context(
+        self,
+        *,
+        xkkz_id: str,
+        kklxdm: str,
+        njdm_id: str,
+        zyh_id: str,
+        xszxzt: str,
+    ) -> Tuple[Dict[str, str], str, List[Dict[str, str]]]:
+        """Fetch and parse a round's display page once per run."""
+        key = (xkkz_id, kklxdm, njdm_id, zyh_id, xszxzt or "1")
+        cached = self.display_contexts.get(key)
+        if cached is not None:
+            return cached
+        html = self.fetch_display_page(
+            xkkz_id=xkkz_id,
+            kklxdm=kklxdm,
+            njdm_id=njdm_id,
+            zyh_id=zyh_id,
+            xszxzt=xszxzt,
+        )
+        page = extract_page_fields(html, self.html_backend)
+        campus_options = page["selects"]["xqh_id"]
+        context = (page["inputs"], self._selected_option_value(campus_options), campus_options)
+        self.display_contexts[key] = context
+        return context
 
     def build_query_context(self, fields: Dict[str, str]) -> Dict[str, str]:
         params = dict(DEFAULT_FIELD_VALUES)
@@ -791,145 +2371,445 @@ class JWXTCrawler:
     def fetch_course_rows(self, params: Dict[str, str]) -> List[Dict]:
         payload = dict(params)
         payload.update({"kspage": "1", "jspage": "9999"})
-        self._sleep_if_needed()
-        resp = self.session.post(
-            COURSE_LIST_ENDPOINT,
-            data=payload,
-            headers={
-                "X-Requested-With": "XMLHttpRequest",
-                "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-                "Referer": SELECTION_ENDPOINT,
-            },
-            timeout=30,
-        )
+        resp = self._post_xhr(COURSE_LIST_ENDPOINT, payload)
         if resp.status_code != 200:
             raise RuntimeError(
                 f"Course list request failed ({resp.status_code}): "
                 f"{resp.text[:200]}"
             )
-        data = resp.json()
+        data = json_loads(resp.content)
         rows = data.get("tmpList") or data.get("rows") or []
         return rows
 
+    def prewarm_connections(self) -> int:
+        """Open the pool's keep-alive connections before the detail phase (best effort)."""
+        import concurrent.futures
+
+        # Under --request-interval / --rate-limit the probes would spend tokens meant for real
+        # requests, and requests that paced gain nothing from idle warm connections.
+        if self.rate_limiter.rate is not None:
+            return 0
+        # Overlapping campus lanes both reach this point; only the first one prewarms.
+        with self._prewarm_lock:
+            if self._pool_warmed:
+                return 0
+            self._pool_warmed = True
+        if self.engine == "async":
+            count = self.concurrency.limit if self.concurrency else self.max_in_flight
+            engine = self._async()
+            return cast(int, engine.run(self._prewarm_async(count)))
+        count = self.concurrency.limit if self.concurrency else self.workers
+
+        def probe(_: int) -> bool:
+            try:
+                with self._request_slot():
+                    self.session.head(f"{JWXT_HOST}/jwglxt/", allow_redirects=False, timeout=10)
+                return True
+            except Exception:
+                return False
+
+        # Overlapping probes force distinct connections; each returns to the pool when done.
+        with concurrent.futures.ThreadPoolExecutor(max_workers=count) as executor:
+            return sum(executor.map(probe, range(count)))
+
+    async def _prewarm_async(self, count: int) -> int:
+        import asyncio
+
+        engine = self._async()
+
+        async def probe() -> bool:
+            try:
+                async with self._request_slot_async():
+                    await engine.head(f"{JWXT_HOST}/jwglxt/", timeout=10)
+                return True
+            except Exception:
+                return False
+
+        return sum(await asyncio.gather(*(probe() for _ in range(count))))
+
     def fetch_course_details(
         self,
         params: Dict[str, str],
         meta: Dict[str, Dict],
-        progress_callback: Callable[[int, int], None] | None = None,
-    ) -> List[Dict]:
+        progress_callback: Callable[[int, int], None] | None = None,
+    ) -> List[Dict]:
+        results, failed = self.fetch_course_details_once(params, meta, progress_callback)
+        if failed:
+            results.extend(self.sweep_failed_details([(params, failed)])[0])
+        return results
+
+    def fetch_course_details_once(
+        self,
+        params: Dict[str, str],
+        meta: Dict[str, Dict],
+        progress_callback: Callable[[int, int], None] | None = None,
+    ) -> Tuple[List[Dict], Dict[str, Tuple[Dict, str]]]:
+        """One detail pass without the sweep; returns the courses and the failed items."""
+        journaled_results, pending = self._take_journaled_details(params, meta)
+        cached_results, pending = self._take_cached_details(params, pending)
+        from_cache = len(meta) - len(pending)
+
+        def report(current: int, total: int) -> None:
+            if progress_callback:
+                progress_callback(current + from_cache, total + from_cache)
+
+        results: List[Dict] = []
+        failed: Dict[str, Tuple[Dict, str]] = {}
+        if pending:
+            pending = self._longest_first(pending)
+            self.prewarm_connections()
+            results, errors = self._run_detail_pass(params, pending, report, DETAIL_MAX_ATTEMPTS)
+            failed = {kch_id: (pending[kch_id], error) for kch_id, error in errors.items()}
+        elif progress_callback and meta:
+            progress_callback(len(meta), len(meta))
+        return journaled_results + cached_results + results, failed
+
+    def sweep_failed_details(
+        self, batches: List[Tuple[Dict[str, str], Dict[str, Tuple[Dict, str]]]]
+    ) -> List[List[Dict]]:
+        """Retry exhausted items once on fresh connections; returns the recovered courses per batch."""
+        total = sum(len(failed) for _, failed in batches)
+        if not total:
+            return [[] for _ in batches]
+        print(
+            f"Warning: {total} courses still failing after {DETAIL_MAX_ATTEMPTS} attempts, "
+            "refreshing session for a final sweep",
+            file=sys.stderr,
+        )
+        self.refresh_session()
+        recovered: List[List[Dict]] = []
+        for params, failed in batches:
+            if not failed:
+                recovered.append([])
+                continue
+            swept, errors = self._run_detail_pass(
+                params, {kch_id: info for kch_id, (info, _) in failed.items()}, None, DETAIL_SWEEP_ATTEMPTS
+            )
+            recovered.append(swept)
+            if not errors:
+                continue
+            for kch_id, error in errors.items():
+                self.failed_details.append(
+                    {
+                        "kchId": kch_id,
+                        "courseId": str(failed[kch_id][0].get("courseId") or kch_id),
+                        "xkkzId": params.get("xkkz_id", ""),
+                        "xqhId": params.get("xqh_id", ""),
+                        "error": error,
+                    }
+                )
+            unique = list(dict.fromkeys(errors.values()))
+            print(
+                f"Warning: {len(errors)} detail requests failed "
+                f"({min(5, len(unique))} unique shown):",
+                file=sys.stderr,
+            )
+            for msg in unique[:5]:
+                print(f"  - {msg}", file=sys.stderr)
+        return recovered
+
+    def _run_detail_pass(
+        self,
+        params: Dict[str, str],
+        meta: Dict[str, Dict],
+        progress_callback: Callable[[int, int], None] | None,
+        max_attempts: int,
+    ) -> Tuple[List[Dict], Dict[str, str]]:
+        if self.engine == "async":
+            engine = self._async()
+            return cast(
+                Tuple[List[Dict], Dict[str, str]],
+                engine.run(self._fetch_course_details_async(params, meta, progress_callback, max_attempts)),
+            )
+        return self._fetch_course_details_threaded(params, meta, progress_callback, max_attempts)
+
+    def _longest_first(self, meta: Dict[str, Dict]) -> Dict[str, Dict]:
+        """Order items by expected cost, longest first; items without history cost the median."""
+        known = sorted(
+            float(entry.get("latencyMs") or 0)
+            for kch_id in meta
+            if (entry := self.detail_stats.get(kch_id))
+        )
+        if not known:
+            return meta
+        default = (known[len(known) // 2], 0.0)
+
+        def cost(kch_id: str) -> Tuple[float, float]:
+            entry = self.detail_stats.get(kch_id)
+            if not entry:
+                return default
+            return (float(entry.get("latencyMs") or 0), float(entry.get("rows") or 0))
+
+        return {kch_id: meta[kch_id] for kch_id in sorted(meta, key=cost, reverse=True)}
+
+    def _record_detail_stats(self, kch_id: str, resp: HttpResponse, rows: int) -> None:
+        elapsed = getattr(resp, "elapsed", None)
+        if elapsed is None:
+            return
+        sample = elapsed.total_seconds() * 1000
+        previous = self.detail_stats.get(kch_id)
+        if previous and previous.get("latencyMs"):
+            sample = 0.7 * float(previous["latencyMs"]) + 0.3 * sample
+        self.detail_stats[kch_id] = {
+            "latencyMs": round(sample, 1),
+            "rows": rows,
+            "seenAtMs": int(time.time() * 1000),
+        }
+
+    def refresh_session(self) -> None:
+        """Drop pooled connections (and the async client) and re-touch the portal session."""
+        for adapter in self.session.adapters.values():
+            adapter.close()
+        self.close()
+        with self._prewarm_lock:
+            self._pool_warmed = False
+        try:
+            self.warmup()
+            self.fetch_selection_page()
+        except Exception:
+            pass
+
+    def _take_journaled_details(
+        self, params: Dict[str, str], meta: Dict[str, Dict]
+    ) -> Tuple[List[Dict], Dict[str, Dict]]:
+        """Reuse items an interrupted run already finished; returns their courses and the rest."""
+        if self.journal is None:
+            return [], meta
+        done = self.journal.completed(params)
+        results: List[Dict] = []
+        pending: Dict[str, Dict] = {}
+        for kch_id, info in meta.items():
+            if kch_id in done:
+                results.extend(done[kch_id])
+                self.journal.resumed += 1
+            else:
+                pending[kch_id] = info
+        return results, pending
+
+    def _take_cached_details(
+        self, params: Dict[str, str], meta: Dict[str, Dict]
+    ) -> Tuple[List[Dict], Dict[str, Dict]]:
+        """Resolve fresh cache entries up front; returns their courses and the items still to fetch."""
+        if self.cache is None:
+            return [], meta
+        detail_base = self._detail_base(params)
+        results: List[Dict] = []
+        pending: Dict[str, Dict] = {}
+        for kch_id, info in meta.items():
+            payload = self._detail_payload(detail_base, kch_id, info)
+            body = self.cache.get(COURSE_DETAIL_ENDPOINT, payload)
+            if body is not None:
+                try:
+                    results.extend(self._detail_courses(kch_id, json_loads(body), info, params))
+                    continue
+                except Exception:
+                    pass
+            pending[kch_id] = info
+        return results, pending
+
+    def _store_detail(self, payload: Dict[str, str], resp: HttpResponse) -> None:
+        if self.cache is not None:
+            self.cache.put(COURSE_DETAIL_ENDPOINT, payload, resp.text)
+
+    @staticmethod
+    def _detail_base(params: Dict[str, str]) -> Dict[str, str]:
+        detail_base = dict(params)
+        detail_base.pop("kspage", None)
+        detail_base.pop("jspage", None)
+        return detail_base
+
+    @staticmethod
+    def _detail_payload(detail_base: Dict[str, str], kch_id: str, info: Dict) -> Dict[str, str]:
+        payload = dict(detail_base)
+        payload.update(
+            {
+                "kch_id": kch_id,
+                "cxbj": info.get("cxbj", "0"),
+                "fxbj": info.get("fxbj", "0"),
+            }
+        )
+        return payload
+
+    @staticmethod
+    def _read_detail_response(kch_id: str, resp: HttpResponse) -> object:
+        if resp.status_code == 200:
+            return json_loads(resp.content)
+        if resp.status_code in RETRYABLE_DETAIL_STATUSES:
+            raise RuntimeError(f"Detail request for {kch_id} failed ({resp.status_code})")
+        raise RuntimeError(
+            f"Detail request for {kch_id} failed "
+            f"({resp.status_code}): {resp.text[:200]}"
+        )
+
+    def _detail_courses(
+        self, kch_id: str, detail_rows: object | None, info: Dict, params: Dict[str, str]
+    ) -> List[Dict]:
+        if detail_rows is None:
+            raise RuntimeError(f"Detail request for {kch_id} failed (empty response)")
+        if isinstance(detail_rows, dict):
+            detail_rows = (
+                detail_rows.get("tmpList")
+                or detail_rows.get("rows")
+                or []
+            )
+        return [self._merge_course(row, info, params) for row in cast(List[Dict], detail_rows)]
+
+    def _finish_detail(
+        self, kch_id: str, detail_rows: object | None, info: Dict, params: Dict[str, str]
+    ) -> List[Dict]:
+        courses = self._detail_courses(kch_id, detail_rows, info, params)
+        if self.journal is not None:
+            self.journal.record(params, kch_id, courses)
+        return courses
+
+    def _fetch_course_details_threaded(
+        self,
+        params: Dict[str, str],
+        meta: Dict[str, Dict],
+        progress_callback: Callable[[int, int], None] | None,
+        max_attempts: int = DETAIL_MAX_ATTEMPTS,
+    ) -> Tuple[List[Dict], Dict[str, str]]:
+        import concurrent.futures
+
         results: List[Dict] = []
-        failures: List[str] = []
+        failed: Dict[str, str] = {}
         total_items = len(meta)
         completed = 0
-        detail_base = dict(params)
-        detail_base.pop("kspage", None)
-        detail_base.pop("jspage", None)
-
-        def worker(item: Tuple[str, Dict]) -> List[Dict]:
-            kch_id, info = item
-            payload = dict(detail_base)
-            payload.update(
-                {
-                    "kch_id": kch_id,
-                    "cxbj": info.get("cxbj", "0"),
-                    "fxbj": info.get("fxbj", "0"),
-                }
-            )
-            max_attempts = 4
-            last_error: Exception | None = None
-            detail_rows: object | None = None
-            for attempt in range(1, max_attempts + 1):
-                session = self._thread_session()
-                self._sleep_if_needed()
-                try:
-                    resp = session.post(
-                        COURSE_DETAIL_ENDPOINT,
-                        data=payload,
-                        headers={
-                            "X-Requested-With": "XMLHttpRequest",
-                            "Content-Type": (
-                                "application/x-www-form-urlencoded; charset=UTF-8"
-                            ),
-                            "Referer": SELECTION_ENDPOINT,
-                        },
-                        timeout=30,
-                    )
-                    if resp.status_code == 200:
-                        detail_rows = resp.json()
-                        break
-
-                    # JWXT occasionally returns non-standard status codes (e.g. 901) when
-                    # throttled or the session is unstable. Retry with backoff.
-                    if resp.status_code in (429, 500, 502, 503, 504, 901):
-                        last_error = RuntimeError(
-                            f"Detail request for {kch_id} failed ({resp.status_code})"
-                        )
-                    else:
-                        raise RuntimeError(
-                            f"Detail request for {kch_id} failed "
-                            f"({resp.status_code}): {resp.text[:200]}"
-                        )
-                except Exception as exc:
-                    last_error = exc
-
-                # Refresh thread session cookies from the main session before retrying.
-                try:
-                    with self._rate_lock:
-                        fresh = self.session.cookies.get_dict()
-                    session.cookies.clear()
-                    session.cookies.update(fresh)
-                except Exception:
-                    pass
-
-                time.sleep(0.6 * attempt)
-            else:
-                assert last_error is not None
-                raise last_error
-
-            if detail_rows is None:
-                raise RuntimeError(f"Detail request for {kch_id} failed (empty response)")
-            if isinstance(detail_rows, dict):
-                detail_rows = (
-                    detail_rows.get("tmpList")
-                    or detail_rows.get("rows")
-                    or []
-                )
-            return [self._merge_course(row, info, params) for row in detail_rows]
+        detail_base = self._detail_base(params)
+        queue: deque[Tuple[str, Dict]] = deque(meta.items())
+        retries = RetryQueue(DETAIL_RETRY_BACKOFF_SECONDS)
+        attempts: Dict[str, int] = {}
+
+        def attempt(kch_id: str, info: Dict) -> List[Dict]:
+            payload = self._detail_payload(detail_base, kch_id, info)
+            token = self.concurrency.acquire() if self.concurrency else None
+            if token is None:
+                self.detail_slots.acquire()
+            status: int | None = None
+            try:
+                resp = self._post_xhr(COURSE_DETAIL_ENDPOINT, payload)
+                status = resp.status_code
+                detail_rows = self._read_detail_response(kch_id, resp)
+            finally:
+                if self.concurrency and token:
+                    self.concurrency.release(token, status)
+                else:
+                    self.detail_slots.release()
+            self._store_detail(payload, resp)
+            courses = self._finish_detail(kch_id, detail_rows, info, params)
+            self._record_detail_stats(kch_id, resp, len(courses))
+            return courses
 
         with concurrent.futures.ThreadPoolExecutor(
             max_workers=self.workers
         ) as executor:
-            futures = [
-                executor.submit(worker, item) for item in meta.items()
-            ]
-            for fut in concurrent.futures.as_completed(futures):
+            running: Dict[concurrent.futures.Future, Tuple[str, Dict]] = {}
+            while queue or retries or running:
+                queue.extend(retries.pop_ready())
+                while queue and len(running) < self.workers:
+                    item = queue.popleft()
+                    running[executor.submit(attempt, *item)] = item
+                if not running:
+                    time.sleep(retries.delay() or 0.0)
+                    continue
+                done, _ = concurrent.futures.wait(
+                    running,
+                    timeout=retries.delay(),
+                    return_when=concurrent.futures.FIRST_COMPLETED,
+                )
+                for fut in done:
+                    kch_id, info = running.pop(fut)
+                    try:
+                        results.extend(fut.result())
+                    except SessionExpiredError:
+                        # Re-login was already tried (and failed) inside _post_xhr; retrying the
+                        # item cannot help, so end the pass and let the crawl decide.
+                        for other in running:
+                            other.cancel()
+                        raise
+                    except Exception as exc:
+                        attempts[kch_id] = attempts.get(kch_id, 0) + 1
+                        if attempts[kch_id] < max_attempts:
+                            retries.push((kch_id, info), attempts[kch_id])
+                            continue
+                        failed[kch_id] = str(exc)
+                    completed += 1
+                    if progress_callback:
+                        progress_callback(completed, total_items)
+        return results, failed
+
+    async def _fetch_course_details_async(
+        self,
+        params: Dict[str, str],
+        meta: Dict[str, Dict],
+        progress_callback: Callable[[int, int], None] | None,
+        max_attempts: int = DETAIL_MAX_ATTEMPTS,
+    ) -> Tuple[List[Dict], Dict[str, str]]:
+        import asyncio
+
+        engine = self._async()
+        results: List[Dict] = []
+        failed: Dict[str, str] = {}
+        total_items = len(meta)
+        completed = 0
+        detail_base = self._detail_base(params)
+        queue: deque[Tuple[str, Dict]] = deque(meta.items())
+        retries = RetryQueue(DETAIL_RETRY_BACKOFF_SECONDS)
+        attempts: Dict[str, int] = {}
+
+        async def attempt(kch_id: str, info: Dict) -> List[Dict]:
+            payload = self._detail_payload(detail_base, kch_id, info)
+            if self.concurrency:
+                token = await self.concurrency.acquire_async()
+                status: int | None = None
+                try:
+                    resp = await self._post_xhr_async(COURSE_DETAIL_ENDPOINT, payload)
+                    status = resp.status_code
+                finally:
+                    self.concurrency.release(token, status)
+            else:
+                await self.detail_slots.acquire_async()
+                try:
+                    resp = await self._post_xhr_async(COURSE_DETAIL_ENDPOINT, payload)
+                finally:
+                    self.detail_slots.release()
+            detail_rows = self._read_detail_response(kch_id, resp)
+            self._store_detail(payload, resp)
+            courses = self._finish_detail(kch_id, detail_rows, info, params)
+            self._record_detail_stats(kch_id, resp, len(courses))
+            return courses
+
+        running: Dict[asyncio.Future, Tuple[str, Dict]] = {}
+        while queue or retries or running:
+            queue.extend(retries.pop_ready())
+            while queue and len(running) < engine.max_in_flight:
+                item = queue.popleft()
+                running[asyncio.ensure_future(attempt(*item))] = item
+            if not running:
+                await asyncio.sleep(retries.delay() or 0.0)
+                continue
+            done, _ = await asyncio.wait(
+                running, timeout=retries.delay(), return_when=asyncio.FIRST_COMPLETED
+            )
+            for fut in done:
+                kch_id, info = running.pop(fut)
                 try:
                     results.extend(fut.result())
+                except SessionExpiredError:
+                    for other in running:
+                        other.cancel()
+                    await asyncio.gather(*running, return_exceptions=True)
+                    raise
                 except Exception as exc:
-                    failures.append(str(exc))
+                    attempts[kch_id] = attempts.get(kch_id, 0) + 1
+                    if attempts[kch_id] < max_attempts:
+                        retries.push((kch_id, info), attempts[kch_id])
+                        continue
+                    failed[kch_id] = str(exc)
                 completed += 1
                 if progress_callback:
                     progress_callback(completed, total_items)
-        if failures:
-            unique = list(dict.fromkeys(failures))
-            print(
-                f"Warning: {len(failures)} detail requests failed "
-                f"({min(5, len(unique))} unique shown):",
-                file=sys.stderr,
-            )
-            for msg in unique[:5]:
-                print(f"  - {msg}", file=sys.stderr)
-        return results
-
-    def _thread_session(self) -> requests.Session:
-        sess = getattr(self._thread_local, "session", None)
-        if sess is None:
-            sess = requests.Session()
-            sess.verify = False
-            sess.headers.update(self.session.headers)
-            sess.cookies.update(self.session.cookies.get_dict())
-            self._thread_local.session = sess
-        return sess
+        return results, failed
 
     def _merge_course(
         self, detail: Dict, base_info: Dict, params: Dict[str, str]
@@ -1101,65 +2981,1118 @@ class JWXTCrawler:
             base_info.get("kcbz"),
             base_info.get("bzxx"),
         ]
-        for value in candidates:
-            if value is None:
-                continue
-            text = str(value).strip()
-            if text and text != "--":
-                return text
-        return ""
+        for value in candidates:
+            if value is None:
+                continue
+            text = str(value).strip()
+            if text and text != "--":
+                return text
+        return ""
+
+    @staticmethod
+    def _extract_class_status(detail: Dict, base_info: Dict) -> str:
+        candidates = [
+            detail.get("jxbzt"),
+            detail.get("krlx"),
+            detail.get("zt"),
+            detail.get("status"),
+            base_info.get("jxbzt"),
+            base_info.get("krlx"),
+            base_info.get("zt"),
+            base_info.get("status"),
+        ]
+        for value in candidates:
+            if value is None:
+                continue
+            text = str(value).strip()
+            if text and "停" in text:
+                return text
+        return ""
+
+    @staticmethod
+    def _selected_option_value(options: List[Dict[str, str]]) -> str:
+        selected = next((opt for opt in options if opt.get("selected") == "1"), None)
+        if selected is not None:
+            return (selected.get("value") or "").strip()
+        return (options[0].get("value") or "").strip() if options else ""
+
+
+def open_jwxt_session(
+    crawler: JWXTCrawler,
+    progress: ProgressTracker,
+    username: str | None,
+    password: str | None,
+    cookie_header: str | None = None,
+    cookie_store_path: Path | None = None,
+    cookie_key_path: Path | None = None,
+) -> Tuple[str, Dict[str, str]]:
+    """Authenticate via Cookie header, the local cookie store or a fresh login; returns the selection page."""
+    fields: Dict[str, str] | None = None
+    selection_html: str | None = None
+    if cookie_store_path and cookie_key_path:
+        crawler.cookie_bundle = (cookie_store_path, cookie_key_path)
+
+    if cookie_header:
+        apply_cookie_header(
+            crawler.session.cookies, cookie_header, domain="jwxt.shu.edu.cn"
+        )
+        try:
+            crawler.warmup()
+            selection_html, fields = crawler.fetch_selection_page()
+            progress.log_step("已使用 Cookie header（无需重新登录）")
+        except Exception:
+            fields = None
+
+    if cookie_store_path and cookie_key_path:
+        bundle = load_cookie_bundle(cookie_store_path, cookie_key_path)
+        if bundle and bundle.get("cookies"):
+            apply_cookie_records(crawler.session.cookies, cast(List[CookieRecord], bundle["cookies"]))
+            try:
+                crawler.warmup()
+                selection_html, fields = crawler.fetch_selection_page()
+                progress.log_step("已复用本地 cookie（无需重新登录）")
+            except Exception:
+                fields = None
+
+    if fields is None:
+        if not username or not password:
+            raise RuntimeError("无法使用 Cookie 登录且未提供账号密码（请重新登录或提供账号密码）")
+        crawler.login()
+        progress.log_step("登录成功")
+        selection_html, fields = crawler.fetch_selection_page()
+
+    if selection_html is None:
+        raise RuntimeError("Selection page HTML missing")
+    return selection_html, fields
+
+
+class QueryContextRevalidation:
+    """Re-checks a cached query context against the live selection page in the background."""
+
+    def __init__(self, crawler: JWXTCrawler, fingerprint: str):
+        self.crawler = crawler
+        self.fingerprint = fingerprint
+        self.selection: Tuple[str, Dict[str, str]] | None = None
+        self.error: Exception | None = None
+        self._thread = threading.Thread(target=self._run, name="jwxt-context-revalidate", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        try:
+            self.crawler.warmup()
+            self.selection = self.crawler.fetch_selection_page()
+        except Exception as exc:
+            self.error = exc
+
+    def ensure_valid(self) -> None:
+        self._thread.join()
+        if self.selection is None:
+            raise StaleQueryContextError(f"选课页面校验失败：{self.error}")
+        selection_html, fields = self.selection
+        tabs = self.crawler.parse_round_tabs(selection_html)
+        if query_context_fingerprint(fields, tabs) != self.fingerprint:
+            raise StaleQueryContextError("选课轮次已变化，缓存的查询上下文已失效")
+
+
+def default_round_tab(fields: Dict[str, str], tabs: List[Dict[str, str]]) -> Dict[str, str] | None:
+    """The round the selection page opens on: `firstXkkzId`, else the active tab, else the first."""
+    if not tabs:
+        return None
+    active_id = (fields.get("firstXkkzId") or "").strip() if fields else ""
+    match = next((tab for tab in tabs if tab.get("xkkz_id") == active_id), None)
+    if match is None:
+        match = next((tab for tab in tabs if tab.get("active") == "1"), None) or tabs[0]
+    return match
+
+
+def resume_cached_session(
+    crawler: JWXTCrawler,
+    cookie_header: str | None = None,
+    cookie_store_path: Path | None = None,
+    cookie_key_path: Path | None = None,
+) -> bool:
+    """Load cookies without the warmup / selection-page probe; returns whether any were applied."""
+    if cookie_store_path and cookie_key_path:
+        crawler.cookie_bundle = (cookie_store_path, cookie_key_path)
+    if cookie_header:
+        apply_cookie_header(crawler.session.cookies, cookie_header, domain="jwxt.shu.edu.cn")
+        return True
+    if cookie_store_path and cookie_key_path:
+        bundle = load_cookie_bundle(cookie_store_path, cookie_key_path)
+        if bundle and bundle.get("cookies"):
+            apply_cookie_records(crawler.session.cookies, cast(List[CookieRecord], bundle["cookies"]))
+            return True
+    return False
+
+
+def build_course_meta(course_rows: List[Dict]) -> Dict[str, Dict]:
+    meta: Dict[str, Dict] = {}
+    for row in course_rows:
+        kch = row.get("kch_id") or row.get("kch")
+        if not kch:
+            continue
+        meta.setdefault(
+            kch,
+            {
+                "courseId": row.get("kch", kch),
+                "courseName": row.get("kcmc", ""),
+                "credit": row.get("xf", ""),
+                "cxbj": row.get("cxbj", "0"),
+                "fxbj": row.get("fxbj", "0"),
+            },
+        )
+    return meta
+
+
+def snapshot_v2_path(path: Path) -> Path:
+    return path.with_name(path.name[: -len(".json")] + ".v2.json")
+
+
+def _encode_column(values: List[Any]) -> Dict[str, Any]:
+    """Smallest exact encoding of one column: `const`, `intString`, `dict` or `plain`."""
+    encoded = [json_dumps(value, sort_keys=True) for value in values]
+    distinct: Dict[bytes, int] = {}
+    for item in encoded:
+        distinct.setdefault(item, len(distinct))
+    if len(distinct) == 1:
+        return {"type": "const", "value": values[0]}
+    if all(isinstance(value, str) and (value == "" or CANONICAL_INT.fullmatch(value)) for value in values):
+        return {"type": "intString", "values": [int(value) if value else None for value in values]}
+    if len(distinct) * 2 <= len(values):
+        firsts: Dict[bytes, Any] = {}
+        for item, value in zip(encoded, values):
+            firsts.setdefault(item, value)
+        return {"type": "dict", "values": list(firsts.values()), "index": [distinct[item] for item in encoded]}
+    return {"type": "plain", "values": values}
+
+
+def _decode_column(column: Dict[str, Any], count: int) -> List[Any]:
+    kind = column.get("type")
+    if kind == "const":
+        value = column["value"]
+        if isinstance(value, (list, dict)):
+            return [copy.deepcopy(value) for _ in range(count)]
+        return [value] * count
+    if kind == "intString":
+        return ["" if value is None else str(value) for value in column["values"]]
+    if kind == "dict":
+        table = column["values"]
+        # Rows must not share list/dict values (e.g. `limitations`), callers edit them in place.
+        if any(isinstance(value, (list, dict)) for value in table):
+            return [copy.deepcopy(table[index]) for index in column["index"]]
+        return [table[index] for index in column["index"]]
+    if kind == "plain":
+        return list(column["values"])
+    raise ValueError(f"Unknown column type {kind!r}")
+
+
+def encode_columnar_snapshot(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Snapshot v2: the envelope plus `courses` stored column-wise, with the v1 `hash`."""
+    courses: List[Dict] = snapshot.get("courses") or []
+    keys: Dict[str, None] = {}
+    for row in courses:
+        keys.update(dict.fromkeys(row))
+    columns: Dict[str, Dict[str, Any]] = {}
+    for key in keys:
+        absent = [number for number, row in enumerate(courses) if key not in row]
+        column = _encode_column([row[key] for row in courses if key in row])
+        if absent:
+            column["absent"] = absent
+        columns[key] = column
+    envelope = {key: value for key, value in snapshot.items() if key != "courses"}
+    return {
+        "format": SNAPSHOT_V2_FORMAT,
+        "version": SNAPSHOT_V2_VERSION,
+        **envelope,
+        "rowCount": len(courses),
+        "keys": list(keys),
+        "columns": columns,
+    }
+
+
+def decode_columnar_snapshot(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Rebuild the v1 snapshot (row-of-objects `courses`) from a v2 document."""
+    if data.get("format") != SNAPSHOT_V2_FORMAT or data.get("version") != SNAPSHOT_V2_VERSION:
+        raise ValueError("not a columnar (v2) snapshot")
+    count = int(data.get("rowCount") or 0)
+    courses: List[Dict[str, Any]] = [{} for _ in range(count)]
+    for key in data.get("keys") or []:
+        column = data["columns"][key]
+        absent = set(column.get("absent") or ())
+        values = _decode_column(column, count - len(absent))
+        present = courses if not absent else [row for number, row in enumerate(courses) if number not in absent]
+        for row, value in zip(present, values):
+            row[key] = value
+    snapshot = {
+        key: value
+        for key, value in data.items()
+        if key not in ("format", "version", "rowCount", "keys", "columns")
+    }
+    snapshot["courses"] = courses
+    return snapshot
+
+
+def read_snapshot(path: Path) -> Dict[str, Any]:
+    """Load a snapshot file in either format, returning v1 row-of-objects form."""
+    data = json_loads(path.read_bytes())
+    if isinstance(data, dict) and data.get("format") == SNAPSHOT_V2_FORMAT:
+        return decode_columnar_snapshot(data)
+    return data
+
+
+def write_snapshot_v2(path: Path, snapshot: Dict[str, Any]) -> Dict[str, int]:
+    """Write the columnar form of a snapshot already written by `write_snapshot` (so `hash` is set)."""
+    return write_with_variants(path, [json_dumps(encode_columnar_snapshot(snapshot))])
+
+
+def remove_snapshot_v2(path: Path) -> None:
+    for suffix in ("",) + SNAPSHOT_VARIANT_SUFFIXES:
+        safe_unlink(path.with_name(path.name + suffix))
+
+
+def read_current_entries(current_path: Path) -> list[dict]:
+    if not current_path.exists():
+        return []
+    try:
+        raw = json_loads(current_path.read_bytes())
+    except Exception:
+        return []
+    if not isinstance(raw, list):
+        return []
+    if raw and isinstance(raw[0], str):
+        # Legacy schema: string[] of termId
+        return [{"termId": str(x).strip()} for x in raw if str(x).strip()]
+    return [x for x in raw if isinstance(x, dict)]
+
+
+def course_row_key(row: Dict) -> tuple[str, str, str]:
+    return (
+        str(row.get("courseId") or ""),
+        str(row.get("teachingClassId") or ""),
+        str(row.get("batchId") or ""),
+    )
+
+
+def canonical_courses(courses: List[Dict]) -> bytes:
+    """The bytes `hash` is defined on: one compact, key-sorted course per line."""
+    if not courses:
+        return b"[]"
+    return b"[\n" + b",\n".join(json_dumps(row, sort_keys=True) for row in courses) + b"\n]"
+
+
+def write_json_atomic(path: Path, data: Any) -> None:
+    with atomic_write(path) as fh:
+        fh.write(json_dumps(data, indent=True))
+
+
+def _brotli_module() -> Any:
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+def write_with_variants(
+    path: Path, chunks: Iterable[bytes], verify: Callable[[], None] | None = None
+) -> Dict[str, int]:
+    """Atomically write `chunks` to `path` and its .gz/.br siblings; returns each variant's size."""
+    gz_path = path.with_name(path.name + ".gz")
+    br_path = path.with_name(path.name + ".br")
+    brotli = _brotli_module()
+    with contextlib.ExitStack() as stack:
+        plain = stack.enter_context(atomic_write(path))
+        gz = stack.enter_context(
+            gzip.GzipFile(
+                filename="",
+                mode="wb",
+                fileobj=stack.enter_context(atomic_write(gz_path)),
+                compresslevel=SNAPSHOT_GZIP_LEVEL,
+                mtime=0,
+            )
+        )
+        br = stack.enter_context(atomic_write(br_path)) if brotli else None
+        compressor = brotli.Compressor(quality=SNAPSHOT_BROTLI_QUALITY) if brotli else None
+        for chunk in chunks:
+            plain.write(chunk)
+            gz.write(chunk)
+            if br is not None:
+                br.write(compressor.process(chunk))
+        if br is not None:
+            br.write(compressor.finish())
+        # Runs before anything is replaced; the plain file, entered first, is replaced last.
+        if verify is not None:
+            verify()
+    if brotli is None:
+        safe_unlink(br_path)
+    return snapshot_variant_sizes(path)
+
+
+def snapshot_variant_sizes(path: Path) -> Dict[str, int]:
+    """Byte size of `path` and each compressed sibling that exists, plain file first."""
+    sizes = {"json": path.stat().st_size}
+    for suffix in SNAPSHOT_VARIANT_SUFFIXES:
+        sibling = path.with_name(path.name + suffix)
+        if sibling.exists():
+            sizes[suffix[1:]] = sibling.stat().st_size
+    return sizes
+
+
+def encode_snapshot(snapshot: Dict[str, Any], pretty: bool = False) -> List[bytes]:
+    """Encode and hash `courses` once and place them after the envelope; returns the file's chunks."""
+    courses = canonical_courses(snapshot.get("courses") or [])
+    digest = hashlib.md5(courses).hexdigest()
+    envelope = {key: value for key, value in snapshot.items() if key not in ("hash", "courses")}
+    envelope["hash"] = digest
+    head = json_dumps(envelope, indent=pretty)
+    if pretty:
+        chunks = [head[: -len(b"\n}")], b',\n  "courses": ', courses, b"\n}"]
+    else:
+        chunks = [head[:-1], b',"courses":', courses, b"}"]
+    snapshot["hash"] = digest
+    return chunks
+
+
+def write_snapshot(path: Path, snapshot: Dict[str, Any], pretty: bool = False) -> Dict[str, int]:
+    """Write `encode_snapshot` output with its compressed siblings; returns the size of each variant."""
+    return write_with_variants(path, encode_snapshot(snapshot, pretty=pretty))
+
+
+def snapshot_content_id(snapshot: Dict[str, Any]) -> str:
+    """Identity of a snapshot's content: `hash` plus the envelope without `updateTimeMs`."""
+    envelope = {key: value for key, value in snapshot.items() if key not in ("courses", "updateTimeMs")}
+    return hashlib.sha256(json_dumps(envelope, sort_keys=True)).hexdigest()[:32]
+
+
+class SnapshotObjectStore:
+    """Content-addressed snapshot bodies under `objects/`, linked to their public names."""
+
+    def __init__(self, output_dir: Path):
+        self.output_dir = output_dir
+        self.root = output_dir / SNAPSHOT_OBJECTS_DIR
+        self.written = 0
+        self.reused = 0
+        self.unchanged = 0
+
+    def object_path(self, digest: str) -> Path:
+        return self.root / digest[:2] / f"{digest}.json"
+
+    @staticmethod
+    def _variants(path: Path) -> List[Tuple[str, Path]]:
+        # Siblings before the plain file, so a published name never points at older siblings.
+        return [(suffix[1:], path.with_name(path.name + suffix)) for suffix in SNAPSHOT_VARIANT_SUFFIXES] + [
+            ("json", path)
+        ]
+
+    def sizes(self, digest: str) -> Dict[str, int]:
+        return snapshot_variant_sizes(self.object_path(digest))
+
+    def publish(self, name: Path, chunks: List[bytes]) -> Tuple[str, Dict[str, int]]:
+        """Store `chunks` (unless an identical object exists) and point `name` at it."""
+        data = b"".join(chunks)
+        digest = hashlib.sha256(data).hexdigest()
+        obj = self.object_path(digest)
+        if obj.exists():
+            self.reused += 1
+        else:
+            write_with_variants(obj, [data])
+            self.written += 1
+        for (_, source), (_, target) in zip(self._variants(obj), self._variants(name)):
+            if not source.exists():
+                safe_unlink(target)
+            elif not self._same_file(source, target):
+                self._link(source, target)
+        return digest, self.sizes(digest)
+
+    def is_published(self, digest: str | None, name: Path) -> bool:
+        return bool(digest) and self._same_file(self.object_path(str(digest)), name)
+
+    @staticmethod
+    def _same_file(a: Path, b: Path) -> bool:
+        try:
+            return os.path.samefile(a, b)
+        except OSError:
+            return False
+
+    @staticmethod
+    def _link(source: Path, target: Path) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        tmp = target.with_name(f".{target.name}.{os.getpid()}-{threading.get_ident()}.tmp")
+        safe_unlink(tmp)
+        try:
+            os.link(source, tmp)
+        except OSError:
+            shutil.copyfile(source, tmp)
+        os.replace(tmp, target)
+
+    def referenced(self) -> Set[str]:
+        """Objects named by current.json or still linked from a published file."""
+        digests: Set[str] = set()
+        for entry in read_current_entries(self.output_dir / "current.json"):
+            digests.update(str(entry[key]) for key in ("object", "v2Object") if entry.get(key))
+        linked = set()
+        for path in self.output_dir.rglob("*.json"):
+            if self.root in path.parents:
+                continue
+            with contextlib.suppress(OSError):
+                stat = path.stat()
+                linked.add((stat.st_dev, stat.st_ino))
+        for obj in self.root.glob("*/*.json"):
+            with contextlib.suppress(OSError):
+                stat = obj.stat()
+                if (stat.st_dev, stat.st_ino) in linked:
+                    digests.add(obj.stem)
+        return digests
+
+    def gc(self) -> Tuple[int, int]:
+        """Delete unreferenced objects (with their siblings); returns (objects removed, bytes freed)."""
+        keep = self.referenced()
+        removed = freed = 0
+        for obj in sorted(self.root.glob("*/*.json")):
+            if obj.stem in keep:
+                continue
+            for _, variant in self._variants(obj):
+                with contextlib.suppress(OSError):
+                    freed += variant.stat().st_size
+                    variant.unlink()
+            removed += 1
+        for shard in self.root.glob("*"):
+            with contextlib.suppress(OSError):
+                shard.rmdir()
+        return removed, freed
+
+
+def snapshot_manifest_path(path: Path) -> Path:
+    return path.with_name(path.name[: -len(".json")] + ".manifest.json")
+
+
+def snapshot_shard_dir(path: Path) -> Path:
+    return path.with_name(path.name[: -len(".json")])
+
+
+def shard_key(row: Dict, shard_by: str, prefix_length: int = DEFAULT_SHARD_PREFIX_LENGTH) -> Tuple[str, str]:
+    """Return (file id, label) of the shard a course row belongs to."""
+    if shard_by == "academy":
+        label = str(row.get("academy") or "")
+        return f"academy-{hashlib.sha256(label.encode('utf-8')).hexdigest()[:12]}", label
+    label = str(row.get("courseId") or "")[:prefix_length]
+    if SAFE_SHARD_KEY.fullmatch(label):
+        return f"course-{label}", label
+    return f"course-{hashlib.sha256(label.encode('utf-8')).hexdigest()[:12]}", label
+
+
+def remove_round_shards(path: Path) -> None:
+    safe_unlink(snapshot_manifest_path(path))
+    shutil.rmtree(snapshot_shard_dir(path), ignore_errors=True)
+
+
+def write_round_shards(
+    output_dir: Path,
+    term_path: Path,
+    snapshot: Dict[str, Any],
+    shard_by: str,
+    prefix_length: int = DEFAULT_SHARD_PREFIX_LENGTH,
+    store: "SnapshotObjectStore | None" = None,
+) -> Dict[str, Any]:
+    """Write a round's shards and their manifest; returns the current.json `shards` field."""
+    groups: Dict[str, Tuple[str, List[Dict]]] = {}
+    for row in snapshot.get("courses") or []:
+        shard_id, label = shard_key(row, shard_by, prefix_length)
+        groups.setdefault(shard_id, (label, []))[1].append(row)
+    shard_dir = snapshot_shard_dir(term_path)
+    entries: List[Dict[str, Any]] = []
+    for shard_id in sorted(groups):
+        label, rows = groups[shard_id]
+        shard = {"termId": snapshot.get("termId"), "shard": {"by": shard_by, "key": label}, "courses": rows}
+        chunks = encode_snapshot(shard)
+        path = shard_dir / f"{shard_id}.json"
+        entry: Dict[str, Any] = {"id": shard_id, "key": label}
+        if store is None:
+            sizes = write_with_variants(path, chunks)
+        else:
+            entry["object"], sizes = store.publish(path, chunks)
+        entry.update(
+            {
+                "path": path.relative_to(output_dir).as_posix(),
+                "hash": shard["hash"],
+                "courseCount": len(rows),
+                "sizes": sizes,
+            }
+        )
+        entries.append(entry)
+    published = {f"{shard_id}.json{suffix}" for shard_id in groups for suffix in ("",) + SNAPSHOT_VARIANT_SUFFIXES}
+    for stale in shard_dir.iterdir() if shard_dir.is_dir() else ():
+        if stale.name not in published and not stale.name.startswith("."):
+            safe_unlink(stale)
+
+    manifest_path = snapshot_manifest_path(term_path)
+    layout: Dict[str, Any] = {"by": shard_by}
+    if shard_by == "course-prefix":
+        layout["prefixLength"] = prefix_length
+    write_json_atomic(
+        manifest_path,
+        {
+            "termId": snapshot.get("termId"),
+            "updateTimeMs": snapshot.get("updateTimeMs"),
+            "hash": snapshot.get("hash"),
+            "shardBy": layout,
+            "courseCount": len(snapshot.get("courses") or []),
+            "shards": entries,
+        },
+    )
+    return {**layout, "count": len(entries), "manifest": manifest_path.relative_to(output_dir).as_posix()}
+
+
+def read_shard_layout(term_path: Path) -> Tuple[str | None, int]:
+    """Sharding used by an existing round (from its manifest), so refreshes keep it."""
+    try:
+        layout = json_loads(snapshot_manifest_path(term_path).read_bytes()).get("shardBy") or {}
+    except (OSError, ValueError, AttributeError):
+        return None, DEFAULT_SHARD_PREFIX_LENGTH
+    shard_by = layout.get("by") if layout.get("by") in SHARD_MODES else None
+    return shard_by, int(layout.get("prefixLength") or DEFAULT_SHARD_PREFIX_LENGTH)
+
+
+def snapshot_delta_dir(path: Path) -> Path:
+    return path.with_name(path.name[: -len(".json")] + ".deltas")
+
+
+def remove_snapshot_deltas(path: Path) -> None:
+    shutil.rmtree(snapshot_delta_dir(path), ignore_errors=True)
+
+
+def diff_snapshots(base: Dict[str, Any], snapshot: Dict[str, Any]) -> Dict[str, Any] | None:
+    """Delta from `base` to `snapshot` keyed by `teachingClassId`, or None without unique ids."""
+    base_courses = base.get("courses") or []
+    old_rows = {str(row.get("teachingClassId") or ""): row for row in base_courses}
+    new_courses = snapshot.get("courses") or []
+    new_ids = [str(row.get("teachingClassId") or "") for row in new_courses]
+    if "" in old_rows or "" in new_ids or len(old_rows) != len(base_courses) or len(set(new_ids)) != len(new_ids):
+        return None
+
+    added: List[List[Any]] = []
+    changed: Dict[str, Dict[str, Any]] = {}
+    unset: Dict[str, List[str]] = {}
+    for index, (row_id, row) in enumerate(zip(new_ids, new_courses)):
+        old = old_rows.get(row_id)
+        if old is None:
+            added.append([index, row])
+            continue
+        fields = {key: value for key, value in row.items() if key not in old or old[key] != value}
+        if fields:
+            changed[row_id] = fields
+        gone = [key for key in old if key not in row]
+        if gone:
+            unset[row_id] = gone
+    new_id_set = set(new_ids)
+    removed = [row_id for row_id in old_rows if row_id not in new_id_set]
+
+    skipped = ("hash", "updateTimeMs", "courses")
+    envelope = {key: value for key, value in snapshot.items() if key not in skipped and base.get(key) != value}
+    envelope_unset = [key for key in base if key not in skipped and key not in snapshot]
+    delta: Dict[str, Any] = {
+        "format": SNAPSHOT_DELTA_FORMAT,
+        "termId": snapshot.get("termId"),
+        "from": base.get("hash"),
+        "to": snapshot.get("hash"),
+        "updateTimeMs": snapshot.get("updateTimeMs"),
+    }
+    if [row_id for row_id in old_rows if row_id in new_id_set] != [row_id for row_id in new_ids if row_id in old_rows]:
+        delta["order"] = new_ids
+    for key, value in (
+        ("envelope", envelope),
+        ("envelopeUnset", envelope_unset),
+        ("added", added),
+        ("removed", removed),
+        ("changed", changed),
+        ("unset", unset),
+    ):
+        if value:
+            delta[key] = value
+    return delta
+
+
+def apply_snapshot_delta(base: Dict[str, Any], delta: Dict[str, Any]) -> Dict[str, Any]:
+    """Apply a `diff_snapshots` delta to `base`; raises ValueError unless both ends match their hashes."""
+    if base.get("hash") != delta.get("from"):
+        raise ValueError(f"delta starts from {delta.get('from')}, snapshot is {base.get('hash')}")
+    removed = set(delta.get("removed") or [])
+    changed = delta.get("changed") or {}
+    unset = delta.get("unset") or {}
+    rows: List[Dict[str, Any]] = []
+    for row in base.get("courses") or []:
+        row_id = str(row.get("teachingClassId") or "")
+        if row_id in removed:
+            continue
+        row = {**row, **changed.get(row_id, {})}
+        for key in unset.get(row_id, ()):
+            row.pop(key, None)
+        rows.append(row)
+    if delta.get("order"):
+        by_id = {str(row.get("teachingClassId") or ""): row for row in rows}
+        by_id.update({str(row.get("teachingClassId") or ""): row for _, row in delta.get("added") or []})
+        rows = [by_id[row_id] for row_id in delta["order"]]
+    else:
+        for index, row in delta.get("added") or []:
+            rows.insert(index, row)
+
+    snapshot = {key: value for key, value in base.items() if key not in delta.get("envelopeUnset", ())}
+    snapshot.update(delta.get("envelope") or {})
+    snapshot.pop("courses", None)
+    snapshot["updateTimeMs"] = delta.get("updateTimeMs")
+    snapshot["hash"] = hashlib.md5(canonical_courses(rows)).hexdigest()
+    snapshot["courses"] = rows
+    if snapshot["hash"] != delta.get("to"):
+        raise ValueError(f"delta result hashes to {snapshot['hash']}, expected {delta.get('to')}")
+    return snapshot
+
+
+def write_round_deltas(
+    output_dir: Path,
+    term_path: Path,
+    base: Dict[str, Any] | None,
+    snapshot: Dict[str, Any],
+    history: List[Dict[str, Any]],
+    full_size: int,
+) -> List[Dict[str, Any]]:
+    """Write the delta from `base` to `snapshot`; returns the current.json `deltas` list."""
+    history = [item for item in history if isinstance(item, dict) and item.get("from")]
+    delta_dir = snapshot_delta_dir(term_path)
+    if base is not None and base.get("hash") and base.get("hash") != snapshot.get("hash"):
+        delta = diff_snapshots(base, snapshot)
+        body = json_dumps(delta) if delta is not None else b""
+        if body and len(body) <= full_size * SNAPSHOT_DELTA_MAX_RATIO:
+            path = delta_dir / f"{delta['from']}.json"
+            link = {
+                "from": delta["from"],
+                "to": delta["to"],
+                "path": path.relative_to(output_dir).as_posix(),
+                "sizes": write_with_variants(path, [body]),
+            }
+            history = [link] + [item for item in history if item["from"] != delta["from"]]
+    history = history[:SNAPSHOT_DELTA_HISTORY]
+
+    listed = {f"{item['from']}.json{suffix}" for item in history for suffix in ("",) + SNAPSHOT_VARIANT_SUFFIXES}
+    for stale in delta_dir.iterdir() if delta_dir.is_dir() else ():
+        if stale.name not in listed and not stale.name.startswith("."):
+            safe_unlink(stale)
+    return history
+
+
+def write_round_snapshot(
+    output_dir: Path,
+    term_path: Path,
+    snapshot: Dict[str, Any],
+    *,
+    pretty: bool = False,
+    columnar: bool = False,
+    store: SnapshotObjectStore | None = None,
+    shard_by: str | None = None,
+    shard_prefix_length: int = DEFAULT_SHARD_PREFIX_LENGTH,
+    deltas: bool = False,
+) -> Dict[str, Any]:
+    """Publish a round snapshot and its optional forms; returns its current.json fields."""
+    v2_path = snapshot_v2_path(term_path)
+    if not columnar:
+        remove_snapshot_v2(v2_path)
+    if not shard_by:
+        remove_round_shards(term_path)
+    previous = next(
+        (
+            entry
+            for entry in read_current_entries(output_dir / "current.json")
+            if str(entry.get("termId") or "").strip() == term_path.name[: -len(".json")]
+        ),
+        {},
+    )
+    base: Dict[str, Any] | None = None
+    if not deltas:
+        remove_snapshot_deltas(term_path)
+    elif term_path.exists():
+        try:
+            base = read_snapshot(term_path)
+        except (OSError, ValueError):
+            base = None
+
+    if store is None:
+        fields: Dict[str, Any] = {"sizes": write_snapshot(term_path, snapshot, pretty=pretty)}
+        if columnar:
+            fields["v2Sizes"] = write_snapshot_v2(v2_path, snapshot)
+        if shard_by:
+            fields["shards"] = write_round_shards(output_dir, term_path, snapshot, shard_by, shard_prefix_length)
+        if deltas:
+            fields["deltas"] = write_round_deltas(
+                output_dir, term_path, base, snapshot, previous.get("deltas") or [], fields["sizes"]["json"]
+            )
+        return fields
+
+    chunks = encode_snapshot(snapshot, pretty=pretty)
+    content_id = snapshot_content_id(snapshot)
+    previous_shards = previous.get("shards") or {}
+    if (
+        previous.get("contentId") == content_id
+        and store.is_published(previous.get("object"), term_path)
+        and (not columnar or store.is_published(previous.get("v2Object"), v2_path))
+        and previous_shards.get("by") == shard_by
+        and (shard_by != "course-prefix" or previous_shards.get("prefixLength") == shard_prefix_length)
+        and (not shard_by or snapshot_manifest_path(term_path).exists())
+    ):
+        store.unchanged += 1
+        keys = ("sizes", "object", "contentId") + (("v2Sizes", "v2Object") if columnar else ())
+        keys += (("shards",) if shard_by else ()) + (("deltas",) if deltas else ())
+        return {key: previous[key] for key in keys if key in previous}
+
+    digest, sizes = store.publish(term_path, chunks)
+    fields = {"sizes": sizes, "object": digest, "contentId": content_id}
+    if columnar:
+        v2_digest, v2_sizes = store.publish(v2_path, [json_dumps(encode_columnar_snapshot(snapshot))])
+        fields.update({"v2Sizes": v2_sizes, "v2Object": v2_digest})
+    if shard_by:
+        fields["shards"] = write_round_shards(output_dir, term_path, snapshot, shard_by, shard_prefix_length, store)
+    if deltas:
+        fields["deltas"] = write_round_deltas(
+            output_dir, term_path, base, snapshot, previous.get("deltas") or [], sizes["json"]
+        )
+    return fields
+
+
+def select_round_context(
+    crawler: JWXTCrawler,
+    progress: ProgressTracker,
+    fields: Dict[str, str],
+    tab: Dict[str, str],
+    strict: bool = False,
+) -> Tuple[Dict[str, str], List[Dict[str, str]]]:
+    """Point a copy of the selection-page fields at `tab`; returns them with the round's campus options."""
+    round_fields = dict(fields)
+    campus_options: List[Dict[str, str]] = []
+    try:
+        display_fields, campus_options = crawler.fetch_display_context(
+            tab, fields.get("xszxzt", "1") or "1"
+        )
+        round_fields.update(display_fields)
+    except Exception:
+        if strict:
+            raise
+    round_fields["firstXkkzId"] = tab.get("xkkz_id", round_fields.get("firstXkkzId", ""))
+    round_fields["firstKklxdm"] = tab.get("kklxdm", round_fields.get("firstKklxdm", ""))
+    round_fields["firstNjdmId"] = tab.get("njdm_id", round_fields.get("firstNjdmId", ""))
+    round_fields["firstZyhId"] = tab.get("zyh_id", round_fields.get("firstZyhId", ""))
+    if tab.get("label"):
+        round_fields["firstKklxmc"] = tab.get("label", round_fields.get("firstKklxmc", ""))
+    if round_fields.get("xklcmc"):
+        progress.log_step(f"选课轮次：{round_fields.get('xklcmc')}")
+    return round_fields, campus_options
+
+
+def resolve_campuses(
+    campus_options: List[Dict[str, str]],
+    params: Dict[str, str],
+    campus_scope: str,
+    progress: ProgressTracker,
+) -> List[Dict[str, str]]:
+    requested_scope = (campus_scope or "all").strip() or "all"
+    resolved_campuses: List[Dict[str, str]] = []
+    if not campus_options:
+        resolved_campuses = [{"value": params.get("xqh_id", ""), "label": "", "selected": "1"}]
+    elif requested_scope.lower() == "current":
+        current_id = params.get("xqh_id", "")
+        match = next((opt for opt in campus_options if opt.get("value") == current_id), None)
+        resolved_campuses = [match] if match else [{"value": current_id, "label": "", "selected": "1"}]
+    elif requested_scope.lower() == "all":
+        resolved_campuses = [opt for opt in campus_options if (opt.get("value") or "").strip()]
+    else:
+        needle = requested_scope
+        resolved_campuses = [
+            opt
+            for opt in campus_options
+            if needle in (opt.get("label") or "") or needle == (opt.get("value") or "")
+        ]
+        if not resolved_campuses:
+            available = ", ".join(
+                f"{opt.get('label') or opt.get('value')}" for opt in campus_options if opt.get("label") or opt.get("value")
+            )
+            raise RuntimeError(f"未找到匹配校区：{needle}（可选：{available}）")
 
-    @staticmethod
-    def _extract_class_status(detail: Dict, base_info: Dict) -> str:
-        candidates = [
-            detail.get("jxbzt"),
-            detail.get("krlx"),
-            detail.get("zt"),
-            detail.get("status"),
-            base_info.get("jxbzt"),
-            base_info.get("krlx"),
-            base_info.get("zt"),
-            base_info.get("status"),
-        ]
-        for value in candidates:
-            if value is None:
+    if resolved_campuses and resolved_campuses[0].get("label"):
+        labels = " / ".join(opt.get("label") or opt.get("value") or "" for opt in resolved_campuses)
+        progress.log(f"校区抓取范围：{requested_scope}（{labels}）")
+    return resolved_campuses
+
+
+def crawl_round(
+    crawler: JWXTCrawler,
+    progress: ProgressTracker,
+    output_dir: Path,
+    fields: Dict[str, str],
+    campus_options: List[Dict[str, str]],
+    campus_scope: str = "all",
+    max_courses: int | None = None,
+    skip_empty: bool = False,
+    before_write: Callable[[], None] | None = None,
+    pretty: bool = False,
+    columnar: bool = False,
+    store: SnapshotObjectStore | None = None,
+    shard_by: str | None = None,
+    shard_prefix_length: int = DEFAULT_SHARD_PREFIX_LENGTH,
+    deltas: bool = False,
+) -> dict | None:
+    """Crawl one selection round and write its snapshot; None for a skipped empty round."""
+    import concurrent.futures
+
+    params = crawler.build_query_context(fields)
+    progress.log_step("选课页面加载完毕")
+    resolved_campuses = resolve_campuses(campus_options, params, campus_scope, progress)
+
+    merged_courses: List[Dict[str, str]] = []
+    merged_keys: set[tuple[str, str, str]] = set()
+    stage_seconds = {"list": 0.0, "detail": 0.0, "dedupe": 0.0, "write": 0.0}
+    round_started = time.monotonic()
+
+    def detail_progress(campus_label: str) -> Callable[[int, int], None]:
+        # One counter per lane: overlapping campuses report their own (current/total).
+        prefix = f"校区 {campus_label} " if campus_label else ""
+
+        def report(current: int, total: int) -> None:
+            if total <= 0:
+                return
+            if current % 300 == 0 or current == total:
+                progress.log(f"{prefix}课程详情抓取成功：({current}/{total})")
+
+        return report
+
+    # Stage 1: campus course lists, fetched ahead of the detail stage through a bounded queue.
+    campus_jobs: "queue.Queue[tuple[str, Dict[str, str], Dict[str, Dict]] | BaseException | None]" = queue.Queue(
+        maxsize=PIPELINE_LIST_PREFETCH
+    )
+    campus_count = len(resolved_campuses) if resolved_campuses else 0
+    stop_listing = threading.Event()
+
+    def hand_over(item: "tuple[str, Dict[str, str], Dict[str, Dict]] | BaseException | None") -> bool:
+        # Give up once the round is torn down, so a full queue never strands the list thread.
+        while not stop_listing.is_set():
+            try:
+                campus_jobs.put(item, timeout=0.2)
+                return True
+            except queue.Full:
                 continue
-            text = str(value).strip()
-            if text and "停" in text:
-                return text
-        return ""
+        return False
 
-    @staticmethod
-    def _parse_select_options(
-        soup: BeautifulSoup, select_id: str
-    ) -> List[Dict[str, str]]:
-        select = soup.find("select", attrs={"id": select_id}) or soup.find(
-            "select", attrs={"name": select_id}
+    def list_stage() -> None:
+        try:
+            for idx, campus in enumerate(resolved_campuses or [{"value": "", "label": "", "selected": "1"}], start=1):
+                if stop_listing.is_set():
+                    return
+                campus_id = (campus.get("value") or "").strip()
+                campus_label = (campus.get("label") or campus_id or "").strip()
+                if campus_label:
+                    progress.log(f"开始抓取校区 {idx}/{campus_count}：{campus_label}")
+
+                campus_params = dict(params)
+                if campus_id:
+                    campus_params["xqh_id"] = campus_id
+
+                started = time.monotonic()
+                course_rows = crawler.fetch_course_rows(campus_params)
+                stage_seconds["list"] += time.monotonic() - started
+                if not course_rows:
+                    if campus_label:
+                        progress.log(f"校区 {campus_label} 课程列表为空，跳过")
+                    continue
+
+                meta = build_course_meta(course_rows)
+
+                if max_courses is not None:
+                    limited_keys = list(meta.keys())[:max_courses]
+                    meta = {key: meta[key] for key in limited_keys}
+
+                if campus_label:
+                    progress.log_step(f"校区 {campus_label} 课程列表获取完成，共 {len(meta)} 门课程")
+                else:
+                    progress.log_step(f"课程列表获取完成，共 {len(meta)} 门课程")
+                if not hand_over((campus_label, campus_params, meta)):
+                    return
+        except BaseException as exc:
+            hand_over(exc)
+        finally:
+            hand_over(None)
+
+    # Stage 2: detail passes (normalisation runs in the same workers, between requests). Up to
+    # PIPELINE_CAMPUS_LANES campuses overlap so campus N+1 fills the slots freed by campus N's
+    # tail; all of them draw on the crawler's single concurrency budget.
+    # Each lane returns its own elapsed time; only the main thread adds it to stage_seconds.
+    def detail_stage(
+        campus_label: str, campus_params: Dict[str, str], meta: Dict[str, Dict]
+    ) -> Tuple[List[Dict], Dict[str, Tuple[Dict, str]], float]:
+        started = time.monotonic()
+        rows, failed = crawler.fetch_course_details_once(
+            campus_params, meta, progress_callback=detail_progress(campus_label)
         )
-        if select is None:
-            return []
-        options: List[Dict[str, str]] = []
-        for opt in select.find_all("option"):
-            value = (opt.get("value") or "").strip()
-            label = (opt.get_text() or "").strip()
-            if not value and not label:
+        return rows, failed, time.monotonic() - started
+
+    # Stage 3: dedupe, applied to finished campuses in campus order so the first campus wins.
+    def dedupe_stage(rows: List[Dict]) -> None:
+        started = time.monotonic()
+        for row in rows:
+            key = course_row_key(row)
+            if key in merged_keys:
                 continue
-            options.append(
-                {
-                    "value": value,
-                    "label": label,
-                    "selected": "1" if opt.has_attr("selected") else "0",
-                }
-            )
-        return options
+            merged_keys.add(key)
+            merged_courses.append(row)
+        stage_seconds["dedupe"] += time.monotonic() - started
+
+    lister = threading.Thread(target=list_stage, name="jwxt-list-stage", daemon=True)
+    lister.start()
+    pending_batches: deque[Tuple[Dict[str, str], concurrent.futures.Future]] = deque()
+    failed_batches: List[Tuple[Dict[str, str], Dict[str, Tuple[Dict, str]]]] = []
+
+    def drain(block: bool) -> None:
+        while pending_batches and (block or pending_batches[0][1].done()):
+            campus_params, fut = pending_batches.popleft()
+            rows, failed, elapsed = fut.result()
+            stage_seconds["detail"] += elapsed
+            dedupe_stage(rows)
+            if failed:
+                failed_batches.append((campus_params, failed))
+
+    lanes = concurrent.futures.ThreadPoolExecutor(
+        max_workers=PIPELINE_CAMPUS_LANES, thread_name_prefix="jwxt-detail-stage"
+    )
+    try:
+        while True:
+            job = campus_jobs.get()
+            if job is None:
+                break
+            if isinstance(job, BaseException):
+                raise job
+            campus_label, campus_params, meta = job
+            while len(pending_batches) >= PIPELINE_CAMPUS_LANES:
+                concurrent.futures.wait(
+                    [fut for _, fut in pending_batches], return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                drain(block=False)
+            lane = lanes.submit(detail_stage, campus_label, campus_params, meta)
+            pending_batches.append((campus_params, lane))
+            drain(block=False)
+        drain(block=True)
+    finally:
+        # On failure: stop the list stage, drop detail passes that have not started and let the
+        # running ones finish before the error leaves the round, so nothing outlives it.
+        stop_listing.set()
+        lanes.shutdown(wait=True, cancel_futures=True)
+        lister.join()
+
+    if failed_batches:
+        for recovered in crawler.sweep_failed_details(failed_batches):
+            dedupe_stage(recovered)
 
-    @classmethod
-    def _get_select_value(cls, soup: BeautifulSoup, select_id: str) -> str:
-        options = cls._parse_select_options(soup, select_id)
-        selected = next((opt for opt in options if opt.get("selected") == "1"), None)
-        if selected is not None:
-            return (selected.get("value") or "").strip()
-        return (options[0].get("value") or "").strip() if options else ""
+    if not merged_courses:
+        if skip_empty:
+            progress.log(f"选课轮次 {fields.get('xklcmc') or params.get('xkkz_id')} 课程列表为空，跳过")
+            return None
+        raise RuntimeError("课程列表为空，可能尚未到选课时间")
+
+    merged_courses.sort(key=lambda x: (x["courseId"], x["teachingClassId"]))
+    progress.log_step(f"课程详情抓取完成，共 {len(merged_courses)} 个教学班")
+
+    term_code = f"{fields.get('xkxnm', '').strip()}-{fields.get('xkxqm', '').strip()}"
+    term_name = (
+        f"{fields.get('xkxnmc', fields.get('xkxnm', '')).strip()} "
+        f"{fields.get('xkxqmc', fields.get('xkxqm', '')).strip()}".strip()
+    ).strip()
+
+    round_id = (params.get("xkkz_id") or "").strip()
+    round_term_code = term_code
+    if round_id:
+        round_term_code = f"{term_code}--xkkz-{round_id}"
+
+    if before_write:
+        before_write()
+    os.makedirs(output_dir / "terms", exist_ok=True)
+    result = {
+        "backendOrigin": JWXT_HOST,
+        "termName": term_name or term_code,
+        "termId": round_term_code,
+        "jwxtRound": {
+            "xkkzId": params.get("xkkz_id", ""),
+            "xklc": fields.get("xklc", ""),
+            "xklcmc": fields.get("xklcmc", ""),
+        },
+        "campusOptions": campus_options,
+        "updateTimeMs": int(time.time() * 1000),
+        "courses": merged_courses,
+    }
+    term_path = output_dir / "terms" / f"{round_term_code}.json"
+    started = time.monotonic()
+    published = write_round_snapshot(
+        output_dir,
+        term_path,
+        result,
+        pretty=pretty,
+        columnar=columnar,
+        store=store,
+        shard_by=shard_by,
+        shard_prefix_length=shard_prefix_length,
+        deltas=deltas,
+    )
+    stage_seconds["write"] += time.monotonic() - started
+    progress.log_step(f"学期 {round_term_code} 数据写入完成")
+    # Stage times are summed per campus, so list + detail exceeding the wall time shows the overlap.
+    progress.log(
+        f"阶段耗时：课程列表 {stage_seconds['list']:.1f}s，课程详情 {stage_seconds['detail']:.1f}s，"
+        f"去重 {stage_seconds['dedupe']:.2f}s，写入 {stage_seconds['write']:.2f}s；"
+        f"本轮总耗时 {time.monotonic() - round_started:.1f}s"
+    )
+
+    return {
+        "termId": round_term_code,
+        "termCode": term_code,
+        "jwxtRound": {
+            "xkkzId": round_id,
+            "xklc": (fields.get("xklc") or "").strip(),
+            "xklcmc": (fields.get("xklcmc") or "").strip(),
+        },
+        "generatedAt": int(time.time() * 1000),
+        **published,
+        "courseCount": len(merged_courses),
+    }
+
+
+def update_current_entries(current_path: Path, new_entries: List[dict]) -> List[dict]:
+    """Merge round entries into current.json (replacing same termId + xklc) and rewrite it."""
+    existing_entries = read_current_entries(current_path)
+
+    def entry_key(obj: dict) -> tuple[str, str]:
+        term_id = str(obj.get("termId") or "").strip()
+        xklc = str((obj.get("jwxtRound") or {}).get("xklc") or "").strip()
+        return (term_id, xklc)
+
+    replaced = {entry_key(entry) for entry in new_entries}
+    merged_entries: list[dict] = []
+    seen = set()
+    for item in existing_entries:
+        key = entry_key(item)
+        if key in seen:
+            continue
+        if key in replaced:
+            continue
+        seen.add(key)
+        merged_entries.append(item)
+    merged_entries.extend(new_entries)
+
+    def sort_key(obj: dict) -> tuple[int, int]:
+        try:
+            xklc_num = int(str((obj.get("jwxtRound") or {}).get("xklc") or "0").strip() or "0")
+        except Exception:
+            xklc_num = 0
+        gen = obj.get("generatedAt")
+        gen_num = int(gen) if isinstance(gen, (int, float)) else 0
+        return (xklc_num, gen_num)
+
+    merged_entries.sort(key=sort_key)
+
+    write_json_atomic(current_path, merged_entries)
+    return merged_entries
 
 
 def crawl(
@@ -1172,57 +4105,112 @@ def crawl(
     cookie_username_hint: str | None = None,
     max_courses: int | None = None,
     request_interval: float = 0.0,
+    rate_limit: float | None = None,
+    rate_burst: int = 1,
+    max_concurrent_requests: int | None = None,
     xkkz_id: str | None = None,
     xklc: str | None = None,
     campus_scope: str = "all",
     no_prompt: bool = False,
+    engine: str = "thread",
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    workers: int = DEFAULT_WORKERS,
+    adaptive_concurrency: bool = False,
+    tuning_path: Path | None = None,
+    cache_dir: Path | None = None,
+    cache_ttl: float = DEFAULT_CACHE_TTL_SECONDS,
+    cache_max_mb: int = DEFAULT_CACHE_MAX_MB,
+    journal_path: Path | None = None,
+    resume: bool = False,
+    failures_path: Path | None = None,
+    all_rounds: bool = False,
+    query_context_path: Path | None = None,
+    refresh_query_context: bool = False,
+    html_backend: str = "auto",
+    pretty_json: bool = False,
+    snapshot_v2: bool = False,
+    object_store: bool = False,
+    shard_by: str | None = None,
+    shard_prefix_length: int = DEFAULT_SHARD_PREFIX_LENGTH,
+    snapshot_deltas: bool = False,
 ) -> None:
     has_cookie_store = bool(cookie_store_path and cookie_key_path)
     progress = ProgressTracker(total_steps=9 if has_cookie_store else 8)
     progress.start("准备连接教务系统")
     progress.log(f"本次请求间隔：{request_interval:.2f} 秒")
+    if rate_limit:
+        progress.log(f"请求速率上限：{rate_limit:.2f} 次/秒（突发 {rate_burst}）")
+    if engine == "async":
+        progress.log(f"抓取引擎：async（最大并发请求 {max_in_flight}）")
+
+    concurrency_hint: int | None = None
+    if adaptive_concurrency and tuning_path:
+        concurrency_hint = load_concurrency_hint(tuning_path, engine)
+    detail_stats = load_detail_stats(tuning_path) if tuning_path else {}
+
+    cache: DetailResponseCache | None = None
+    if cache_dir:
+        cache = DetailResponseCache(cache_dir, cache_ttl, cache_max_mb * 1024 * 1024)
+        progress.log(f"详情缓存：{cache_dir}（TTL {cache_ttl:.0f} 秒）")
+
+    journal: CrawlJournal | None = None
+    if journal_path:
+        journal = CrawlJournal(journal_path, resume=resume)
+        if resume:
+            progress.log(f"断点续抓：读取 {journal_path}")
 
     crawler = JWXTCrawler(
         (username or ""),
         (password or ""),
+        workers=workers,
         request_interval=request_interval,
+        rate_limit=rate_limit,
+        rate_burst=rate_burst,
+        max_concurrent_requests=max_concurrent_requests,
+        engine=engine,
+        max_in_flight=max_in_flight,
+        adaptive_concurrency=adaptive_concurrency,
+        initial_concurrency=concurrency_hint,
+        cache=cache,
+        journal=journal,
+        detail_stats=detail_stats,
+        html_backend=html_backend,
     )
-    fields: Dict[str, str] | None = None
-    selection_html: str | None = None
-
-    if cookie_header:
-        apply_cookie_header(
-            crawler.session.cookies, cookie_header, domain="jwxt.shu.edu.cn"
+    progress.log(f"页面解析后端：{crawler.html_backend}；JSON：{json_codec().name}")
+    if _brotli_module() is None:
+        progress.log("未安装 brotli：快照只生成 .json 与 .json.gz")
+    if crawler.concurrency:
+        progress.log(
+            f"自适应并发：初始 {crawler.concurrency.limit}，上限 {crawler.concurrency.maximum}"
+            + ("（沿用上次结果）" if concurrency_hint else "")
         )
-        try:
-            crawler.warmup()
-            selection_html, fields = crawler.fetch_selection_page()
-            progress.log_step("已使用 Cookie header（无需重新登录）")
-        except Exception:
-            fields = None
-
-    if cookie_store_path and cookie_key_path:
-        bundle = load_cookie_bundle(cookie_store_path, cookie_key_path)
-        if bundle and bundle.get("cookies"):
-            apply_cookie_records(crawler.session.cookies, cast(List[CookieRecord], bundle["cookies"]))
-            try:
-                crawler.warmup()
-                selection_html, fields = crawler.fetch_selection_page()
-                progress.log_step("已复用本地 cookie（无需重新登录）")
-            except Exception:
-                fields = None
-
-    if fields is None:
-        if not username or not password:
-            raise RuntimeError("无法使用 Cookie 登录且未提供账号密码（请重新登录或提供账号密码）")
-        crawler.login()
-        progress.log_step("登录成功")
-        selection_html, fields = crawler.fetch_selection_page()
-
-    if selection_html is None:
-        raise RuntimeError("Selection page HTML missing")
-
-    tabs = crawler.parse_round_tabs(selection_html)
+    revalidation: QueryContextRevalidation | None = None
+    cached_context = (
+        load_query_context(query_context_path) if query_context_path and not refresh_query_context else None
+    )
+    if cached_context and resume_cached_session(crawler, cookie_header, cookie_store_path, cookie_key_path):
+        fields = dict(cached_context["fields"])
+        tabs = [dict(tab) for tab in cached_context["tabs"]]
+        for entry in cached_context.get("display") or []:
+            crawler.display_contexts[cast(Tuple[str, str, str, str, str], tuple(entry["key"]))] = (
+                entry["inputs"],
+                entry.get("xqhId") or "",
+                entry.get("campusOptions") or [],
+            )
+        revalidation = QueryContextRevalidation(crawler, str(cached_context.get("fingerprint") or ""))
+        progress.log_step("已复用缓存的选课查询上下文（后台校验选课页面）")
+    else:
+        selection_html, fields = open_jwxt_session(
+            crawler,
+            progress,
+            username,
+            password,
+            cookie_header=cookie_header,
+            cookie_store_path=cookie_store_path,
+            cookie_key_path=cookie_key_path,
+        )
+        tabs = crawler.parse_round_tabs(selection_html)
+    selection_fields = dict(fields)
     selected_tab: Dict[str, str] | None = None
     desired_xkkz = (xkkz_id or "").strip()
     desired_xklc = (xklc or "").strip()
@@ -1256,7 +4244,7 @@ def crawl(
             out["xklcmc"] = display_fields.get("xklcmc", "")
         return out
 
-    if not desired_xkkz and not desired_xklc:
+    if not desired_xkkz and not desired_xklc and not all_rounds:
         first_xkkz = (fields.get("firstXkkzId") or "").strip()
         if first_xkkz:
             try:
@@ -1286,13 +4274,12 @@ def crawl(
         tabs = enriched_tabs
         selected_tab = match_by_xklc
 
-    if selected_tab is None and tabs:
-        active_id = (fields.get("firstXkkzId") or "").strip() if fields else ""
-        selected_tab = next((tab for tab in tabs if tab.get("xkkz_id") == active_id), None)
-        if selected_tab is None:
-            selected_tab = next((tab for tab in tabs if tab.get("active") == "1"), None) or tabs[0]
+    # A round nobody asked for by id, xklc or at the prompt is re-picked if the context is reloaded.
+    auto_round = selected_tab is None and not all_rounds
+    if selected_tab is None:
+        selected_tab = default_round_tab(fields, tabs)
 
-    if selected_tab is not None:
+    if selected_tab is not None and not all_rounds:
         if (
             not desired_xkkz
             and not desired_xklc
@@ -1309,265 +4296,299 @@ def crawl(
                 label = (tab.get("label") or "").strip()
                 suffix = (tab.get("xkkz_id") or "")[-6:]
                 active_mark = "（当前）" if tab.get("active") == "1" else ""
-                print(f"  {idx}. {xklcmc} {label}  xkkz_id=…{suffix}{active_mark}".strip())
-            try:
-                raw = input("输入序号（直接回车默认当前）：").strip()
-            except EOFError:
-                raw = ""
-            if raw:
-                try:
-                    pick = int(raw)
-                    if 1 <= pick <= len(tabs):
-                        selected_tab = tabs[pick - 1]
-                except ValueError:
-                    pass
-
-        campus_options: List[Dict[str, str]] = []
-        try:
-            crawler._sleep_if_needed()
-            resp = crawler.session.post(
-                DISPLAY_ENDPOINT,
-                data={
-                    "xkkz_id": selected_tab.get("xkkz_id", ""),
-                    "xszxzt": fields.get("xszxzt", "1") or "1",
-                    "kklxdm": selected_tab.get("kklxdm", ""),
-                    "njdm_id": selected_tab.get("njdm_id", ""),
-                    "zyh_id": selected_tab.get("zyh_id", ""),
-                    "kspage": "0",
-                    "jspage": "0",
-                },
-                headers={
-                    "X-Requested-With": "XMLHttpRequest",
-                    "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-                    "Referer": SELECTION_ENDPOINT,
-                },
-                timeout=30,
-            )
-            if resp.status_code != 200:
-                raise RuntimeError(
-                    f"Display page request failed ({resp.status_code}): "
-                    f"{resp.text[:200]}"
-                )
-            soup = BeautifulSoup(resp.text, "html.parser")
-            display_fields: Dict[str, str] = {}
-            for tag in soup.find_all("input"):
-                tag_id = tag.get("id")
-                if tag_id:
-                    display_fields[tag_id] = tag.get("value") or ""
-            # Campus selection is usually a <select id="xqh_id">. Store the selected value
-            # so build_query_context picks it up, and also expose all options for multi-campus crawl.
-            selected_campus_id = crawler._get_select_value(soup, "xqh_id")
-            if selected_campus_id:
-                display_fields["xqh_id"] = selected_campus_id
-            campus_options = crawler._parse_select_options(soup, "xqh_id")
-            fields.update(display_fields)
-        except Exception:
-            if desired_xkkz or desired_xklc:
-                raise
-        fields["firstXkkzId"] = selected_tab.get("xkkz_id", fields.get("firstXkkzId", ""))
-        fields["firstKklxdm"] = selected_tab.get("kklxdm", fields.get("firstKklxdm", ""))
-        fields["firstNjdmId"] = selected_tab.get("njdm_id", fields.get("firstNjdmId", ""))
-        fields["firstZyhId"] = selected_tab.get("zyh_id", fields.get("firstZyhId", ""))
-        if selected_tab.get("label"):
-            fields["firstKklxmc"] = selected_tab.get("label", fields.get("firstKklxmc", ""))
-        if fields.get("xklcmc"):
-            progress.log_step(f"选课轮次：{fields.get('xklcmc')}")
-
-    params = crawler.build_query_context(fields)
-    progress.log_step("选课页面加载完毕")
-
-    requested_scope = (campus_scope or "all").strip() or "all"
-    resolved_campuses: List[Dict[str, str]] = []
-    if not campus_options:
-        resolved_campuses = [{"value": params.get("xqh_id", ""), "label": "", "selected": "1"}]
-    elif requested_scope.lower() == "current":
-        current_id = params.get("xqh_id", "")
-        match = next((opt for opt in campus_options if opt.get("value") == current_id), None)
-        resolved_campuses = [match] if match else [{"value": current_id, "label": "", "selected": "1"}]
-    elif requested_scope.lower() == "all":
-        resolved_campuses = [opt for opt in campus_options if (opt.get("value") or "").strip()]
-    else:
-        needle = requested_scope
-        resolved_campuses = [
-            opt
-            for opt in campus_options
-            if needle in (opt.get("label") or "") or needle == (opt.get("value") or "")
-        ]
-        if not resolved_campuses:
-            available = ", ".join(
-                f"{opt.get('label') or opt.get('value')}" for opt in campus_options if opt.get("label") or opt.get("value")
-            )
-            raise RuntimeError(f"未找到匹配校区：{needle}（可选：{available}）")
-
-    if resolved_campuses and resolved_campuses[0].get("label"):
-        labels = " / ".join(opt.get("label") or opt.get("value") or "" for opt in resolved_campuses)
-        progress.log(f"校区抓取范围：{requested_scope}（{labels}）")
-
-    merged_courses: List[Dict[str, str]] = []
-    merged_keys: set[tuple[str, str, str]] = set()
-
-    def detail_progress(current: int, total: int) -> None:
-        if total <= 0:
-            return
-        if current % 300 == 0 or current == total:
-            progress.log(f"课程详情抓取成功：({current}/{total})")
-
-    campus_count = len(resolved_campuses) if resolved_campuses else 0
-    for idx, campus in enumerate(resolved_campuses or [{"value": "", "label": "", "selected": "1"}], start=1):
-        campus_id = (campus.get("value") or "").strip()
-        campus_label = (campus.get("label") or campus_id or "").strip()
-        if campus_label:
-            progress.log(f"开始抓取校区 {idx}/{campus_count}：{campus_label}")
-
-        campus_params = dict(params)
-        if campus_id:
-            campus_params["xqh_id"] = campus_id
+                print(f"  {idx}. {xklcmc} {label}  xkkz_id=…{suffix}{active_mark}".strip())
+            try:
+                raw = input("输入序号（直接回车默认当前）：").strip()
+            except EOFError:
+                raw = ""
+            if raw:
+                try:
+                    pick = int(raw)
+                    if 1 <= pick <= len(tabs):
+                        selected_tab = tabs[pick - 1]
+                        auto_round = False
+                except ValueError:
+                    pass
 
-        course_rows = crawler.fetch_course_rows(campus_params)
-        if not course_rows:
-            if campus_label:
-                progress.log(f"校区 {campus_label} 课程列表为空，跳过")
+    round_tabs: List[Dict[str, str] | None] = list(tabs) if all_rounds and tabs else [selected_tab]
+    if all_rounds:
+        progress.log(f"全部轮次模式：共 {len(round_tabs)} 个选课轮次，共用同一登录会话与并发预算")
+        # Each extra round adds its round / page / campus-list / details / write steps.
+        progress.total_steps += 5 * (len(round_tabs) - 1)
+
+    store = SnapshotObjectStore(output_dir) if object_store else None
+    round_entries: List[dict] = []
+    round_course_count = 0
+    finished_rounds: Set[str] = set()
+    pending_rounds: deque[Dict[str, str] | None] = deque(round_tabs)
+    while pending_rounds:
+        round_tab = pending_rounds[0]
+        try:
+            round_fields = dict(fields)
+            campus_options: List[Dict[str, str]] = []
+            if round_tab is not None:
+                round_fields, campus_options = select_round_context(
+                    crawler,
+                    progress,
+                    fields,
+                    round_tab,
+                    strict=bool(desired_xkkz or desired_xklc or all_rounds),
+                )
+            entry = crawl_round(
+                crawler,
+                progress,
+                output_dir,
+                round_fields,
+                campus_options,
+                campus_scope=campus_scope,
+                max_courses=max_courses,
+                skip_empty=all_rounds,
+                before_write=revalidation.ensure_valid if revalidation else None,
+                pretty=pretty_json,
+                columnar=snapshot_v2,
+                store=store,
+                shard_by=shard_by,
+                shard_prefix_length=shard_prefix_length,
+                deltas=snapshot_deltas,
+            )
+        except (StaleQueryContextError, SessionExpiredError) as error:
+            if revalidation is None:
+                raise
+            # Finished rounds passed ensure_valid() before they were written, so they stand. Reload
+            # the selection page once and redo only this round (and the ones still queued) on it;
+            # finished details come back from the journal.
+            progress.log(f"缓存的选课查询上下文不可用（{error}），重新加载选课页面后重试本轮")
+            revalidation = None
+            if query_context_path:
+                safe_unlink(query_context_path)
+            crawler.display_contexts.clear()
+            selection_html, fields = open_jwxt_session(
+                crawler,
+                progress,
+                username,
+                password,
+                cookie_header=cookie_header,
+                cookie_store_path=cookie_store_path,
+                cookie_key_path=cookie_key_path,
+            )
+            selection_fields = dict(fields)
+            tabs = crawler.parse_round_tabs(selection_html)
+            if all_rounds:
+                pending_rounds = deque(tab for tab in tabs if tab.get("xkkz_id") not in finished_rounds)
+            elif auto_round or round_tab is None:
+                pending_rounds = deque([default_round_tab(fields, tabs)])
+            else:
+                live_tab = next((tab for tab in tabs if tab.get("xkkz_id") == round_tab.get("xkkz_id")), None)
+                if live_tab is None and not tabs:
+                    # --xkkz-id on a page without round tabs: the round was never a tab.
+                    live_tab = round_tab
+                if live_tab is None:
+                    raise RuntimeError("选课轮次已变化：指定的轮次不在当前选课页面中") from error
+                pending_rounds = deque([live_tab])
             continue
+        pending_rounds.popleft()
+        if round_tab is not None:
+            finished_rounds.add(round_tab.get("xkkz_id") or "")
+        if entry is not None:
+            round_entries.append(entry)
+            round_course_count += int(entry.pop("courseCount"))
+
+    if not round_entries:
+        raise RuntimeError("课程列表为空，可能尚未到选课时间")
 
-        meta: Dict[str, Dict] = {}
-        for row in course_rows:
-            kch = row.get("kch_id") or row.get("kch")
-            if not kch:
-                continue
-            meta.setdefault(
-                kch,
+    if crawler.concurrency:
+        controller = crawler.concurrency
+        progress.log(
+            f"自适应并发稳定在 {controller.limit}（峰值 {controller.peak}，下调 {controller.decreases} 次）"
+        )
+        if tuning_path:
+            save_concurrency_hint(tuning_path, engine, controller.limit)
+    if tuning_path:
+        save_detail_stats(tuning_path, crawler.detail_stats)
+    if cache:
+        progress.log(f"详情缓存：{cache.summary()}")
+    if crawler.reauth_count:
+        progress.log(f"抓取期间会话过期，已自动重新登录 {crawler.reauth_count} 次")
+    if journal and journal.resumed:
+        progress.log(f"断点续抓：复用已完成的 {journal.resumed} 门课程")
+    if journal:
+        journal.discard()
+    if store:
+        progress.log(
+            f"快照对象库：新写入 {store.written} 个，复用 {store.reused} 个，内容未变化跳过 {store.unchanged} 个"
+        )
+
+    if failures_path:
+        # Machine-readable list of courses that are missing from the snapshots (empty on success).
+        failures_path.write_bytes(
+            json_dumps(
                 {
-                    "courseId": row.get("kch", kch),
-                    "courseName": row.get("kcmc", ""),
-                    "credit": row.get("xf", ""),
-                    "cxbj": row.get("cxbj", "0"),
-                    "fxbj": row.get("fxbj", "0"),
+                    "termIds": [entry["termId"] for entry in round_entries],
+                    "generatedAt": int(time.time() * 1000),
+                    "failures": crawler.failed_details,
                 },
+                indent=True,
             )
-
-        if max_courses is not None:
-            limited_keys = list(meta.keys())[:max_courses]
-            meta = {key: meta[key] for key in limited_keys}
-
-        if campus_label:
-            progress.log_step(f"校区 {campus_label} 课程列表获取完成，共 {len(meta)} 门课程")
-        else:
-            progress.log_step(f"课程列表获取完成，共 {len(meta)} 门课程")
-
-        courses = crawler.fetch_course_details(
-            campus_params,
-            meta,
-            progress_callback=detail_progress,
         )
-        for row in courses:
-            key = (
-                str(row.get("courseId") or ""),
-                str(row.get("teachingClassId") or ""),
-                str(row.get("batchId") or ""),
-            )
-            if key in merged_keys:
-                continue
-            merged_keys.add(key)
-            merged_courses.append(row)
+    if crawler.failed_details:
+        progress.log(
+            f"仍有 {len(crawler.failed_details)} 门课程详情抓取失败（未写入快照）"
+            + (f"，清单见 {failures_path}" if failures_path else "")
+        )
 
-    if not merged_courses:
-        raise RuntimeError("课程列表为空，可能尚未到选课时间")
+    if query_context_path:
+        save_query_context(query_context_path, selection_fields, tabs, crawler.display_contexts)
 
-    merged_courses.sort(key=lambda x: (x["courseId"], x["teachingClassId"]))
-    progress.log_step(f"课程详情抓取完成，共 {len(merged_courses)} 个教学班")
+    merged_entries = update_current_entries(output_dir / "current.json", round_entries)
+    progress.log_step(
+        f"current.json 已更新：{len(merged_entries)} 条轮次记录；"
+        f"{'本次' if len(round_entries) > 1 else '当前'}轮次教学班 {round_course_count} 个"
+    )
 
-    term_code = f"{fields.get('xkxnm', '').strip()}-{fields.get('xkxqm', '').strip()}"
-    term_name = (
-        f"{fields.get('xkxnmc', fields.get('xkxnm', '')).strip()} "
-        f"{fields.get('xkxqmc', fields.get('xkxqm', '')).strip()}".strip()
-    ).strip()
+    if has_cookie_store and cookie_store_path and cookie_key_path:
+        save_cookie_bundle(
+            cookie_store_path,
+            cookie_key_path,
+            cookie_username_hint or username or "",
+            crawler.session.cookies,
+        )
+        progress.log_step("本地 cookie 已加密保存（下次可免密刷新）")
 
-    round_id = (params.get("xkkz_id") or "").strip()
-    round_term_code = term_code
-    if round_id:
-        round_term_code = f"{term_code}--xkkz-{round_id}"
+    crawler.close()
 
-    os.makedirs(output_dir / "terms", exist_ok=True)
-    result = {
-        "backendOrigin": JWXT_HOST,
-        "termName": term_name or term_code,
-        "termId": round_term_code,
-        "jwxtRound": {
-            "xkkzId": params.get("xkkz_id", ""),
-            "xklc": fields.get("xklc", ""),
-            "xklcmc": fields.get("xklcmc", ""),
-        },
-        "campusOptions": campus_options,
-        "updateTimeMs": int(time.time() * 1000),
-        "hash": hashlib.md5(
-            json.dumps(merged_courses, sort_keys=True, ensure_ascii=False).encode()
-        ).hexdigest(),
-        "courses": merged_courses,
-    }
-    term_path = output_dir / "terms" / f"{round_term_code}.json"
-    with open(term_path, "w", encoding="utf-8") as fh:
-        json.dump(result, fh, ensure_ascii=False, indent=2)
-    progress.log_step(f"学期 {round_term_code} 数据写入完成")
 
+def refresh_counts(
+    output_dir: Path,
+    term_id: str | None,
+    username: str | None,
+    password: str | None,
+    cookie_header: str | None = None,
+    cookie_store_path: Path | None = None,
+    cookie_key_path: Path | None = None,
+    cookie_username_hint: str | None = None,
+    request_interval: float = 0.0,
+    rate_limit: float | None = None,
+    rate_burst: int = 1,
+    max_concurrent_requests: int | None = None,
+    engine: str = "thread",
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    workers: int = DEFAULT_WORKERS,
+    html_backend: str = "auto",
+    pretty_json: bool = False,
+    object_store: bool = False,
+) -> None:
+    """Patch enrollment counts of an existing round snapshot in place."""
     current_path = output_dir / "current.json"
-    generated_at = int(time.time() * 1000)
-    current_entry = {
-        "termId": round_term_code,
-        "termCode": term_code,
-        "jwxtRound": {
-            "xkkzId": round_id,
-            "xklc": (fields.get("xklc") or "").strip(),
-            "xklcmc": (fields.get("xklcmc") or "").strip(),
-        },
-        "generatedAt": generated_at,
-    }
-
-    existing_entries: list[dict] = []
-    if current_path.exists():
-        try:
-            raw = json.loads(current_path.read_text(encoding="utf-8"))
-            if isinstance(raw, list):
-                if raw and isinstance(raw[0], str):
-                    # Legacy schema: string[] of termId
-                    existing_entries = [{"termId": str(x).strip()} for x in raw if str(x).strip()]
-                else:
-                    existing_entries = [x for x in raw if isinstance(x, dict)]
-        except Exception:
-            existing_entries = []
+    if not term_id:
+        entries = read_current_entries(current_path)
+        if not entries:
+            raise RuntimeError("current.json 为空，无法确定需要刷新的轮次（请指定 termId）")
+        term_id = str(entries[-1].get("termId") or "").strip()
+    term_path = output_dir / "terms" / f"{term_id}.json"
+    if not term_path.exists():
+        raise RuntimeError(f"快照不存在：{term_path}")
+    snapshot = json_loads(term_path.read_bytes())
+    courses: List[Dict] = snapshot.get("courses") or []
+    round_id = str((snapshot.get("jwxtRound") or {}).get("xkkzId") or "").strip()
+    if not courses or not round_id:
+        raise RuntimeError(f"快照 {term_id} 缺少课程或 xkkzId，无法只刷新人数")
 
-    def entry_key(obj: dict) -> tuple[str, str]:
-        term_id = str(obj.get("termId") or "").strip()
-        xklc = str((obj.get("jwxtRound") or {}).get("xklc") or "").strip()
-        return (term_id, xklc)
+    has_cookie_store = bool(cookie_store_path and cookie_key_path)
+    progress = ProgressTracker(total_steps=7 if has_cookie_store else 6)
+    progress.start(f"准备刷新 {term_id} 的选课人数")
+    crawler = JWXTCrawler(
+        (username or ""),
+        (password or ""),
+        workers=workers,
+        request_interval=request_interval,
+        rate_limit=rate_limit,
+        rate_burst=rate_burst,
+        max_concurrent_requests=max_concurrent_requests,
+        engine=engine,
+        max_in_flight=max_in_flight,
+        html_backend=html_backend,
+    )
+    selection_html, fields = open_jwxt_session(
+        crawler,
+        progress,
+        username,
+        password,
+        cookie_header=cookie_header,
+        cookie_store_path=cookie_store_path,
+        cookie_key_path=cookie_key_path,
+    )
 
-    merged_entries: list[dict] = []
-    seen = set()
-    for item in existing_entries:
-        key = entry_key(item)
-        if key in seen:
-            continue
-        if key[0] == round_term_code and key[1] == str(current_entry["jwxtRound"]["xklc"]):
+    tab = next(
+        (t for t in crawler.parse_round_tabs(selection_html) if t.get("xkkz_id") == round_id),
+        None,
+    )
+    if tab is None:
+        raise RuntimeError(f"选课页面中已找不到轮次 xkkz_id={round_id}（轮次可能已关闭）")
+    fields, campus_options = select_round_context(crawler, progress, fields, tab, strict=True)
+    params = crawler.build_query_context(fields)
+    progress.log_step("选课轮次上下文加载完毕")
+
+    wanted_course_ids = {str(row.get("courseId") or "") for row in courses}
+    campus_ids = [
+        (opt.get("value") or "").strip() for opt in campus_options if (opt.get("value") or "").strip()
+    ] or [params.get("xqh_id", "")]
+    fresh_rows: Dict[tuple[str, str, str], Dict] = {}
+    for campus_id in campus_ids:
+        campus_params = dict(params)
+        if campus_id:
+            campus_params["xqh_id"] = campus_id
+        meta = {
+            kch: info
+            for kch, info in build_course_meta(crawler.fetch_course_rows(campus_params)).items()
+            if str(info.get("courseId") or "") in wanted_course_ids
+        }
+        for row in crawler.fetch_course_details(campus_params, meta):
+            fresh_rows.setdefault(course_row_key(row), row)
+    progress.log_step(f"教学班人数获取完成：{len(fresh_rows)} 个")
+
+    changed = 0
+    missing = 0
+    for row in courses:
+        fresh = fresh_rows.get(course_row_key(row))
+        if fresh is None:
+            missing += 1
             continue
-        seen.add(key)
-        merged_entries.append(item)
-    merged_entries.append(current_entry)
-
-    def sort_key(obj: dict) -> tuple[int, int]:
-        try:
-            xklc_num = int(str((obj.get("jwxtRound") or {}).get("xklc") or "0").strip() or "0")
-        except Exception:
-            xklc_num = 0
-        gen = obj.get("generatedAt")
-        gen_num = int(gen) if isinstance(gen, (int, float)) else 0
-        return (xklc_num, gen_num)
-
-    merged_entries.sort(key=sort_key)
-
-    with open(current_path, "w", encoding="utf-8") as fh:
-        json.dump(merged_entries, fh, ensure_ascii=False, indent=2)
-    progress.log_step(
-        f"current.json 已更新：{len(merged_entries)} 条轮次记录；当前轮次教学班 {len(merged_courses)} 个"
+        limitations = [note for note in row.get("limitations") or [] if note != "人数已满"]
+        if "人数已满" in (fresh.get("limitations") or []):
+            limitations.append("人数已满")
+        patched = {"number": fresh.get("number"), "capacity": fresh.get("capacity"), "limitations": limitations}
+        if any(row.get(key) != value for key, value in patched.items()):
+            row.update(patched)
+            changed += 1
+
+    snapshot["updateTimeMs"] = int(time.time() * 1000)
+    shard_by, shard_prefix_length = read_shard_layout(term_path)
+    published = write_round_snapshot(
+        output_dir,
+        term_path,
+        snapshot,
+        pretty=pretty_json,
+        columnar=snapshot_v2_path(term_path).exists(),
+        store=SnapshotObjectStore(output_dir) if object_store else None,
+        shard_by=shard_by,
+        shard_prefix_length=shard_prefix_length,
+        deltas=any(
+            str(entry.get("termId") or "").strip() == term_id and "deltas" in entry
+            for entry in read_current_entries(current_path)
+        ),
     )
+    progress.log_step(f"快照 {term_id} 已更新：{changed} 个教学班人数变化，{missing} 个未返回（保持原值）")
+
+    entries = read_current_entries(current_path)
+    for entry in entries:
+        if str(entry.get("termId") or "").strip() == term_id:
+            entry["generatedAt"] = snapshot["updateTimeMs"]
+            for key in ("sizes", *PUBLISHED_FILE_KEYS):
+                entry.pop(key, None)
+            entry.update(published)
+    if entries:
+        write_json_atomic(current_path, entries)
+    progress.log_step("current.json 生成时间已更新")
 
     if has_cookie_store and cookie_store_path and cookie_key_path:
         save_cookie_bundle(
@@ -1578,6 +4599,8 @@ def crawl(
         )
         progress.log_step("本地 cookie 已加密保存（下次可免密刷新）")
 
+    crawler.close()
+
 
 def main() -> None:
     parser = argparse.ArgumentParser(description="JWXT course crawler")
@@ -1616,6 +4639,11 @@ def main() -> None:
         "--xklc",
         help="指定 JWXT 选课轮次（例如 2）。若未指定且存在多个轮次，将在交互模式下提示选择。",
     )
+    parser.add_argument(
+        "--all-rounds",
+        action="store_true",
+        help="抓取选课页面中的全部选课轮次 Tab（共用一次登录），每个轮次写入各自的快照",
+    )
     parser.add_argument(
         "--campus-scope",
         default="all",
@@ -1627,7 +4655,157 @@ def main() -> None:
     parser.add_argument(
         "--request-interval",
         type=float,
-        help="相邻请求之间的等待秒数（默认 0）",
+        help="相邻请求之间的等待秒数（默认 0；等价于 --rate 1/间隔、--burst 1）",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        help="令牌桶平均请求速率（次/秒），优先于 --request-interval",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=1,
+        help="令牌桶容量，即允许的突发请求数（默认 1）",
+    )
+    parser.add_argument(
+        "--max-concurrent-requests",
+        type=int,
+        help="同时在途请求数的硬上限（默认不限制，由 --workers / --max-in-flight 决定）",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=list(CRAWL_ENGINES),
+        default="thread",
+        help="抓取引擎：thread(默认，线程池 + requests) / async(asyncio + httpx，单连接池高并发)",
+    )
+    parser.add_argument(
+        "--html-backend",
+        choices=list(HTML_BACKENDS),
+        default="auto",
+        help="选课页面解析后端：auto(默认，优先 selectolax/lxml，未安装时用标准库) / stdlib / lxml / selectolax / bs4",
+    )
+    parser.add_argument(
+        "--pretty-json",
+        action="store_true",
+        help="快照信封按 2 空格缩进写出（默认紧凑；courses 始终为每行一门课程的规范形式）",
+    )
+    parser.add_argument(
+        "--snapshot-v2",
+        action="store_true",
+        help="额外生成列式快照 terms/<termId>.v2.json（字符串字典编码 + 数值数组，体积与解析耗时更小）",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=list(SHARD_MODES),
+        default=None,
+        help="按学院(academy)或课程号前缀(course-prefix)把每轮快照拆分为 terms/<termId>/ 下的分片，并写入 manifest",
+    )
+    parser.add_argument(
+        "--shard-prefix-length",
+        type=int,
+        default=DEFAULT_SHARD_PREFIX_LENGTH,
+        help=f"--shard-by course-prefix 时使用的课程号前缀长度（默认 {DEFAULT_SHARD_PREFIX_LENGTH}）",
+    )
+    parser.add_argument(
+        "--snapshot-deltas",
+        action="store_true",
+        help="与上一份快照比较，按 teachingClassId 生成增量文件 terms/<termId>.deltas/<旧hash>.json 并记入 current.json",
+    )
+    parser.add_argument(
+        "--object-store",
+        action="store_true",
+        help="快照正文按内容寻址写入 objects/（terms/ 下为硬链接），内容未变化的轮次不重写",
+    )
+    parser.add_argument(
+        "--gc-objects",
+        action="store_true",
+        help="删除 objects/ 中不再被 current.json 或 terms/ 引用的快照对象后退出",
+    )
+    parser.add_argument(
+        "--json-backend",
+        choices=list(JSON_BACKENDS),
+        default="auto",
+        help="JSON 编解码后端：auto(默认，已安装 orjson 时使用) / orjson / stdlib；两者输出字节一致",
+    )
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=DEFAULT_MAX_IN_FLIGHT,
+        help=f"async 引擎同时在途的最大请求数（默认 {DEFAULT_MAX_IN_FLIGHT}）",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help=f"thread 引擎的工作线程数（默认 {DEFAULT_WORKERS}）",
+    )
+    parser.add_argument(
+        "--adaptive-concurrency",
+        action="store_true",
+        help=(
+            "按 JWXT 限流信号（901/429/5xx、p95 延迟上升）自动调节并发（AIMD），"
+            "以 --workers / --max-in-flight 为上限；结果保存到 --tuning-file 供下次复用"
+        ),
+    )
+    parser.add_argument(
+        "--tuning-file",
+        default=str(DEFAULT_TUNING_FILE),
+        help="自适应并发结果与各课程详情耗时统计的保存文件（默认 crawler/.jwxt_crawl_tuning.json）",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        help="课程详情响应的本地持久缓存目录（位于 crawler/ 下；默认不启用）",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_CACHE_TTL_SECONDS,
+        help=f"缓存有效期（秒，默认 {DEFAULT_CACHE_TTL_SECONDS:.0f}）；有效期内的详情不再请求教务系统",
+    )
+    parser.add_argument(
+        "--cache-max-mb",
+        type=int,
+        default=DEFAULT_CACHE_MAX_MB,
+        help=f"缓存目录大小上限（MB，默认 {DEFAULT_CACHE_MAX_MB}），超出后按最近最少使用淘汰",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="从上次中断的抓取继续：复用断点日志中已完成的课程详情（快照写入后日志自动删除）",
+    )
+    parser.add_argument(
+        "--journal-file",
+        default=str(DEFAULT_JOURNAL_FILE),
+        help="断点日志文件（默认 crawler/.jwxt_crawl_journal.jsonl）",
+    )
+    parser.add_argument(
+        "--failures-file",
+        default=str(DEFAULT_FAILURES_FILE),
+        help="抓取结束后写入仍失败课程（kch_id 等）的 JSON 清单（默认 crawler/.jwxt_crawl_failures.json）",
+    )
+    parser.add_argument(
+        "--query-context-cache",
+        default=str(DEFAULT_QUERY_CONTEXT_FILE),
+        help=(
+            "选课查询上下文缓存文件（默认 crawler/.jwxt_query_context.json）；命中时跳过选课页面加载，"
+            "直接抓取课程列表并在后台校验"
+        ),
+    )
+    parser.add_argument(
+        "--no-query-context-cache",
+        action="store_true",
+        help="禁用选课查询上下文缓存（每次都重新加载选课页面）",
+    )
+    parser.add_argument(
+        "--refresh-counts",
+        nargs="?",
+        const="",
+        metavar="TERM_ID",
+        help=(
+            "只刷新已有快照中各教学班的已选人数/容量（默认 current.json 中最后一个轮次），"
+            "不重新抓取课程列表以外的信息"
+        ),
     )
     parser.add_argument(
         "--cloud-base-url",
@@ -1645,6 +4823,12 @@ def main() -> None:
         action="store_true",
         help="下载 current.json 中的全部学期（默认只下载最后一个）",
     )
+    parser.add_argument(
+        "--cloud-workers",
+        type=int,
+        default=DEFAULT_CLOUD_WORKERS,
+        help=f"云端快照并发下载数（默认 {DEFAULT_CLOUD_WORKERS}；--request-interval 对全部并发请求共同生效）",
+    )
     parser.add_argument(
         "--no-prompt",
         action="store_true",
@@ -1671,24 +4855,47 @@ def main() -> None:
         help="清除本地 cookie 存储与密钥后退出",
     )
     args = parser.parse_args()
+    if args.all_rounds and (args.xkkz_id or args.xklc):
+        parser.error("--all-rounds 不能与 --xkkz-id / --xklc 同时使用")
 
-    output_dir = resolve_output_dir(args.output_dir)
-    secrets_path = Path(args.secrets_file).expanduser().resolve()
-    request_interval = args.request_interval
-    if request_interval is None:
-        request_interval = prompt_request_interval()
-    request_interval = max(0.0, request_interval)
-
+    # Local-only jobs exit before anything that prompts or loads a backend.
     cookie_store_path = None if args.no_cookie_store else resolve_local_file(args.cookie_store, DEFAULT_COOKIE_STORE_FILE)
     cookie_key_path = None if args.no_cookie_store else resolve_local_file(args.cookie_key, DEFAULT_COOKIE_KEY_FILE)
+    query_context_path = (
+        None
+        if args.no_query_context_cache
+        else resolve_local_file(args.query_context_cache, DEFAULT_QUERY_CONTEXT_FILE)
+    )
     if args.clear_cookie_store:
         if cookie_store_path:
             safe_unlink(cookie_store_path)
         if cookie_key_path:
             safe_unlink(cookie_key_path)
-        print("已清除本地 cookie 存储与密钥")
+        if query_context_path:
+            safe_unlink(query_context_path)
+        print("已清除本地 cookie 存储、密钥与选课查询上下文缓存")
+        return
+
+    configure_json_backend(args.json_backend)
+    output_dir = resolve_output_dir(args.output_dir)
+    if args.gc_objects:
+        removed, freed = SnapshotObjectStore(output_dir).gc()
+        print(f"已清理 {removed} 个未引用的快照对象，释放 {freed / 1024 / 1024:.1f} MB")
         return
 
+    secrets_path = Path(args.secrets_file).expanduser().resolve()
+    request_interval = args.request_interval
+    if request_interval is None:
+        request_interval = 0.0 if args.rate else prompt_request_interval()
+    request_interval = max(0.0, request_interval)
+
+    tuning_path = resolve_local_file(args.tuning_file, DEFAULT_TUNING_FILE)
+    journal_path = resolve_local_file(args.journal_file, DEFAULT_JOURNAL_FILE)
+    failures_path = resolve_local_file(args.failures_file, DEFAULT_FAILURES_FILE)
+    cache_dir = resolve_local_dir(args.cache_dir) if args.cache_dir else None
+
+    import requests
+
     requests.packages.urllib3.disable_warnings()  # type: ignore[attr-defined]
     if args.cloud_download == "always":
         if not args.cloud_base_url:
@@ -1698,6 +4905,7 @@ def main() -> None:
             args.cloud_base_url,
             download_all_terms=bool(args.cloud_all_terms),
             request_interval=request_interval,
+            workers=args.cloud_workers,
         )
         return
 
@@ -1722,27 +4930,76 @@ def main() -> None:
             args.cloud_base_url,
             download_all_terms=bool(args.cloud_all_terms),
             request_interval=request_interval,
+            workers=args.cloud_workers,
         )
         return
 
-    if cookie_store_path and cookie_key_path:
-        try:
-            crawl(
+    def run(username: str | None, password: str | None, cookie_username_hint: str | None) -> None:
+        if args.refresh_counts is not None:
+            refresh_counts(
                 output_dir,
-                None,
-                None,
+                args.refresh_counts.strip() or None,
+                username,
+                password,
                 cookie_header=args.cookie_header,
                 cookie_store_path=cookie_store_path,
                 cookie_key_path=cookie_key_path,
-                cookie_username_hint=None,
-                max_courses=args.limit,
+                cookie_username_hint=cookie_username_hint,
                 request_interval=request_interval,
-                xkkz_id=args.xkkz_id,
-                xklc=args.xklc,
-                campus_scope=args.campus_scope,
-                no_prompt=bool(args.no_prompt),
+                rate_limit=args.rate,
+                rate_burst=args.burst,
+                max_concurrent_requests=args.max_concurrent_requests,
+                engine=args.engine,
+                max_in_flight=args.max_in_flight,
+                workers=args.workers,
+                html_backend=args.html_backend,
+                pretty_json=bool(args.pretty_json),
+                object_store=bool(args.object_store),
             )
             return
+        crawl(
+            output_dir,
+            username,
+            password,
+            cookie_header=args.cookie_header,
+            cookie_store_path=cookie_store_path,
+            cookie_key_path=cookie_key_path,
+            cookie_username_hint=cookie_username_hint,
+            max_courses=args.limit,
+            request_interval=request_interval,
+            rate_limit=args.rate,
+            rate_burst=args.burst,
+            max_concurrent_requests=args.max_concurrent_requests,
+            xkkz_id=args.xkkz_id,
+            xklc=args.xklc,
+            campus_scope=args.campus_scope,
+            no_prompt=bool(args.no_prompt),
+            engine=args.engine,
+            max_in_flight=args.max_in_flight,
+            workers=args.workers,
+            adaptive_concurrency=bool(args.adaptive_concurrency),
+            tuning_path=tuning_path,
+            cache_dir=cache_dir,
+            cache_ttl=args.cache_ttl,
+            cache_max_mb=args.cache_max_mb,
+            journal_path=journal_path,
+            resume=bool(args.resume),
+            failures_path=failures_path,
+            all_rounds=bool(args.all_rounds),
+            query_context_path=query_context_path,
+            html_backend=args.html_backend,
+            pretty_json=bool(args.pretty_json),
+            snapshot_v2=bool(args.snapshot_v2),
+            object_store=bool(args.object_store),
+            shard_by=args.shard_by,
+            shard_prefix_length=args.shard_prefix_length,
+            snapshot_deltas=bool(args.snapshot_deltas),
+        )
+
+    if cookie_store_path and cookie_key_path:
+        try:
+            run(None, None, None)
+            return
         except RuntimeError as error:
             if "未提供账号密码" not in str(error):
                 raise
@@ -1755,27 +5012,14 @@ def main() -> None:
                     args.cloud_base_url,
                     download_all_terms=bool(args.cloud_all_terms),
                     request_interval=request_interval,
+                    workers=args.cloud_workers,
                 )
                 return
             raise RuntimeError("缺少登录凭据且 --no-prompt 已启用")
         username, password = cast(str, username_np), cast(str, password_np)
     else:
         username, password = resolve_credentials(args, secrets_path)
-    crawl(
-        output_dir,
-        username,
-        password,
-        cookie_header=args.cookie_header,
-        cookie_store_path=cookie_store_path,
-        cookie_key_path=cookie_key_path,
-        cookie_username_hint=username,
-        max_courses=args.limit,
-        request_interval=request_interval,
-        xkkz_id=args.xkkz_id,
-        xklc=args.xklc,
-        campus_scope=args.campus_scope,
-        no_prompt=bool(args.no_prompt),
-    )
+    run(username, password, username)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,90 @@
+import functools
+import hashlib
+import http.server
+import json
+import threading
+import time
+
+import pytest
+
+import jwxt_crawler as jc
+
+TERMS = [f"2025-{n}" for n in range(1, 6)]
+
+
+class RecordingHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.server.started.append((time.monotonic(), self.path))
+        super().do_GET()
+
+
+@pytest.fixture()
+def cloud(tmp_path):
+    root = tmp_path / "cloud"
+    (root / "terms").mkdir(parents=True)
+    (root / "current.json").write_text(json.dumps([{"termId": term} for term in TERMS]), encoding="utf-8")
+    for term in TERMS:
+        (root / "terms" / f"{term}.json").write_text(json.dumps({"hash": "", "courses": []}), encoding="utf-8")
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(RecordingHandler, directory=str(root))
+    )
+    server.started = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+
+
+def test_request_interval_spaces_requests_across_workers(cloud, tmp_path):
+    url = f"http://127.0.0.1:{cloud.server_port}"
+    jc.download_cloud_snapshot(tmp_path / "out", url, request_interval=0.1, workers=4)
+    started = sorted(at for at, _ in cloud.started)
+    assert len(started) == len(TERMS) + 1
+    # Arrival times carry scheduling jitter; the limiter's spacing shows in the total span.
+    assert started[-1] - started[0] >= 0.1 * len(TERMS) - 0.02
+    gaps = [later - earlier for earlier, later in zip(started, started[1:])]
+    assert min(gaps) >= 0.05
+    written = sorted(path.name for path in (tmp_path / "out" / "terms").glob("*.json") if not path.name.startswith("."))
+    assert written == [f"{term}.json" for term in TERMS]
+
+
+@pytest.mark.parametrize("pretty", [False, True])
+@pytest.mark.parametrize("chunk_size", [1, 7])
+def test_stream_digest_checks_the_courses_hash(pretty, chunk_size):
+    snapshot = {"termId": "2025-1", "courses": [{"teachingClassId": "01", "number": "3"}, {"teachingClassId": "02"}]}
+    body = b"".join(jc.encode_snapshot(snapshot, pretty=pretty))
+    digest = jc._SnapshotStreamDigest()
+    for start in range(0, len(body), chunk_size):
+        digest.update(body[start : start + chunk_size])
+    assert digest.courses_md5() == snapshot["hash"]
+
+
+def test_current_json_drops_files_that_were_not_mirrored(cloud, tmp_path):
+    published = {
+        "contentId": "cd" * 8,
+        "v2Sizes": {"json": 1},
+        "v2Object": "ef" * 32,
+        "shards": {"by": "academy", "count": 1, "manifest": "terms/x.manifest.json"},
+        "deltas": [{"from": "0" * 32, "to": "1" * 32, "path": "terms/x.deltas/0.json"}],
+    }
+    terms = tmp_path / "cloud" / "terms"
+    rows = [
+        {
+            "termId": term,
+            "generatedAt": 1,
+            "object": hashlib.sha256((terms / f"{term}.json").read_bytes()).hexdigest(),
+            **published,
+        }
+        for term in TERMS
+    ]
+    (tmp_path / "cloud" / "current.json").write_text(json.dumps(rows), encoding="utf-8")
+
+    out = tmp_path / "out"
+    jc.download_cloud_snapshot(out, f"http://127.0.0.1:{cloud.server_port}", request_interval=0, workers=4)
+    current = json.loads((out / "current.json").read_text(encoding="utf-8"))
+    assert [row["termId"] for row in current] == TERMS
+    for row in current:
+        assert set(row) == {"termId", "generatedAt", "sizes"}
+        assert row["sizes"] == jc.snapshot_variant_sizes(out / "terms" / f"{row['termId']}.json")
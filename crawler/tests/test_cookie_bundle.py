@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import jwxt_crawler as jc
+
+pytest.importorskip("cryptography")
+
+
+@pytest.fixture()
+def store(tmp_path):
+    return tmp_path / "cookie.enc.json", tmp_path / "cookie.pem"
+
+
+def make_jar():
+    jar = jc.new_thread_safe_cookie_jar()
+    jar.set("JSESSIONID", "s3cr3t-session", domain="jwxt.shu.edu.cn", path="/jwglxt")
+    jar.set("route", "r1", domain="jwxt.shu.edu.cn", path="/")
+    return jar
+
+
+def cookie_values(bundle):
+    return sorted((cookie["name"], cookie["value"], cookie["path"]) for cookie in bundle["cookies"])
+
+
+def test_v2_round_trip(store):
+    cookie_store, cookie_key = store
+    jc.save_cookie_bundle(cookie_store, cookie_key, "  student  ", make_jar())
+
+    raw = json.loads(cookie_store.read_text(encoding="utf-8"))
+    assert (raw["version"], raw["algo"]) == (jc.COOKIE_BUNDLE_V2_VERSION, jc.COOKIE_BUNDLE_V2_ALGO)
+    assert "ciphertextChunks" not in raw
+    assert b"s3cr3t-session" not in cookie_store.read_bytes()
+
+    bundle = jc.load_cookie_bundle(cookie_store, cookie_key)
+    assert bundle["username"] == "student"
+    assert cookie_values(bundle) == [("JSESSIONID", "s3cr3t-session", "/jwglxt"), ("route", "r1", "/")]
+
+
+def test_v2_rejects_an_edited_header(store):
+    cookie_store, cookie_key = store
+    jc.save_cookie_bundle(cookie_store, cookie_key, "student", make_jar())
+    raw = json.loads(cookie_store.read_text(encoding="utf-8"))
+    raw["username"] = "someone-else"
+    cookie_store.write_text(json.dumps(raw), encoding="utf-8")
+
+    assert jc.load_cookie_bundle(cookie_store, cookie_key) is None
+
+
+def test_v1_bundle_is_read_and_upgraded_on_save(store, monkeypatch):
+    cookie_store, cookie_key = store
+    jc.read_cookie_key_pem(cookie_key)  # generated with cryptography; pure-python rsa takes seconds
+    with monkeypatch.context() as patch:
+        patch.setattr(jc, "_cookie_crypto", lambda: None)
+        jc.save_cookie_bundle(cookie_store, cookie_key, "student", make_jar())
+    assert json.loads(cookie_store.read_text(encoding="utf-8"))["version"] == jc.COOKIE_BUNDLE_VERSION
+
+    bundle = jc.load_cookie_bundle(cookie_store, cookie_key)
+    assert cookie_values(bundle) == [("JSESSIONID", "s3cr3t-session", "/jwglxt"), ("route", "r1", "/")]
+
+    jar = jc.new_thread_safe_cookie_jar()
+    jc.apply_cookie_records(jar, bundle["cookies"])
+    jc.save_cookie_bundle(cookie_store, cookie_key, bundle["username"], jar)
+    assert json.loads(cookie_store.read_text(encoding="utf-8"))["version"] == jc.COOKIE_BUNDLE_V2_VERSION
+    assert cookie_values(jc.load_cookie_bundle(cookie_store, cookie_key)) == cookie_values(bundle)
@@ -0,0 +1,141 @@
+import threading
+
+import pytest
+
+import jwxt_crawler as jc
+
+
+class FakeCrawler:
+    """Stands in for JWXTCrawler: serves fixed course lists per campus, no network."""
+
+    def __init__(self, rows_by_campus):
+        self.rows_by_campus = rows_by_campus
+
+    def build_query_context(self, fields):
+        return {"xkkz_id": fields.get("xkkz_id", ""), "xqh_id": ""}
+
+    def fetch_course_rows(self, params):
+        return self.rows_by_campus.get(params.get("xqh_id", ""), [])
+
+    def fetch_course_details_once(self, params, meta, progress_callback=None):
+        rows = [
+            {"courseId": info["courseId"], "teachingClassId": f"{kch}-01", "campus": params["xqh_id"]}
+            for kch, info in meta.items()
+        ]
+        return rows, {}
+
+    def sweep_failed_details(self, failed_batches):
+        return []
+
+
+FIELDS = {"xkxnm": "2025", "xkxqm": "3", "xkkz_id": "ABC", "xklc": "1", "xklcmc": "第一轮"}
+CAMPUSES = [{"value": "1", "label": "宝山"}, {"value": "2", "label": "延长"}]
+
+
+def test_empty_round_raises_before_writing(tmp_path):
+    crawler = FakeCrawler({})
+    with pytest.raises(RuntimeError, match="课程列表为空"):
+        jc.crawl_round(crawler, jc.ProgressTracker(1), tmp_path, FIELDS, CAMPUSES)
+    assert not (tmp_path / "terms").exists()
+
+
+def test_empty_round_skipped_when_requested(tmp_path):
+    crawler = FakeCrawler({})
+    before_write_calls = []
+    entry = jc.crawl_round(
+        crawler,
+        jc.ProgressTracker(1),
+        tmp_path,
+        FIELDS,
+        CAMPUSES,
+        skip_empty=True,
+        before_write=lambda: before_write_calls.append(1),
+    )
+    assert entry is None
+    assert before_write_calls == []
+    assert not (tmp_path / "terms").exists()
+
+
+def test_round_written_and_deduped_in_campus_order(tmp_path):
+    crawler = FakeCrawler(
+        {
+            "1": [{"kch_id": "K1", "kch": "K1", "kcmc": "高数"}],
+            "2": [{"kch_id": "K1", "kch": "K1", "kcmc": "高数"}, {"kch_id": "K2", "kch": "K2", "kcmc": "线代"}],
+        }
+    )
+    entry = jc.crawl_round(crawler, jc.ProgressTracker(1), tmp_path, FIELDS, CAMPUSES)
+    assert entry["termId"] == "2025-3--xkkz-ABC"
+    assert entry["courseCount"] == 2
+    snapshot = jc.json_loads((tmp_path / "terms" / "2025-3--xkkz-ABC.json").read_bytes())
+    # K1 is offered on both campuses; the first campus's row wins.
+    assert [(row["courseId"], row["campus"]) for row in snapshot["courses"]] == [("K1", "1"), ("K2", "2")]
+
+
+def test_failed_detail_pass_tears_down_list_stage(tmp_path):
+    class FailingCrawler(FakeCrawler):
+        def fetch_course_details_once(self, params, meta, progress_callback=None):
+            raise RuntimeError("detail boom")
+
+    campuses = [{"value": str(i), "label": f"校区{i}"} for i in range(1, 9)]
+    crawler = FailingCrawler({str(i): [{"kch_id": f"K{i}", "kch": f"K{i}"}] for i in range(1, 9)})
+    with pytest.raises(RuntimeError, match="detail boom"):
+        jc.crawl_round(crawler, jc.ProgressTracker(1), tmp_path, FIELDS, campuses)
+    assert not [t for t in threading.enumerate() if t.name == "jwxt-list-stage"]
+
+
+def test_list_stage_error_propagates(tmp_path):
+    class FailingCrawler(FakeCrawler):
+        def fetch_course_rows(self, params):
+            if params["xqh_id"] == "2":
+                raise RuntimeError("list boom")
+            return super().fetch_course_rows(params)
+
+    crawler = FailingCrawler({"1": [{"kch_id": "K1", "kch": "K1"}]})
+    with pytest.raises(RuntimeError, match="list boom"):
+        jc.crawl_round(crawler, jc.ProgressTracker(1), tmp_path, FIELDS, CAMPUSES)
+    assert not (tmp_path / "terms").exists()
+
+
+def test_overlapping_lanes_report_their_own_progress(tmp_path, capsys):
+    rows = {
+        "1": [{"kch_id": "K1", "kch": "K1", "kcmc": "A"}],
+        "2": [{"kch_id": "K2", "kch": "K2", "kcmc": "B"}, {"kch_id": "K3", "kch": "K3", "kcmc": "C"}],
+    }
+
+    class ReportingCrawler(FakeCrawler):
+        def fetch_course_details_once(self, params, meta, progress_callback=None):
+            progress_callback(len(meta), len(meta))
+            return super().fetch_course_details_once(params, meta, progress_callback)
+
+    jc.crawl_round(ReportingCrawler(rows), jc.ProgressTracker(1), tmp_path, FIELDS, CAMPUSES)
+    out = capsys.readouterr().out
+    assert "校区 宝山 课程详情抓取成功：(1/1)" in out
+    assert "校区 延长 课程详情抓取成功：(2/2)" in out
+
+
+def test_concurrent_lanes_prewarm_the_pool_once(monkeypatch):
+    crawler = jc.JWXTCrawler("", "", workers=3)
+    probes = []
+    release = threading.Event()
+
+    def head(*args, **kwargs):
+        probes.append(args)
+        release.wait(1)
+
+    monkeypatch.setattr(crawler.session, "head", head)
+    lanes = [threading.Thread(target=crawler.prewarm_connections) for _ in range(jc.PIPELINE_CAMPUS_LANES)]
+    for lane in lanes:
+        lane.start()
+    release.set()
+    for lane in lanes:
+        lane.join()
+    assert len(probes) == 3
+
+
+def test_prewarm_skipped_under_a_request_interval(monkeypatch):
+    crawler = jc.JWXTCrawler("", "", workers=3, request_interval=0.5)
+    probes = []
+    monkeypatch.setattr(crawler.session, "head", lambda *args, **kwargs: probes.append(args))
+    assert crawler.prewarm_connections() == 0
+    assert probes == []
+    assert crawler.rate_limiter._reserve() == 0.0
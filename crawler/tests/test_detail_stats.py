@@ -0,0 +1,39 @@
+import json
+
+import jwxt_crawler as jc
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def test_trim_drops_stale_entries_then_least_recent(monkeypatch):
+    monkeypatch.setattr(jc, "DETAIL_STATS_MAX_ENTRIES", 3)
+    now = 1_000 * DAY_MS
+    stats = {
+        "K_OLD": {"latencyMs": 10.0, "rows": 1, "seenAtMs": now - 400 * DAY_MS},
+        "K1": {"latencyMs": 10.0, "rows": 1, "seenAtMs": now - 4},
+        "K2": {"latencyMs": 10.0, "rows": 1, "seenAtMs": now - 3},
+        "K3": {"latencyMs": 10.0, "rows": 1, "seenAtMs": now - 2},
+        "K4": {"latencyMs": 10.0, "rows": 1, "seenAtMs": now - 1},
+    }
+    assert list(jc.trim_detail_stats(stats, now)) == ["K2", "K3", "K4"]
+
+
+def test_save_caps_the_tuning_file_and_keeps_other_sections(monkeypatch, tmp_path):
+    monkeypatch.setattr(jc, "DETAIL_STATS_MAX_ENTRIES", 10)
+    tuning = tmp_path / "tuning.json"
+    jc.save_concurrency_hint(tuning, "async", 12)
+    stats = {f"K{i:03d}": {"latencyMs": 5.0, "rows": 2, "seenAtMs": jc.time.time() * 1000 + i} for i in range(50)}
+
+    jc.save_detail_stats(tuning, stats)
+    saved = json.loads(tuning.read_text(encoding="utf-8"))
+    assert sorted(saved["detailStats"]) == [f"K{i:03d}" for i in range(40, 50)]
+    assert jc.load_concurrency_hint(tuning, "async") == 12
+
+
+def test_legacy_entries_survive_the_first_save(tmp_path):
+    tuning = tmp_path / "tuning.json"
+    tuning.write_text(json.dumps({"detailStats": {"K1": {"latencyMs": 3.0, "rows": 1}}}), encoding="utf-8")
+
+    loaded = jc.load_detail_stats(tuning)
+    jc.save_detail_stats(tuning, loaded)
+    assert list(jc.load_detail_stats(tuning)) == ["K1"]
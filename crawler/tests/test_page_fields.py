@@ -0,0 +1,45 @@
+from pathlib import Path
+
+import pytest
+
+import jwxt_crawler as jc
+
+FIXTURE_DIR = Path(__file__).resolve().parent.parent / "ref" / "fixtures"
+FIXTURES = sorted(FIXTURE_DIR.glob("jwxt_*_sample.html"))
+BACKENDS = [name for name in jc.HTML_EXTRACTORS if jc.html_backend_available(name)]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("fixture", FIXTURES, ids=lambda path: path.stem)
+def test_backend_matches_reference(fixture, backend):
+    html = fixture.read_text(encoding="utf-8")
+    assert jc.extract_page_fields(html, backend) == jc.extract_page_fields_reference(html)
+
+
+def test_selection_fixture_tabs():
+    html = (FIXTURE_DIR / "jwxt_selection_page_sample.html").read_text(encoding="utf-8")
+    tabs = jc.parse_round_tabs_reference(html)
+    # The badge tab is not a plain <li><a>label</a> item and the script template is not markup.
+    assert [(tab["xkkz_id"], tab["label"], tab["active"]) for tab in tabs] == [
+        ("2A3E5C1D9F0B4E7A8C6D2E1F0A9B8C7D", "主修课程", "1"),
+        ("3B4F6D2E0A1C5F8B9D7E3F2A1B0C9D8E", "通识课 & 通选课", "0"),
+    ]
+
+
+def test_badge_tabs_fall_back_to_nav_tab_anchors():
+    html = (FIXTURE_DIR / "jwxt_selection_page_badge_tabs_sample.html").read_text(encoding="utf-8")
+    tabs = jc.parse_round_tabs_reference(html)
+    assert [(tab["kklxdm"], tab["label"]) for tab in tabs] == [("01", "1 主修课程"), ("05", "体育课")]
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_anchor_after_comment_is_not_a_plain_tab(backend):
+    html = (
+        '<ul id="nav_tab">'
+        "<li><!-- x --><a onclick=\"queryCourse(this,'01','A','2025','01')\">甲</a></li>"
+        "<li> <a onclick=\"queryCourse(this,'02','B','2025','01')\">乙</a></li>"
+        "</ul>"
+    )
+    tabs = jc.extract_page_fields(html, backend)["tabs"]
+    assert [tab["xkkz_id"] for tab in tabs] == ["B"]
+    assert tabs == jc.parse_round_tabs_reference(html)
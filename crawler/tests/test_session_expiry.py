@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+import jwxt_crawler as jc
+
+SSO_PAGE = "<html><title>上海大学统一身份认证</title></html>"
+
+
+def response(text="", url="https://jwxt.shu.edu.cn/jwglxt/xsxk/x.html", status=200):
+    return SimpleNamespace(text=text, url=url, status_code=status)
+
+
+def test_sso_redirect_is_expired_for_any_endpoint():
+    resp = response(url="https://newsso.shu.edu.cn/login/abc")
+    assert jc.is_session_expired(resp)
+    assert jc.is_session_expired(resp, expect_json=False)
+
+
+def test_html_body_only_counts_for_json_endpoints():
+    assert jc.is_session_expired(response(SSO_PAGE))
+    # The display page is HTML and may mention the SSO without the session being gone.
+    assert not jc.is_session_expired(response(SSO_PAGE), expect_json=False)
+    assert not jc.is_session_expired(response('{"tmpList": []}'))
+
+
+def test_failed_relogin_surfaces_as_session_expired():
+    crawler = jc.JWXTCrawler("user", "pass")
+
+    def relogin():
+        raise ConnectionError("sso down")
+
+    crawler._relogin = relogin
+    with pytest.raises(jc.SessionExpiredError, match="sso down"):
+        crawler.reauthenticate(crawler._auth_generation)
+    # The same generation does not hit the SSO again.
+    with pytest.raises(jc.SessionExpiredError):
+        crawler.reauthenticate(crawler._auth_generation)
+    crawler.close()
+
+
+@pytest.mark.parametrize("engine", ["thread", "async"])
+def test_detail_pass_stops_on_expired_session_instead_of_retrying(engine):
+    if engine == "async":
+        pytest.importorskip("httpx")
+    crawler = jc.JWXTCrawler("", "", workers=2, max_in_flight=2, engine=engine)
+    calls = []
+
+    def expired(*args, **kwargs):
+        calls.append(args)
+        raise jc.SessionExpiredError("expired")
+
+    async def expired_async(*args, **kwargs):
+        return expired(*args, **kwargs)
+
+    crawler._post_xhr = expired
+    crawler._post_xhr_async = expired_async
+    meta = {f"K{n}": {"courseId": f"K{n}"} for n in range(20)}
+    try:
+        with pytest.raises(jc.SessionExpiredError):
+            crawler._run_detail_pass({"xkkz_id": "A"}, meta, None, jc.DETAIL_MAX_ATTEMPTS)
+    finally:
+        crawler.close()
+    # One attempt per item that was already in flight, no retry rounds.
+    assert len(calls) <= 2
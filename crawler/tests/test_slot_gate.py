@@ -0,0 +1,70 @@
+import asyncio
+
+import jwxt_crawler as jc
+
+
+async def settle() -> None:
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_release_wakes_one_async_waiter_per_slot():
+    async def scenario():
+        gate = jc.SlotGate(1)
+        await gate.acquire_async()
+        waiters = [asyncio.create_task(gate.acquire_async()) for _ in range(10)]
+        await settle()
+        assert len(gate._async_waiters) == 10
+
+        gate.release()
+        assert len(gate._async_waiters) == 9
+        await settle()
+        assert sum(task.done() for task in waiters) == 1
+
+        for _ in waiters[1:]:
+            gate.release()
+            await settle()
+        assert all(task.done() for task in waiters)
+        assert gate.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_raised_limit_wakes_one_waiter_per_free_slot():
+    async def scenario():
+        gate = jc.SlotGate(1)
+        await gate.acquire_async()
+        waiters = [asyncio.create_task(gate.acquire_async()) for _ in range(5)]
+        await settle()
+
+        gate.limit = 3
+        gate.release()
+        await settle()
+        assert sum(task.done() for task in waiters) == 3
+        assert len(gate._async_waiters) == 2
+        assert gate.in_flight == 3
+
+        for task in waiters:
+            task.cancel()
+        await settle()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_passes_its_wakeup_on():
+    async def scenario():
+        gate = jc.SlotGate(1)
+        await gate.acquire_async()
+        first = asyncio.create_task(gate.acquire_async())
+        second = asyncio.create_task(gate.acquire_async())
+        await settle()
+
+        gate.release()
+        first.cancel()
+        await settle()
+        assert first.cancelled()
+        assert second.done()
+        assert gate.in_flight == 1
+        assert not gate._async_waiters
+
+    asyncio.run(scenario())
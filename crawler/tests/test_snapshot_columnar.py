@@ -0,0 +1,38 @@
+import pytest
+
+import jwxt_crawler as jc
+
+
+def round_trip(snapshot):
+    encoded = jc.json_loads(jc.json_dumps(jc.encode_columnar_snapshot(snapshot)))
+    return encoded, jc.decode_columnar_snapshot(encoded)
+
+
+@pytest.mark.parametrize("spelling", ["-0", "00", "+1", "007", " 1", "1 ", "1.0", "١"])
+def test_non_canonical_integer_strings_round_trip(spelling):
+    courses = [{"n": value} for value in ("1", spelling, "", "-12", "0")]
+    encoded, decoded = round_trip({"hash": "h", "courses": courses})
+    assert decoded["courses"] == courses
+    assert encoded["columns"]["n"]["type"] != "intString"
+
+
+def test_canonical_integer_strings_use_int_column():
+    courses = [{"n": value} for value in ("1", "-12", "0", "", "30")]
+    encoded, decoded = round_trip({"hash": "h", "courses": courses})
+    assert encoded["columns"]["n"] == {"type": "intString", "values": [1, -12, 0, None, 30]}
+    assert decoded["courses"] == courses
+
+
+def test_columnar_round_trip_keeps_rows_and_envelope():
+    courses = [
+        {"courseId": "0830", "teachingClassId": "01", "credit": "4.0", "capacity": "120", "limitations": []},
+        {"courseId": "0830", "teachingClassId": "02", "credit": "4.0", "capacity": "", "limitations": ["禁选"]},
+        {"courseId": "1001", "teachingClassId": "01", "credit": "2.0", "capacity": "60"},
+    ]
+    snapshot = {"termId": "2025-3", "hash": "abc", "updateTimeMs": 1, "courses": courses}
+    encoded, decoded = round_trip(snapshot)
+    assert encoded["columns"]["limitations"]["absent"] == [2]
+    assert decoded == snapshot
+    # Rows must not share mutable values after decoding.
+    decoded["courses"][0]["limitations"].append("x")
+    assert decoded["courses"][1]["limitations"] == ["禁选"]
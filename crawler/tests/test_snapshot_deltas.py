@@ -0,0 +1,86 @@
+import hashlib
+
+import pytest
+
+import jwxt_crawler as jc
+
+
+def snapshot(courses, **envelope):
+    return {
+        "termId": "2025-16--xkkz-A",
+        **envelope,
+        "updateTimeMs": len(courses),
+        "hash": hashlib.md5(jc.canonical_courses(courses)).hexdigest(),
+        "courses": courses,
+    }
+
+
+def row(class_id, number="0", **extra):
+    return {"teachingClassId": class_id, "courseId": class_id[:4], "number": number, **extra}
+
+
+def versions():
+    v0 = snapshot([row("A001"), row("A002", note="x"), row("B001")], source="jwxt")
+    v1 = snapshot([row("A001", "3"), row("A002"), row("B001"), row("B002")], source="jwxt")
+    v2 = snapshot([row("B002"), row("A001", "5"), row("C001")], source="jwxt", round="2")
+    v3 = snapshot([row("C001", "1"), row("A001", "5"), row("B002", limitations=["禁选"])])
+    return [v0, v1, v2, v3]
+
+
+def test_each_delta_reproduces_the_next_snapshot():
+    chain = versions()
+    sections = set()
+    for base, target in zip(chain, chain[1:]):
+        delta = jc.diff_snapshots(base, target)
+        assert delta["from"] == base["hash"] and delta["to"] == target["hash"]
+        assert jc.apply_snapshot_delta(base, delta) == target
+        sections.update(delta)
+    assert {"added", "removed", "changed", "unset", "order", "envelope", "envelopeUnset"} <= sections
+
+
+def test_deltas_chain_from_an_old_hash_to_the_latest():
+    chain = versions()
+    deltas = [jc.diff_snapshots(base, target) for base, target in zip(chain, chain[1:])]
+    current = chain[0]
+    for delta in deltas:
+        current = jc.apply_snapshot_delta(current, jc.json_loads(jc.json_dumps(delta)))
+    assert current == chain[-1]
+
+
+def test_apply_rejects_a_delta_for_another_snapshot():
+    v0, v1, v2, _ = versions()
+    with pytest.raises(ValueError):
+        jc.apply_snapshot_delta(v0, jc.diff_snapshots(v1, v2))
+
+
+def test_apply_rejects_a_result_that_does_not_hash_to_the_target():
+    v0, v1, _, _ = versions()
+    delta = jc.diff_snapshots(v0, v1)
+    delta["changed"]["A001"]["number"] = "4"
+    with pytest.raises(ValueError):
+        jc.apply_snapshot_delta(v0, delta)
+
+
+def test_duplicate_class_ids_have_no_delta():
+    v0 = versions()[0]
+    assert jc.diff_snapshots(v0, snapshot([row("A001"), row("A001")])) is None
+
+
+def test_written_history_walks_back_to_every_listed_hash(tmp_path):
+    output_dir = tmp_path / "data"
+    term_path = output_dir / "terms" / "2025-16--xkkz-A.json"
+    term_path.parent.mkdir(parents=True)
+    chain = versions()
+    history = []
+    for base, target in zip(chain, chain[1:]):
+        history = jc.write_round_deltas(output_dir, term_path, base, target, history, full_size=10**6)
+
+    assert [link["from"] for link in history] == [item["hash"] for item in reversed(chain[:-1])]
+    for start in chain[:-1]:
+        links = {link["from"]: link for link in history}
+        current = start
+        while current["hash"] != chain[-1]["hash"]:
+            link = links[current["hash"]]
+            delta = jc.json_loads((output_dir / link["path"]).read_bytes())
+            current = jc.apply_snapshot_delta(current, delta)
+        assert current == chain[-1]